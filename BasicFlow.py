@@ -1,10 +1,295 @@
-from utils import SummaryStatistics, PacketLengthDistribution
+from utils import SummaryStatistics, PacketLengthDistribution, PayloadMatrix, formatIP
 from BasicPacketInfo import BasicPacketInfo
 from FlowFeature import FlowFeature
+import config
+
+"""
+    参数扫描
+    子流个数, 流活动-空闲时间和数据包负载与 activityTimeout, subFlowTimeout, packetNumMax,
+    packetLenMax 有关, 由 FlowVariant 统计; 其余统计量与这些参数无关
+    BasicFlow 本身是第一组参数的 FlowVariant, 其余每组参数对应 variants 中的一个 FlowVariant,
+    因此多组参数只需读取和解析一次数据包, 共享与参数无关的统计量
+    流标识, 流时间和负载由 FlowBase 和 FlowPayload 实现, ColumnarFlow 只继承这两部分,
+    不分配 BasicFlow 逐包更新的统计量
+"""
+
+
+def getFlowConfigs(args) -> list:
+    """
+    根据命令行参数生成参数扫描的全部参数组合
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        命令行参数, 见 config.parser
+
+    Returns
+    -------
+    flowConfigs : list
+        (输出文件夹名, BasicFlow 参数) 列表, 只有一组参数时文件夹名为空字符串
+
+    """
+    activityTimeouts = args.activityTimeouts or str(config.activityTimeout)
+    subFlowTimeouts = args.subFlowTimeouts or str(config.subFlowTimeout)
+    payloadShapes = args.payloadShapes or "%dx%d" % (
+        config.packetNumMax,
+        config.packetLenMax,
+    )
+    flowConfigs = []
+    for activityTimeout in activityTimeouts.split(","):
+        for subFlowTimeout in subFlowTimeouts.split(","):
+            for payloadShape in payloadShapes.split(","):
+                packetNumMax, packetLenMax = payloadShape.split("x")
+                params = {
+                    "activityTimeout": int(activityTimeout),
+                    "subFlowTimeout": int(subFlowTimeout),
+                    "packetNumMax": int(packetNumMax),
+                    "packetLenMax": int(packetLenMax),
+                }
+                # 每组参数的输出文件夹, 如 act5000000_sub1000000_16x128/
+                name = "act%d_sub%d_%dx%d/" % tuple(params.values())
+                flowConfigs.append((name, params))
+    if len(flowConfigs) == 1:
+        flowConfigs[0] = ("", flowConfigs[0][1])
+    return flowConfigs
+
+
+class FlowPayload:
+    """会话流中一组参数的阈值和数据包负载, 由 BasicFlow 和 ColumnarFlow 共享"""
 
+    def __init__(
+        self,
+        currentTS: int,
+        activityTimeout=5000000,
+        subFlowTimeout=1000000,
+        packetNumMax=16,
+        packetLenMax=128,
+    ):
+        # currentTS 只由 FlowVariant 使用, 参数与 FlowVariant 保持一致, 以便作为 FlowBase 的另一个父类
+        # 子流超时阈值
+        self.subFlowTimeout = subFlowTimeout
+        # 流活动超时阈值
+        self.activityTimeout = activityTimeout
+
+        # 会话流数据包负载矩阵, 每个数据包一行 packetLenMax 个字节(补零), 按行首尾相接
+        self.payloadBuffer = bytearray()
+        # 每个数据包实际保存的负载字节数(补零之前), 其长度即已保存的数据包个数
+        self.payloadLens = []
+        # 截取的最大数据包个数阈值
+        self.packetNumMax = packetNumMax
+        # 每个数据包截取的最大字节长度阈值
+        self.packetLenMax = packetLenMax
+
+    def addPayload(self, packet: BasicPacketInfo) -> None:
+        """负载槽位未满时, 将数据包负载的前 packetLenMax 个字节复制到负载矩阵的下一行"""
+        if len(self.payloadLens) < self.packetNumMax:
+            self.appendPayload(packet.payload)
+
+    def appendPayload(self, payload: bytes) -> None:
+        """将负载的前 packetLenMax 个字节复制到负载矩阵的下一行, 调用前需确认负载槽位未满"""
+        payload = payload[0 : self.packetLenMax]
+        self.payloadBuffer += payload
+        # 不足 packetLenMax 个字节的部分补零
+        self.payloadBuffer += bytes(self.packetLenMax - len(payload))
+        self.payloadLens.append(len(payload))
+
+    def needPayload(self, packet: BasicPacketInfo) -> bool:
+        """返回是否还有空闲的负载槽位"""
+        return len(self.payloadLens) < self.packetNumMax
+
+    def getPayloads(self) -> PayloadMatrix:
+        """返回会话流数据包负载矩阵, 按行访问时与负载数据行列表兼容"""
+        # 如果数据包个数不足self.packetNumMax, 则补零
+        res = self.packetNumMax * self.packetLenMax - len(self.payloadBuffer)
+        if res > 0:
+            self.payloadBuffer += bytes(res)
+        return PayloadMatrix(self.payloadBuffer, self.packetNumMax, self.packetLenMax)
 
-class BasicFlow:
-    """会话流的统一格式"""
+    def getPayloadLens(self) -> list:
+        """返回每个数据包实际保存的负载字节数, 长度为实际保存的数据包个数"""
+        return self.payloadLens
+
+
+class FlowVariant(FlowPayload):
+    """会话流中与参数有关的统计量"""
+
+    def __init__(
+        self,
+        currentTS: int,
+        activityTimeout=5000000,
+        subFlowTimeout=1000000,
+        packetNumMax=16,
+        packetLenMax=128,
+    ):
+        # 子流时间戳(us)
+        self.subFlowLastTS = currentTS
+        # 子流个数
+        self.subFlowcnt = 0
+
+        # 流开始活动时间戳(us)
+        self.startActiveTS = currentTS
+        # 流结束活动时间戳(us)
+        self.endActiveTS = currentTS
+
+        # 流活动时间列表(ms)
+        self.flowActive = SummaryStatistics()
+        # 流空闲时间列表(ms)
+        self.flowIdle = SummaryStatistics()
+
+        # 设置阈值, 初始化负载信息
+        super().__init__(
+            currentTS, activityTimeout, subFlowTimeout, packetNumMax, packetLenMax
+        )
+
+    def updateVariant(self, packet: BasicPacketInfo) -> None:
+        """
+        更新数据包负载, 子流信息和流活动空闲信息
+
+        Parameters
+        ----------
+        packet : BasicPacketInfo
+            基本数据包信息
+
+        Returns
+        -------
+        None
+
+        """
+        # 更新会话流数据包负载
+        self.addPayload(packet)
+        # 更新子流信息
+        self.updateSubflows(packet)
+        # 更新流活动空闲信息
+        self.updateActIdleTime(packet)
+
+    def updateSubflows(self, packet: BasicPacketInfo) -> None:
+        """
+        更新子流时间戳和个数
+
+        Parameters
+        ----------
+        packet : BasicPacketInfo
+            基本数据包信息
+
+        Returns
+        -------
+        None
+
+        """
+
+        # 当前时间戳
+        currentTS = packet.getTimeStamp()
+        # 和上一个数据包的间隔时间
+        idleTime = currentTS - self.subFlowLastTS
+        # 如果超过阈值
+        if idleTime > self.subFlowTimeout:
+            # 子流数量加一
+            self.subFlowcnt += 1
+        # 更新子流时间戳
+        self.subFlowLastTS = currentTS
+
+    def updateActIdleTime(self, packet: BasicPacketInfo) -> None:
+        """
+        统计流活动时间和空闲时间
+
+        Parameters
+        ----------
+        packet : BasicPacketInfo
+            基本数据包信息
+
+        Returns
+        -------
+        None
+
+        """
+
+        # 当前时间戳
+        currentTS = packet.getTimeStamp()
+        # 和上一个数据包的间隔时间(即空闲时间)
+        idleTime = currentTS - self.endActiveTS
+        # 如果超过阈值
+        if idleTime > self.activityTimeout:
+            # 更新流空闲时间
+            self.flowIdle.addValue(idleTime / 1000)
+
+            # 计算流活动时间
+            activeTime = self.endActiveTS - self.startActiveTS
+            # 如果活动时间大于0(即上一个活动区间的数据包个数大于1)
+            if activeTime > 0:
+                # 更新流活动时间
+                self.flowActive.addValue(activeTime / 1000)
+
+            # 更新流活动开始时间
+            self.startActiveTS = currentTS
+
+        # 更新流活动结束时间
+        self.endActiveTS = currentTS
+
+    def endSession(self) -> None:
+        """
+        结束会话,更新流活动时间
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+
+        """
+
+        # 计算活动时间
+        activeTime = self.endActiveTS - self.startActiveTS
+        # 如果活动时间大于0
+        if activeTime > 0:
+            # 更新流活动时间
+            self.flowActive.addValue(activeTime / 1000)
+
+    def setVariantFeatures(self, features: FlowFeature) -> None:
+        """
+        设置与参数有关的特征, 其余特征需要已经计算完成
+
+        Parameters
+        ----------
+        features : FlowFeature
+            会话流的统计特征
+
+        Returns
+        -------
+        None
+
+        """
+        """子流相关特征"""
+        features.calSubFlow(self.subFlowcnt)
+
+        """流活动-空闲相关特征"""
+        # 会话流活动时间信息
+        features["flowActNum"] = self.flowActive.getN()
+        features["flowActSum"] = self.flowActive.getSum()
+        features["flowActMax"] = self.flowActive.getMax()
+        features["flowActMin"] = self.flowActive.getMin()
+        features["flowActMean"] = self.flowActive.getMean()
+        features["flowActStd"] = self.flowActive.getStd()
+
+        # 会话流空闲时间信息
+        features["flowIdleNum"] = self.flowIdle.getN()
+        features["flowIdleSum"] = self.flowIdle.getSum()
+        features["flowIdleMax"] = self.flowIdle.getMax()
+        features["flowIdleMin"] = self.flowIdle.getMin()
+        features["flowIdleMean"] = self.flowIdle.getMean()
+        features["flowIdleStd"] = self.flowIdle.getStd()
+
+
+class FlowBase:
+    """
+    会话流的公共部分: 流标识, 流时间和每组参数的负载, 由 BasicFlow 和 ColumnarFlow 共享
+    子类同时继承 FlowVariant(BasicFlow) 或 FlowPayload(ColumnarFlow), 作为第一组参数,
+    其余每组参数为 variantClass 的实例
+    """
+
+    # 其余每组参数的类型
+    variantClass = FlowPayload
 
     def __init__(
         self,
@@ -13,56 +298,102 @@ class BasicFlow:
         subFlowTimeout=1000000,
         packetNumMax=16,
         packetLenMax=128,
+        variants=(),
     ):
         """流标识信息"""
-        # 流ID
+        # 流ID(字符串形式, 只在输出时生成)
         self.flowId = None
+        # 设置流键(与方向无关的整数元组), 见 BasicPacketInfo.getFlowKey
+        self.flowKey = packet.getFlowKey()
         """流基本信息"""
-        # 源IP地址
-        self.srcIP = None
+        # IP版本(4或6)
+        self.ipVersion = packet.getIPVersion()
+        # 源IP地址(整数形式)
+        self.srcIP = packet.getSrcIP()
         # 源端口
-        self.srcPort = 0
-        # 目的IP地址
-        self.dstIP = None
+        self.srcPort = packet.getSrcPort()
+        # 目的IP地址(整数形式)
+        self.dstIP = packet.getDstIP()
         # 目的端口
-        self.dstPort = 0
+        self.dstPort = packet.getDstPort()
         # 传输层协议(TCP:6 UDP:17)
-        self.protocol = 0
+        self.protocol = packet.getProtocol()
         """流时间信息"""
+        # 获取数据包时间戳
+        currentTS = packet.getTimeStamp()
         # 流开始时间戳(us)
-        self.flowStartTS = 0
+        self.flowStartTS = currentTS
         # 流结束时间戳(us)
-        self.flowEndTS = 0
+        self.flowEndTS = currentTS
+
+        # 设置阈值, 初始化第一组参数的负载(BasicFlow 还包括子流和流活动空闲信息)
+        super().__init__(
+            currentTS, activityTimeout, subFlowTimeout, packetNumMax, packetLenMax
+        )
+        # 其余每组参数
+        self.variants = [self.variantClass(currentTS, **params) for params in variants]
+
+    def getSrcIP(self) -> int:
+        """返回源IP(整数形式, 可用 utils.formatIP 格式化)"""
+        return self.srcIP
+
+    def getDstIP(self) -> int:
+        """返回目的IP(整数形式, 可用 utils.formatIP 格式化)"""
+        return self.dstIP
+
+    def needPayload(self, packet: BasicPacketInfo) -> bool:
+        """返回任一组参数是否还有空闲的负载槽位, 作为读取器的负载需求函数"""
+        if len(self.payloadLens) < self.packetNumMax:
+            return True
+        return any(variant.needPayload(packet) for variant in self.variants)
+
+    def getFlowKey(self) -> tuple:
+        """返回与方向无关的流键"""
+        return self.flowKey
 
+    def getFlowID(self) -> str:
+        """返回流ID, 第一次调用时由正向的五元组生成"""
+        if self.flowId is None:
+            self.flowId = "-".join(
+                [
+                    formatIP(self.srcIP, self.ipVersion),
+                    str(self.srcPort),
+                    formatIP(self.dstIP, self.ipVersion),
+                    str(self.dstPort),
+                    str(self.protocol),
+                ]
+            )
+        return self.flowId
+
+
+class BasicFlow(FlowBase, FlowVariant):
+    """会话流的统一格式"""
+
+    # 其余每组参数的类型
+    variantClass = FlowVariant
+
+    def __init__(
+        self,
+        packet: BasicPacketInfo,
+        activityTimeout=5000000,
+        subFlowTimeout=1000000,
+        packetNumMax=16,
+        packetLenMax=128,
+        variants=(),
+    ):
+        """流时间信息"""
         # 正向数据包最近出现的时间戳(us)
         self.fwdLastTS = 0
         # 反向数据包最近出现的时间戳(us)
         self.bwdLastTS = 0
 
-        # 子流时间戳(us)
-        self.subFlowLastTS = 0
-        # 子流个数
-        self.subFlowcnt = 0
-        # 子流超时(-1表示需要被初始化)
-        self.subFlowTimeout = -1
-
-        # 流开始活动时间戳(us)
-        self.startActiveTS = 0
-        # 流结束活动时间戳(us)
-        self.endActiveTS = 0
-        # 流活动超时
-        self.activityTimeout = 0
-
-        # 数据包间隔时间列表(ms)
-        self.flowIAT = SummaryStatistics()
-        # 正向数据包间隔时间列表(ms)
-        self.forwardIAT = SummaryStatistics()
-        # 反向数据包间隔时间列表(ms)
-        self.backwardIAT = SummaryStatistics()
-        # 流活动时间列表(ms)
-        self.flowActive = SummaryStatistics()
-        # 流空闲时间列表(ms)
-        self.flowIdle = SummaryStatistics()
+        # 数据包间隔时间统计(ms)
+        # 跳过第一个值, 即 第一个数据包的时间戳 与 初始时间戳 之间的差值
+        self.flowIAT = SummaryStatistics(skipFirst=True)
+        # 正向数据包间隔时间统计(ms)
+        self.forwardIAT = SummaryStatistics(skipFirst=True)
+        # 反向数据包间隔时间统计(ms)
+        self.backwardIAT = SummaryStatistics(skipFirst=True)
         """数据包长度信息"""
         # 正向数据包头长度列表
         self.fwdHeadStats = SummaryStatistics()
@@ -114,33 +445,16 @@ class BasicFlow:
         """会话流统计特征类"""
         # 基于流的统计特征
         self.features = FlowFeature()
-        """会话流传输层负载信息"""
-        # 会话流数据包负载信息
-        self.payloads = []
-        """根据参数以及第一个数据包 初始化部分信息"""
-        self.srcIP = packet.getSrcIP()
-        self.srcPort = packet.getSrcPort()
-        self.dstIP = packet.getDstIP()
-        self.dstPort = packet.getDstPort()
-
-        # 设置流ID
-        self.flowId = packet.getFwdFlowId()
-        self.protocol = packet.getProtocol()
-
-        # 获取数据包时间戳
-        currentTS = packet.getTimeStamp()
-        # 设置会话流开始时间等信息
-        self.flowStartTS = currentTS
-        self.flowEndTS = currentTS
-        self.startActiveTS = currentTS
-        self.endActiveTS = currentTS
-        self.subFlowLastTS = currentTS
 
-        # 设置阈值
-        self.subFlowTimeout = subFlowTimeout  # 子流超时阈值
-        self.activityTimeout = activityTimeout  # 流活动超时阈值
-        self.packetNumMax = packetNumMax  # 截取的最大数据包个数阈值
-        self.packetLenMax = packetLenMax  # 每个数据包截取的最大字节长度阈值
+        # 根据第一个数据包初始化流标识和流时间, 初始化每组参数的子流, 流活动空闲和负载信息
+        super().__init__(
+            packet,
+            activityTimeout,
+            subFlowTimeout,
+            packetNumMax,
+            packetLenMax,
+            variants,
+        )
 
     def addPacket(self, packet: BasicPacketInfo) -> None:
         """
@@ -230,10 +544,6 @@ class BasicFlow:
             # 更新会话流数据包负载长度
             self.flowPldStats.addValue(pktPLBs)
 
-        if len(self.payloads) < self.packetNumMax:
-            # 更新会话流数据包负载
-            self.payloads.append(packet.getPayloadSpcLen())
-
         # 更新流结束时间
         self.flowEndTS = currentTS
 
@@ -242,10 +552,10 @@ class BasicFlow:
             # 更新标志信息
             self.updateFlags(packet)
 
-        # 更新子流信息
-        self.updateSubflows(packet)
-        # 更新流活动空闲信息
-        self.updateActIdleTime(packet)
+        # 更新每组参数的负载, 子流和流活动空闲信息
+        self.updateVariant(packet)
+        for variant in self.variants:
+            variant.updateVariant(packet)
 
     def updateFlags(self, packet: BasicPacketInfo) -> None:
         """
@@ -270,72 +580,9 @@ class BasicFlow:
         self.ECEcnt += packet.hasFlagECE()
         self.CWRcnt += packet.hasFlagCWR()
 
-    def updateSubflows(self, packet: BasicPacketInfo) -> None:
-        """
-        更新子流时间戳和个数
-
-        Parameters
-        ----------
-        packet : BasicPacketInfo
-            基本数据包信息
-
-        Returns
-        -------
-        None
-
-        """
-
-        # 当前时间戳
-        currentTS = packet.getTimeStamp()
-        # 和上一个数据包的间隔时间
-        idleTime = currentTS - self.subFlowLastTS
-        # 如果超过阈值
-        if idleTime > self.subFlowTimeout:
-            # 子流数量加一
-            self.subFlowcnt += 1
-        # 更新子流时间戳
-        self.subFlowLastTS = currentTS
-
-    def updateActIdleTime(self, packet: BasicPacketInfo) -> None:
-        """
-        统计流活动时间和空闲时间
-
-        Parameters
-        ----------
-        packet : BasicPacketInfo
-            基本数据包信息
-
-        Returns
-        -------
-        None
-
-        """
-
-        # 当前时间戳
-        currentTS = packet.getTimeStamp()
-        # 和上一个数据包的间隔时间(即空闲时间)
-        idleTime = currentTS - self.endActiveTS
-        # 如果超过阈值
-        if idleTime > self.activityTimeout:
-            # 更新流空闲时间
-            self.flowIdle.addValue(idleTime / 1000)
-
-            # 计算流活动时间
-            activeTime = self.endActiveTS - self.startActiveTS
-            # 如果活动时间大于0(即上一个活动区间的数据包个数大于1)
-            if activeTime > 0:
-                # 更新流活动时间
-                self.flowActive.addValue(activeTime / 1000)
-
-            # 更新流活动开始时间
-            self.startActiveTS = currentTS
-
-        # 更新流活动结束时间
-        self.endActiveTS = currentTS
-
     def endSession(self) -> None:
         """
-        结束会话,更新流活动时间
+        结束会话,更新每组参数的流活动时间
 
         Parameters
         ----------
@@ -346,13 +593,9 @@ class BasicFlow:
         None
 
         """
-
-        # 计算活动时间
-        activeTime = self.endActiveTS - self.startActiveTS
-        # 如果活动时间大于0
-        if activeTime > 0:
-            # 更新流活动时间
-            self.flowActive.addValue(activeTime / 1000)
+        super().endSession()
+        for variant in self.variants:
+            variant.endSession()
 
     def generateFlowFeatures(self) -> list:
         """
@@ -369,150 +612,117 @@ class BasicFlow:
 
         """
         """流基本信息"""
-        # self.features.flowId = self.flowId
-        # self.features.srcIP = self.srcIP
-        self.features.srcPort = self.srcPort
-        # self.features.dstIP = self.dstIP
-        self.features.dstPort = self.dstPort
-        self.features.protocol = self.protocol
+        # self.features["flowId"] = self.getFlowID()
+        # self.features["srcIP"] = self.srcIP
+        self.features["srcPort"] = self.srcPort
+        # self.features["dstIP"] = self.dstIP
+        self.features["dstPort"] = self.dstPort
+        self.features["protocol"] = self.protocol
 
         # """流时间信息"""
         # # 流开始时间(s)
-        # self.features.startTime = self.flowStartTS / 1000000
+        # self.features["startTime"] = self.flowStartTS / 1000000
         # # 流最近出现时间(s)
-        # self.features.endTime = self.flowEndTS / 1000000
+        # self.features["endTime"] = self.flowEndTS / 1000000
         # 流持续时间(s)
         if self.flowEndTS == self.flowStartTS:
             return None
 
-        self.features.flowDuration = (self.flowEndTS - self.flowStartTS) / 1000000
+        self.features["flowDuration"] = (self.flowEndTS - self.flowStartTS) / 1000000
 
         """数据包个数,首部字节数相关特征"""
         # 正向流首部长度信息
-        self.features.fwdPktNum = self.fwdHeadStats.getN()
-        self.features.fwdHeadByteMean = self.fwdHeadStats.getMean()
-        self.features.fwdHeadByteStd = self.fwdHeadStats.getStd()
+        self.features["fwdPktNum"] = self.fwdHeadStats.getN()
+        self.features["fwdHeadByteMean"] = self.fwdHeadStats.getMean()
+        self.features["fwdHeadByteStd"] = self.fwdHeadStats.getStd()
 
         # 反向流首部长度信息
-        self.features.bwdPktNum = self.bwdHeadStats.getN()
-        self.features.bwdHeadByteMean = self.bwdHeadStats.getMean()
-        self.features.bwdHeadByteStd = self.bwdHeadStats.getStd()
+        self.features["bwdPktNum"] = self.bwdHeadStats.getN()
+        self.features["bwdHeadByteMean"] = self.bwdHeadStats.getMean()
+        self.features["bwdHeadByteStd"] = self.bwdHeadStats.getStd()
 
         """数据包负载字节数相关特征"""
         # 会话流负载长度信息
-        self.features.flowPktNumWithPld = self.flowPldStats.getN()
-        self.features.flowPldByteSum = self.flowPldStats.getSum()
-        self.features.flowPldByteMax = self.flowPldStats.getMax()
-        self.features.flowPldByteMin = self.flowPldStats.getMin()
-        self.features.flowPldByteMean = self.flowPldStats.getMean()
-        self.features.flowPldByteStd = self.flowPldStats.getStd()
+        self.features["flowPktNumWithPld"] = self.flowPldStats.getN()
+        self.features["flowPldByteSum"] = self.flowPldStats.getSum()
+        self.features["flowPldByteMax"] = self.flowPldStats.getMax()
+        self.features["flowPldByteMin"] = self.flowPldStats.getMin()
+        self.features["flowPldByteMean"] = self.flowPldStats.getMean()
+        self.features["flowPldByteStd"] = self.flowPldStats.getStd()
 
         # 正向流负载长度信息
-        self.features.fwdPktNumWithPld = self.fwdPktPldStats.getN()
-        self.features.fwdPldByteSum = self.fwdPktPldStats.getSum()
-        self.features.fwdPldByteMax = self.fwdPktPldStats.getMax()
-        self.features.fwdPldByteMin = self.fwdPktPldStats.getMin()
-        self.features.fwdPldByteMean = self.fwdPktPldStats.getMean()
-        self.features.fwdPldByteStd = self.fwdPktPldStats.getStd()
+        self.features["fwdPktNumWithPld"] = self.fwdPktPldStats.getN()
+        self.features["fwdPldByteSum"] = self.fwdPktPldStats.getSum()
+        self.features["fwdPldByteMax"] = self.fwdPktPldStats.getMax()
+        self.features["fwdPldByteMin"] = self.fwdPktPldStats.getMin()
+        self.features["fwdPldByteMean"] = self.fwdPktPldStats.getMean()
+        self.features["fwdPldByteStd"] = self.fwdPktPldStats.getStd()
 
         # 反向流负载长度信息
-        self.features.bwdPktNumWithPld = self.bwdPktPldStats.getN()
-        self.features.bwdPldByteSum = self.bwdPktPldStats.getSum()
-        self.features.bwdPldByteMax = self.bwdPktPldStats.getMax()
-        self.features.bwdPldByteMin = self.bwdPktPldStats.getMin()
-        self.features.bwdPldByteMean = self.bwdPktPldStats.getMean()
-        self.features.bwdPldByteStd = self.bwdPktPldStats.getStd()
+        self.features["bwdPktNumWithPld"] = self.bwdPktPldStats.getN()
+        self.features["bwdPldByteSum"] = self.bwdPktPldStats.getSum()
+        self.features["bwdPldByteMax"] = self.bwdPktPldStats.getMax()
+        self.features["bwdPldByteMin"] = self.bwdPktPldStats.getMin()
+        self.features["bwdPldByteMean"] = self.bwdPktPldStats.getMean()
+        self.features["bwdPldByteStd"] = self.bwdPktPldStats.getStd()
 
         """流速相关特征"""
         # 速率相关特征
         self.features.calRate()
 
         """间隔时间相关特征"""
-        """这里把第一个值删除的原因是, 第一个值计算的是 第一个数据包的时间戳 与 初始时间戳 之间的差值"""
+        """第一个值已在统计时跳过, 它计算的是 第一个数据包的时间戳 与 初始时间戳 之间的差值"""
         # 会话流间隔时间
-        self.flowIAT.delete(0)
-        self.features.flowIatMax = self.flowIAT.getMax()
-        self.features.flowIatMin = self.flowIAT.getMin()
-        self.features.flowIatMean = self.flowIAT.getMean()
-        self.features.flowIatStd = self.flowIAT.getStd()
+        self.features["flowIatMax"] = self.flowIAT.getMax()
+        self.features["flowIatMin"] = self.flowIAT.getMin()
+        self.features["flowIatMean"] = self.flowIAT.getMean()
+        self.features["flowIatStd"] = self.flowIAT.getStd()
 
         # 正向流间隔时间
-        self.forwardIAT.delete(0)
-        self.features.fwdIatMax = self.forwardIAT.getMax()
-        self.features.fwdIatMin = self.forwardIAT.getMin()
-        self.features.fwdIatMean = self.forwardIAT.getMean()
-        self.features.fwdIatStd = self.forwardIAT.getStd()
+        self.features["fwdIatMax"] = self.forwardIAT.getMax()
+        self.features["fwdIatMin"] = self.forwardIAT.getMin()
+        self.features["fwdIatMean"] = self.forwardIAT.getMean()
+        self.features["fwdIatStd"] = self.forwardIAT.getStd()
 
         # 反向流间隔时间
-        self.backwardIAT.delete(0)
-        self.features.bwdIatMax = self.backwardIAT.getMax()
-        self.features.bwdIatMin = self.backwardIAT.getMin()
-        self.features.bwdIatMean = self.backwardIAT.getMean()
-        self.features.bwdIatStd = self.backwardIAT.getStd()
+        self.features["bwdIatMax"] = self.backwardIAT.getMax()
+        self.features["bwdIatMin"] = self.backwardIAT.getMin()
+        self.features["bwdIatMean"] = self.backwardIAT.getMean()
+        self.features["bwdIatStd"] = self.backwardIAT.getStd()
 
         """TCP标志相关特征"""
-        self.features.FINcnt = self.FINcnt
-        self.features.SYNcnt = self.SYNcnt
-        self.features.RSTcnt = self.RSTcnt
-        self.features.PSHcnt = self.PSHcnt
-        self.features.ACKcnt = self.ACKcnt
-        self.features.URGcnt = self.URGcnt
-        self.features.ECEcnt = self.ECEcnt
-        self.features.CWRcnt = self.CWRcnt
-
-        self.features.fwdPSHcnt = self.fwdPSHcnt
-        self.features.bwdPSHcnt = self.bwdPSHcnt
-        self.features.fwdURGcnt = self.fwdURGcnt
-        self.features.bwdURGcnt = self.bwdURGcnt
+        self.features["FINcnt"] = self.FINcnt
+        self.features["SYNcnt"] = self.SYNcnt
+        self.features["RSTcnt"] = self.RSTcnt
+        self.features["PSHcnt"] = self.PSHcnt
+        self.features["ACKcnt"] = self.ACKcnt
+        self.features["URGcnt"] = self.URGcnt
+        self.features["ECEcnt"] = self.ECEcnt
+        self.features["CWRcnt"] = self.CWRcnt
+
+        self.features["fwdPSHcnt"] = self.fwdPSHcnt
+        self.features["bwdPSHcnt"] = self.bwdPSHcnt
+        self.features["fwdURGcnt"] = self.fwdURGcnt
+        self.features["bwdURGcnt"] = self.bwdURGcnt
 
         """初始窗口大小"""
-        self.features.fwdInitWinBytes = self.fwdInitWinBytes
-        self.features.bwdInitWinBytes = self.bwdInitWinBytes
-
-        """子流相关特征"""
-        self.features.calSubFlow(self.subFlowcnt)
+        self.features["fwdInitWinBytes"] = self.fwdInitWinBytes
+        self.features["bwdInitWinBytes"] = self.bwdInitWinBytes
 
-        """流活动-空闲相关特征"""
-        # 会话流活动时间信息
-        self.features.flowActNum = self.flowActive.getN()
-        self.features.flowActSum = self.flowActive.getSum()
-        self.features.flowActMax = self.flowActive.getMax()
-        self.features.flowActMin = self.flowActive.getMin()
-        self.features.flowActMean = self.flowActive.getMean()
-        self.features.flowActStd = self.flowActive.getStd()
+        """子流和流活动-空闲相关特征"""
+        self.setVariantFeatures(self.features)
 
-        # 会话流空闲时间信息
-        self.features.flowIdleNum = self.flowIdle.getN()
-        self.features.flowIdleSum = self.flowIdle.getSum()
-        self.features.flowIdleMax = self.flowIdle.getMax()
-        self.features.flowIdleMin = self.flowIdle.getMin()
-        self.features.flowIdleMean = self.flowIdle.getMean()
-        self.features.flowIdleStd = self.flowIdle.getStd()
-
-        self.features.fwdLenDist = self.fwdPktLenDistribution.returnValue()
-        self.features.bwdLenDist = self.bwdPktLenDistribution.returnValue()
+        self.features.setValues("fwdLenDist", self.fwdPktLenDistribution.returnValue())
+        self.features.setValues("bwdLenDist", self.bwdPktLenDistribution.returnValue())
 
         # 通过FlowFeature类返回特征
         return self.features.returnFeature()
 
-    def getSrcIP(self) -> str:
-        """返回源IP"""
-        return self.srcIP
-
-    def getDstIP(self) -> str:
-        """返回目的IP"""
-        return self.dstIP
-
-    def getFlowID(self) -> str:
-        """返回流ID"""
-        return self.flowId
+    def generateVariantFeatures(self, variant: FlowVariant) -> list:
+        """在 generateFlowFeatures 之后调用, 返回另一组参数下会话流的特征"""
+        variant.setVariantFeatures(self.features)
+        return self.features.returnFeature()
 
-    def getPayloads(self) -> list:
-        """返回会话流数据包负载信息"""
-        # 如果数据包个数不足self.packetNumMax, 则补零
-        res = self.packetNumMax - len(self.payloads)
-        if res > 0:
-            self.payloads.extend(
-                [[0 for i in range(self.packetLenMax)] for j in range(res)]
-            )
-        return self.payloads
+    def getPacketNum(self) -> int:
+        """返回会话流已添加的数据包个数"""
+        return self.flowIAT.getN() + self.flowIAT.skipped
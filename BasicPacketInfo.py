@@ -1,9 +1,36 @@
 import config
+from utils import formatIP
 
 
 class BasicPacketInfo:
     """数据包的统一格式"""
 
+    # 使用固定槽位代替实例字典, 减少每个数据包的内存占用和分配开销
+    __slots__ = (
+        "id",
+        "srcIP",
+        "dstIP",
+        "srcPort",
+        "dstPort",
+        "protocol",
+        "timeStamp",
+        "ipLength",
+        "headBytes",
+        "payloadBytes",
+        "payload",
+        "flags",
+        "sequence",
+        "acknowledgment",
+        "TCPWindow",
+        "packetLenMax",
+        "ipVersion",
+        # 以下字段在第一次访问时才计算, 未计算时为None
+        "srcIPStr",
+        "dstIPStr",
+        "fwdFlowIdStr",
+        "bwdFlowIdStr",
+    )
+
     def __init__(
         self,
         pktID,
@@ -22,12 +49,13 @@ class BasicPacketInfo:
         acknowledgment=None,
         TCPWindow=None,
         packetLenMax=config.packetLenMax,
+        ipVersion=4,
     ):
         # 数据包编号
         self.id = pktID
-        # 源IP地址
+        # 源IP地址(整数形式, IPv4为32位, IPv6为128位)
         self.srcIP = srcIP
-        # 目的IP地址
+        # 目的IP地址(整数形式, IPv4为32位, IPv6为128位)
         self.dstIP = dstIP
         # 源端口
         self.srcPort = srcPort
@@ -57,13 +85,28 @@ class BasicPacketInfo:
         self.TCPWindow = TCPWindow
         # 数据包负载长度截取阈值
         self.packetLenMax = packetLenMax
-
-        # 数据包所属流编号
-        self.fwdFlowId = self.generateFlowId(True)
-        self.bwdFlowId = self.generateFlowId(False)
-
-        # 正反向上一个数据包到达的时间 getSubPayload() 用
-        self.lastPktTime = [0, 0]
+        # IP版本(4或6)
+        self.ipVersion = ipVersion
+
+        # 格式化的IP地址, 数据包所属流编号, 均延迟到第一次访问时计算
+        self.srcIPStr = None
+        self.dstIPStr = None
+        self.fwdFlowIdStr = None
+        self.bwdFlowIdStr = None
+
+    @property
+    def fwdFlowId(self) -> str:
+        """正向流ID"""
+        if self.fwdFlowIdStr is None:
+            self.fwdFlowIdStr = self.generateFlowId(True)
+        return self.fwdFlowIdStr
+
+    @property
+    def bwdFlowId(self) -> str:
+        """反向流ID"""
+        if self.bwdFlowIdStr is None:
+            self.bwdFlowIdStr = self.generateFlowId(False)
+        return self.bwdFlowIdStr
 
     def generateFlowId(self, direction: bool) -> str:
         """
@@ -82,11 +125,11 @@ class BasicPacketInfo:
         """
         if direction:
             flowId = (
-                self.srcIP
+                self.getSrcIPStr()
                 + "-"
                 + str(self.srcPort)
                 + "-"
-                + self.dstIP
+                + self.getDstIPStr()
                 + "-"
                 + str(self.dstPort)
                 + "-"
@@ -94,11 +137,11 @@ class BasicPacketInfo:
             )
         else:
             flowId = (
-                self.dstIP
+                self.getDstIPStr()
                 + "-"
                 + str(self.dstPort)
                 + "-"
-                + self.srcIP
+                + self.getSrcIPStr()
                 + "-"
                 + str(self.srcPort)
                 + "-"
@@ -106,35 +149,79 @@ class BasicPacketInfo:
             )
         return flowId
 
-    def getPayloadSpcLen(self) -> list:
+    def getFlowKey(self) -> tuple:
         """
-        获取特定长度的数据包负载
+        生成与方向无关的流键, 同一会话流正反向的数据包得到相同的流键
 
         Parameters
         ----------
         None
 
+        Returns
+        -------
+        flowKey : tuple
+            (IP版本, 协议, 较小端点的IP, 端口, 较大端点的IP, 端口), 均为整数
+
+        """
+        if (self.srcIP, self.srcPort) <= (self.dstIP, self.dstPort):
+            return (
+                self.ipVersion,
+                self.protocol,
+                self.srcIP,
+                self.srcPort,
+                self.dstIP,
+                self.dstPort,
+            )
+        return (
+            self.ipVersion,
+            self.protocol,
+            self.dstIP,
+            self.dstPort,
+            self.srcIP,
+            self.srcPort,
+        )
+
+    def getPayloadSpcLen(self, packetLenMax: int = None) -> list:
+        """
+        获取特定长度的数据包负载, 会话流直接将负载复制到负载矩阵(见 FlowPayload.addPayload), 不调用本函数
+
+        Parameters
+        ----------
+        packetLenMax : int
+            截取的最大字节长度, 为None时使用 self.packetLenMax
+
         Returns
         -------
         payload : list
             数据包负载列表
 
         """
-        # 截取下标为 0 - self.packetLenMax 的所有字节
-        payload = [x for x in self.payload[0 : self.packetLenMax]]
-        # 计算是否达到最长长度阈值
-        res = self.packetLenMax - len(payload)
-        # 如果没有达到则补零
-        if res > 0:
-            payload.extend([0 for i in range(res)])
-        return payload
-
-    def getSrcIP(self) -> str:
+        if packetLenMax is None:
+            packetLenMax = self.packetLenMax
+        # 截取下标为 0 - packetLenMax 的所有字节, 如果没有达到最长长度阈值则补零
+        return list(bytes(self.payload[0:packetLenMax]).ljust(packetLenMax, b"\0"))
+
+    def getSrcIP(self) -> int:
         return self.srcIP
 
-    def getDstIP(self) -> str:
+    def getDstIP(self) -> int:
         return self.dstIP
 
+    def getIPVersion(self) -> int:
+        return self.ipVersion
+
+    def getSrcIPStr(self) -> str:
+        """返回格式化后的源IP"""
+        if self.srcIPStr is None:
+            self.srcIPStr = formatIP(self.srcIP, self.ipVersion)
+        return self.srcIPStr
+
+    def getDstIPStr(self) -> str:
+        """返回格式化后的目的IP"""
+        if self.dstIPStr is None:
+            self.dstIPStr = formatIP(self.dstIP, self.ipVersion)
+        return self.dstIPStr
+
     def getSrcPort(self) -> int:
         return self.srcPort
 
@@ -162,6 +249,9 @@ class BasicPacketInfo:
     def getFwdFlowId(self) -> str:
         return self.fwdFlowId
 
+    def getBwdFlowId(self) -> str:
+        return self.bwdFlowId
+
     def hasFlagFIN(self) -> bool:
         return self.flags & 1
 
@@ -0,0 +1,630 @@
+import array
+
+import numpy as np
+
+from BasicPacketInfo import BasicPacketInfo
+from BasicFlow import FlowBase, FlowPayload
+from FlowFeature import (
+    FlowFeature,
+    featureIndex,
+    featureSlices,
+    newFeatureMatrix,
+    formatRows,
+)
+from utils import flowRows
+
+"""
+    列式会话流
+    接口和输出的特征与 BasicFlow 相同, 但每个数据包只将时间戳, 方向, IP长度, 首部长度, 负载长度,
+    TCP标志和窗口大小追加到类型化的数组中(每个数据包24字节), 所有统计量在 generateFlowFeatures 中用NumPy批量计算:
+    1. 间隔时间: 对时间戳 np.diff
+    2. 各方向的统计量: 按方向和负载长度掩码后归约
+    3. 子流和流活动-空闲区间: 间隔时间超过阈值的位置即区间的边界, 参数扫描的每组参数只需重新计算这一部分
+    整数值特征与 BasicFlow 完全相同, 浮点特征的舍入误差在 SummaryStatistics 的容差(1e-9)以内
+    大多数会话流只有几个数据包, 逐个调用NumPy的开销远大于计算本身, 因此 FlowBatch 将多个会话流的各列
+    首尾相接并按 CSR 偏移分段, 用分段归约(np.add.reduceat, np.maximum.reduceat, 按段号 np.bincount)
+    一次计算全部会话流的全部特征, 见 batchFlowRows
+"""
+
+# 数据包方向: 正向, 反向, 两个IP地址都与会话流的源IP不同(只计入整个会话流的统计量)
+FORWARD, BACKWARD, OTHER = 0, 1, 2
+
+
+def summarize(values: np.ndarray) -> tuple:
+    """
+    计算一组值的统计量, 与 SummaryStatistics 一致
+
+    Parameters
+    ----------
+    values : np.ndarray
+        一维数组
+
+    Returns
+    -------
+    stats : tuple
+        (个数, 总和, 最大值, 最小值, 均值, 标准差), 没有值时均为0
+
+    """
+    N = len(values)
+    if N == 0:
+        return 0, 0, 0, 0, 0, 0
+    total = values.sum().item()
+    return (
+        N,
+        total,
+        values.max().item(),
+        values.min().item(),
+        total / N,
+        values.std().item(),
+    )
+
+
+def lengthDistribution(ipLengths: np.ndarray) -> list:
+    """将IP数据包长度映射到0-149之间并计数, 与 PacketLengthDistribution 一致"""
+    bins = np.where(
+        ipLengths < 40,
+        0,
+        np.where(
+            ipLengths <= 1500,
+            ipLengths // 10 - 3,
+            np.where(ipLengths <= 2960, 148, 149),
+        ),
+    )
+    return np.bincount(bins, minlength=150).tolist()
+
+
+def flagCounts(flags: np.ndarray) -> list:
+    """返回TCP控制位中每一位(FIN, SYN, RST, PSH, ACK, URG, ECE, CWR)被设置的数据包个数"""
+    bits = np.unpackbits(flags[:, None], axis=1, bitorder="little")
+    return bits.sum(axis=0).tolist()
+
+
+class ColumnarFlow(FlowBase, FlowPayload):
+    """列式会话流, 接口与 BasicFlow 相同"""
+
+    def __init__(
+        self,
+        packet: BasicPacketInfo,
+        activityTimeout=5000000,
+        subFlowTimeout=1000000,
+        packetNumMax=16,
+        packetLenMax=128,
+        variants=(),
+    ):
+        # 流标识, 时间, 负载和参数与 BasicFlow 相同, 不分配逐包更新的统计量
+        super().__init__(
+            packet,
+            activityTimeout,
+            subFlowTimeout,
+            packetNumMax,
+            packetLenMax,
+            variants,
+        )
+        """每个数据包一行的列"""
+        # 时间戳(us)
+        self.timeStamps = array.array("q")
+        # 方向, 见 FORWARD, BACKWARD, OTHER
+        self.directions = array.array("b")
+        # IP数据包长度
+        self.ipLengths = array.array("i")
+        # 传输层数据包头长度
+        self.headLengths = array.array("i")
+        # 传输层负载长度
+        self.payloadLengths = array.array("i")
+        # TCP控制位(UDP为0)
+        self.flagBits = array.array("B")
+        # TCP窗口大小(UDP为0)
+        self.windows = array.array("i")
+
+    def addPacket(self, packet: BasicPacketInfo) -> None:
+        """
+        向会话流中添加数据包, 只追加数据包的各列和负载
+
+        Parameters
+        ----------
+        packet : BasicPacketInfo
+            基本数据包信息
+
+        Returns
+        -------
+        None
+
+        """
+        currentTS = packet.getTimeStamp()
+        if self.srcIP == packet.getSrcIP():
+            direction = FORWARD
+        elif self.srcIP == packet.getDstIP():
+            direction = BACKWARD
+        else:
+            direction = OTHER
+
+        self.timeStamps.append(currentTS)
+        self.directions.append(direction)
+        self.ipLengths.append(packet.getIPLength())
+        self.headLengths.append(packet.getHeadBytes())
+        self.payloadLengths.append(packet.getPayloadBytes())
+        self.flagBits.append(packet.flags or 0)
+        self.windows.append(packet.TCPWindow or 0)
+
+        # 更新流结束时间, 流表据此计算超时时间
+        self.flowEndTS = currentTS
+
+        # 更新每组参数的负载
+        self.addPayload(packet)
+        for variant in self.variants:
+            variant.addPayload(packet)
+
+    def addColumns(self, columns: np.ndarray, payloads: list) -> None:
+        """
+        向会话流中添加一批数据包的各列, 与对每个数据包调用 addPacket 的结果相同
+
+        Parameters
+        ----------
+        columns : np.ndarray
+            按时间顺序排列的数据包字段(PacketCache.cacheDtype), 不能为空
+
+        payloads : list
+            前若干个数据包的负载, 个数不少于 payloadSlots 的返回值
+
+        Returns
+        -------
+        None
+
+        """
+        srcIPHi = np.uint64(self.srcIP >> 64)
+        srcIPLo = np.uint64(self.srcIP & 0xFFFFFFFFFFFFFFFF)
+        fwd = (columns["srcIPHi"] == srcIPHi) & (columns["srcIPLo"] == srcIPLo)
+        bwd = (columns["dstIPHi"] == srcIPHi) & (columns["dstIPLo"] == srcIPLo)
+        directions = np.where(fwd, FORWARD, np.where(bwd, BACKWARD, OTHER))
+
+        for column, values, dtype in (
+            (self.timeStamps, columns["timeStamp"], np.int64),
+            (self.directions, directions, np.int8),
+            (self.ipLengths, columns["ipLength"], np.int32),
+            (self.headLengths, columns["headBytes"], np.int32),
+            (self.payloadLengths, columns["payloadBytes"], np.int32),
+            (self.flagBits, columns["flags"], np.uint8),
+            (self.windows, columns["TCPWindow"], np.int32),
+        ):
+            column.frombytes(values.astype(dtype).tobytes())
+
+        # 更新流结束时间
+        self.flowEndTS = int(columns["timeStamp"][-1])
+
+        # 每组参数按数据包顺序填满空闲的负载槽位
+        for variant in [self] + self.variants:
+            for payload in payloads[: variant.packetNumMax - len(variant.payloadLens)]:
+                variant.appendPayload(payload)
+
+    def payloadSlots(self) -> int:
+        """返回各组参数中空闲负载槽位的最大个数, 即下一批数据包中需要复制负载的数据包个数"""
+        return max(
+            variant.packetNumMax - len(variant.payloadLens)
+            for variant in [self] + self.variants
+        )
+
+    def endSession(self) -> None:
+        """结束会话, 流活动时间在生成特征时计算"""
+
+    def generateFlowFeatures(self) -> list:
+        """
+        用NumPy批量计算会话流的特征
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        featureValue : list
+            会话流的统计特征, 与 BasicFlow.generateFlowFeatures 相同
+
+        """
+        # 统计特征只在结束时计算, 不随会话流保存在流表中
+        features = self.features = FlowFeature()
+        """流基本信息"""
+        features["srcPort"] = self.srcPort
+        features["dstPort"] = self.dstPort
+        features["protocol"] = self.protocol
+
+        # 流持续时间(s)
+        if self.flowEndTS == self.flowStartTS:
+            return None
+        features["flowDuration"] = (self.flowEndTS - self.flowStartTS) / 1000000
+
+        timeStamps = np.frombuffer(self.timeStamps, dtype=np.int64)
+        directions = np.frombuffer(self.directions, dtype=np.int8)
+        ipLengths = np.frombuffer(self.ipLengths, dtype=np.int32)
+        headLengths = np.frombuffer(self.headLengths, dtype=np.int32)
+        payloadLengths = np.frombuffer(self.payloadLengths, dtype=np.int32)
+        fwd = directions == FORWARD
+        bwd = directions == BACKWARD
+        hasPayload = payloadLengths > 0
+
+        """数据包个数,首部字节数相关特征"""
+        for prefix, mask in (("fwd", fwd), ("bwd", bwd)):
+            stats = summarize(headLengths[mask])
+            features[prefix + "PktNum"] = stats[0]
+            features.setValues(prefix + "HeadByteMean", stats[4:])
+
+        """数据包负载字节数相关特征"""
+        # (个数, 总和, 最大值, 最小值, 均值, 标准差) 的槽位在特征向量中是连续的
+        features.setValues("flowPktNumWithPld", summarize(payloadLengths[hasPayload]))
+        features.setValues(
+            "fwdPktNumWithPld", summarize(payloadLengths[fwd & hasPayload])
+        )
+        features.setValues(
+            "bwdPktNumWithPld", summarize(payloadLengths[bwd & hasPayload])
+        )
+
+        """流速相关特征"""
+        features.calRate()
+
+        """间隔时间相关特征"""
+        # 与 BasicFlow 相同, 不包括第一个数据包与初始时间戳之间的差值
+        features.setValues("flowIatMax", summarize(np.diff(timeStamps) / 1000)[2:])
+        features.setValues("fwdIatMax", summarize(np.diff(timeStamps[fwd]) / 1000)[2:])
+        features.setValues("bwdIatMax", summarize(np.diff(timeStamps[bwd]) / 1000)[2:])
+
+        """TCP标志相关特征和初始窗口大小"""
+        if self.protocol == 6:
+            flags = np.frombuffer(self.flagBits, dtype=np.uint8)
+            windows = np.frombuffer(self.windows, dtype=np.int32)
+            features.setValues("FINcnt", flagCounts(flags))
+            fwdFlags, bwdFlags = flagCounts(flags[fwd]), flagCounts(flags[bwd])
+            features["fwdPSHcnt"], features["fwdURGcnt"] = fwdFlags[3], fwdFlags[5]
+            features["bwdPSHcnt"], features["bwdURGcnt"] = bwdFlags[3], bwdFlags[5]
+            # 每个方向第一个数据包的窗口大小
+            if fwd.any():
+                features["fwdInitWinBytes"] = windows[fwd][0]
+            if bwd.any():
+                features["bwdInitWinBytes"] = windows[bwd][0]
+
+        """子流和流活动-空闲相关特征"""
+        self.setIntervalFeatures(self)
+
+        features.setValues("fwdLenDist", lengthDistribution(ipLengths[fwd]))
+        features.setValues("bwdLenDist", lengthDistribution(ipLengths[bwd]))
+
+        # 通过FlowFeature类返回特征
+        return features.returnFeature()
+
+    def generateVariantFeatures(self, variant: FlowPayload) -> list:
+        """在 generateFlowFeatures 之后调用, 返回另一组参数下会话流的特征"""
+        self.setIntervalFeatures(variant)
+        return self.features.returnFeature()
+
+    def setIntervalFeatures(self, variant: FlowPayload) -> None:
+        """
+        按一组参数的阈值计算子流和流活动-空闲相关特征
+
+        Parameters
+        ----------
+        variant : FlowPayload
+            提供 subFlowTimeout 和 activityTimeout 的参数组(可以是会话流本身)
+
+        Returns
+        -------
+        None
+
+        """
+        timeStamps = np.frombuffer(self.timeStamps, dtype=np.int64)
+        gaps = np.diff(timeStamps)
+
+        # 与上一个数据包的间隔超过阈值时, 子流数量加一
+        self.features.calSubFlow(int(np.count_nonzero(gaps > variant.subFlowTimeout)))
+
+        # 间隔超过阈值的位置结束一个活动区间(之后为空闲时间), 并开始一个新的活动区间
+        breaks = np.flatnonzero(gaps > variant.activityTimeout)
+        starts = timeStamps[np.concatenate(([0], breaks + 1))]
+        ends = timeStamps[np.concatenate((breaks, [len(timeStamps) - 1]))]
+        activeTimes = ends - starts
+        # 只统计活动时间大于0(即数据包个数大于1)的活动区间
+        activeTimes = activeTimes[activeTimes > 0] / 1000
+        idleTimes = gaps[breaks] / 1000
+
+        self.features.setValues("flowActNum", summarize(activeTimes))
+        self.features.setValues("flowIdleNum", summarize(idleTimes))
+
+    def getPacketNum(self) -> int:
+        """返回会话流已添加的数据包个数"""
+        return len(self.timeStamps)
+
+
+class FlowBatch:
+    """多个 ColumnarFlow 的批量特征计算"""
+
+    def __init__(self, flows: list) -> None:
+        """
+        将多个会话流的各列首尾相接, 并分配特征矩阵
+
+        Parameters
+        ----------
+        flows : list
+            ColumnarFlow 列表
+
+        Returns
+        -------
+        None
+
+        """
+        self.flows = flows
+        self.flowNum = len(flows)
+        # 每行为一个会话流的特征向量
+        self.matrix = newFeatureMatrix(self.flowNum)
+        packetNums = np.array([len(flow.timeStamps) for flow in flows], dtype=np.int64)
+        # 第 i 个会话流的数据包为 [offsets[i], offsets[i + 1])
+        self.offsets = np.concatenate(([0], np.cumsum(packetNums)))
+        # 每个数据包所属会话流的序号(段号)
+        self.flowIds = np.repeat(np.arange(self.flowNum), packetNums)
+
+        def column(name, dtype):
+            return np.concatenate(
+                [np.frombuffer(getattr(flow, name), dtype=dtype) for flow in flows]
+            )
+
+        self.timeStamps = column("timeStamps", np.int64)
+        self.directions = column("directions", np.int8)
+        self.ipLengths = column("ipLengths", np.int32).astype(np.int64)
+        self.headLengths = column("headLengths", np.int32).astype(np.int64)
+        self.payloadLengths = column("payloadLengths", np.int32).astype(np.int64)
+        self.flagBits = column("flagBits", np.uint8)
+        self.windows = column("windows", np.int32)
+
+        # 同一个会话流中相邻数据包的间隔: 前一个数据包的位置, 间隔, 所属会话流
+        sameFlow = self.flowIds[1:] == self.flowIds[:-1]
+        self.gapIdx = np.flatnonzero(sameFlow)
+        self.gaps = np.diff(self.timeStamps)[sameFlow]
+        self.gapFlowIds = self.flowIds[self.gapIdx]
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        """返回全部会话流的一个特征"""
+        return self.matrix[:, featureIndex[name]]
+
+    def __setitem__(self, name: str, values) -> None:
+        self.matrix[:, featureIndex[name]] = values
+
+    def setValues(self, name: str, values) -> None:
+        """从特征 name 的槽位开始依次写入连续的多个特征, values 的每一项为全部会话流的一个特征"""
+        start = featureIndex[name]
+        self.matrix[:, start : start + len(values)] = np.column_stack(values)
+
+    def summarize(self, values: np.ndarray, flowIds: np.ndarray) -> tuple:
+        """
+        按会话流分段计算统计量, 与 summarize 一致
+
+        Parameters
+        ----------
+        values : np.ndarray
+            按会话流顺序排列的值
+
+        flowIds : np.ndarray
+            每个值所属会话流的序号(非递减)
+
+        Returns
+        -------
+        stats : tuple
+            (个数, 总和, 最大值, 最小值, 均值, 标准差), 每一项为长度等于会话流个数的数组, 没有值的会话流为0
+
+        """
+        counts = np.bincount(flowIds, minlength=self.flowNum)
+        present = counts > 0
+        # 非空段的起始位置
+        starts = (np.cumsum(counts) - counts)[present]
+        sums = np.zeros(self.flowNum, dtype=values.dtype)
+        maxs = np.zeros(self.flowNum, dtype=values.dtype)
+        mins = np.zeros(self.flowNum, dtype=values.dtype)
+        stds = np.zeros(self.flowNum)
+        if len(values) > 0:
+            sums[present] = np.add.reduceat(values, starts)
+            maxs[present] = np.maximum.reduceat(values, starts)
+            mins[present] = np.minimum.reduceat(values, starts)
+        means = sums / np.maximum(counts, 1)
+        if len(values) > 0:
+            deviations = values - means[flowIds]
+            stds[present] = np.sqrt(
+                np.add.reduceat(deviations * deviations, starts) / counts[present]
+            )
+        return counts, sums, maxs, mins, means, stds
+
+    def count(self, mask: np.ndarray) -> np.ndarray:
+        """每个会话流中满足条件的数据包个数"""
+        return np.bincount(self.flowIds[mask], minlength=self.flowNum)
+
+    def generateFeatures(self) -> None:
+        """
+        计算与参数无关的特征, 写入特征矩阵
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+
+        """
+        flows, flowIds, timeStamps = self.flows, self.flowIds, self.timeStamps
+        fwd = self.directions == FORWARD
+        bwd = self.directions == BACKWARD
+        hasPayload = self.payloadLengths > 0
+
+        """流基本信息"""
+        self["srcPort"] = [flow.srcPort for flow in flows]
+        self["dstPort"] = [flow.dstPort for flow in flows]
+        protocols = np.array([flow.protocol for flow in flows])
+        self["protocol"] = protocols
+        duration = (
+            np.array([flow.flowEndTS - flow.flowStartTS for flow in flows]) / 1000000
+        )
+        self["flowDuration"] = duration
+
+        """数据包个数,首部字节数相关特征"""
+        for prefix, mask in (("fwd", fwd), ("bwd", bwd)):
+            stats = self.summarize(self.headLengths[mask], flowIds[mask])
+            self[prefix + "PktNum"] = stats[0]
+            self.setValues(prefix + "HeadByteMean", stats[4:])
+
+        """数据包负载字节数相关特征"""
+        for prefix, mask in (
+            ("flow", hasPayload),
+            ("fwd", fwd & hasPayload),
+            ("bwd", bwd & hasPayload),
+        ):
+            self.setValues(
+                prefix + "PktNumWithPld",
+                self.summarize(self.payloadLengths[mask], flowIds[mask]),
+            )
+
+        """流速相关特征, 与 FlowFeature.calRate 相同"""
+        # 持续时间为0的会话流不输出
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self["fwdPktsS"] = self["fwdPktNum"] / duration
+            self["fwdPldBytesS"] = self["fwdPldByteSum"] / duration
+            self["bwdPktsS"] = self["bwdPktNum"] / duration
+            self["bwdPldBytesS"] = self["bwdPldByteSum"] / duration
+        self["flowPktsS"] = self["fwdPktsS"] + self["bwdPktsS"]
+        self["flowPldBytesS"] = self["fwdPldBytesS"] + self["bwdPldBytesS"]
+        self["pktsRatio"] = (self["bwdPktNum"] + 1) / (self["fwdPktNum"] + 1)
+        self["bytesRatio"] = (self["bwdPldByteSum"] + 1) / (self["fwdPldByteSum"] + 1)
+
+        """间隔时间相关特征"""
+        for prefix, mask in (("flow", None), ("fwd", fwd), ("bwd", bwd)):
+            if mask is None:
+                gaps, gapFlowIds = self.gaps, self.gapFlowIds
+            else:
+                maskedIds = flowIds[mask]
+                sameFlow = maskedIds[1:] == maskedIds[:-1]
+                gaps = np.diff(timeStamps[mask])[sameFlow]
+                gapFlowIds = maskedIds[1:][sameFlow]
+            self.setValues(
+                prefix + "IatMax", self.summarize(gaps / 1000, gapFlowIds)[2:]
+            )
+
+        """TCP标志相关特征, UDP为0"""
+        isTCP = (protocols == 6)[flowIds]
+        flagNames = ("FIN", "SYN", "RST", "PSH", "ACK", "URG", "ECE", "CWR")
+        for bit, name in enumerate(flagNames):
+            isSet = isTCP & ((self.flagBits >> bit) & 1).astype(bool)
+            self[name + "cnt"] = self.count(isSet)
+            if name in ("PSH", "URG"):
+                self["fwd" + name + "cnt"] = self.count(isSet & fwd)
+                self["bwd" + name + "cnt"] = self.count(isSet & bwd)
+
+        """初始窗口大小, 即每个方向第一个数据包的窗口大小(UDP为0)"""
+        for prefix, mask in (("fwd", fwd), ("bwd", bwd)):
+            maskedIds = flowIds[mask & isTCP]
+            firstIds, firstIdx = np.unique(maskedIds, return_index=True)
+            self.matrix[firstIds, featureIndex[prefix + "InitWinBytes"]] = self.windows[
+                mask & isTCP
+            ][firstIdx]
+
+        """数据包长度分布, 与 PacketLengthDistribution 相同"""
+        ipLengths = self.ipLengths
+        bins = np.where(
+            ipLengths < 40,
+            0,
+            np.where(
+                ipLengths <= 1500,
+                ipLengths // 10 - 3,
+                np.where(ipLengths <= 2960, 148, 149),
+            ),
+        )
+        for prefix, mask in (("fwd", fwd), ("bwd", bwd)):
+            self.matrix[:, featureSlices[prefix + "LenDist"]] = np.bincount(
+                flowIds[mask] * 150 + bins[mask], minlength=self.flowNum * 150
+            ).reshape(self.flowNum, 150)
+
+    def intervalFeatures(self, variants: list) -> None:
+        """
+        按每个会话流的一组参数计算子流和流活动-空闲相关特征, 写入特征矩阵
+
+        Parameters
+        ----------
+        variants : list
+            每个会话流的参数组(FlowPayload, 可以是会话流本身)
+
+        Returns
+        -------
+        None
+
+        """
+        gaps, gapFlowIds = self.gaps, self.gapFlowIds
+        subFlowTimeouts = np.array([variant.subFlowTimeout for variant in variants])
+        activityTimeouts = np.array([variant.activityTimeout for variant in variants])
+
+        """子流相关特征, 与 FlowFeature.calSubFlow 相同, 没有子流时为0"""
+        subFlowcnt = np.bincount(
+            gapFlowIds[gaps > subFlowTimeouts[gapFlowIds]], minlength=self.flowNum
+        )
+        divisor = np.where(subFlowcnt > 0, subFlowcnt, np.inf)
+        self["subFlowFwdPkts"] = self["fwdPktNum"] / divisor
+        self["subFlowFwdPldBytes"] = self["fwdPldByteSum"] / divisor
+        self["subFlowBwdPkts"] = self["bwdPktNum"] / divisor
+        self["subFlowBwdPldBytes"] = self["bwdPldByteSum"] / divisor
+
+        """流活动-空闲相关特征"""
+        # 间隔超过阈值的位置结束一个活动区间(之后为空闲时间), 并开始一个新的活动区间
+        isBreak = gaps > activityTimeouts[gapFlowIds]
+        breakIdx = self.gapIdx[isBreak]
+        starts = np.sort(np.concatenate((self.offsets[:-1], breakIdx + 1)))
+        ends = np.sort(np.concatenate((breakIdx, self.offsets[1:] - 1)))
+        activeTimes = self.timeStamps[ends] - self.timeStamps[starts]
+        # 只统计活动时间大于0(即数据包个数大于1)的活动区间
+        isActive = activeTimes > 0
+        self.setValues(
+            "flowActNum",
+            self.summarize(
+                activeTimes[isActive] / 1000, self.flowIds[starts][isActive]
+            ),
+        )
+        self.setValues(
+            "flowIdleNum", self.summarize(gaps[isBreak] / 1000, gapFlowIds[isBreak])
+        )
+
+
+def batchFlowRows(flows: list, label: str) -> list:
+    """
+    批量生成多个已结束会话流的输出行
+
+    Parameters
+    ----------
+    flows : list
+        已结束的会话流, ColumnarFlow 批量计算, 其它会话流逐个调用 utils.flowRows
+
+    label : str
+        标签
+
+    Returns
+    -------
+    rows : list
+        每个会话流的输出行, 与 utils.flowRows 的返回值相同
+
+    """
+    if not flows or not all(isinstance(flow, ColumnarFlow) for flow in flows):
+        return [flowRows(flow, label) for flow in flows]
+
+    batch = FlowBatch(flows)
+    batch.generateFeatures()
+    # 每组参数的特征行, 第一组为会话流本身的参数
+    configRows = []
+    for i in range(1 + len(flows[0].variants)):
+        batch.intervalFeatures(
+            [flow if i == 0 else flow.variants[i - 1] for flow in flows]
+        )
+        configRows.append(formatRows(batch.matrix))
+
+    rows = []
+    for j, flow in enumerate(flows):
+        # 持续时间为0的会话流没有特征
+        if flow.flowEndTS == flow.flowStartTS:
+            rows.append(None)
+            continue
+        variants = [flow] + flow.variants
+        rows.append(
+            [
+                (features[j] + [label], variant.getPayloads(), variant.getPayloadLens())
+                for features, variant in zip(configRows, variants)
+            ]
+        )
+    return rows
@@ -1,206 +1,307 @@
+import numpy as np
+
+"""
+    会话流特征的定义
+    featureSchema 按输出顺序列出每个特征的 (特征名, CSV列名, 类型, 槽位个数), CSV列名和每个特征在特征向量中的
+    位置都由它导出, 不再依赖属性的定义顺序与手写的列名列表一致
+    每个会话流的特征保存在一个预先分配的 float64 数组中(多个会话流为一个矩阵的各行), 生成特征时直接写入对应的槽位,
+    输出时类型为整数的特征转为整数, emptyGroups 中没有值的统计量输出为整数0(与 SummaryStatistics 一致)
+"""
+
+# 特征定义: (特征名, CSV列名, 类型, 槽位个数), 槽位个数大于1时CSV列名为前缀, 后接槽位序号
+featureSchema = [
+    # 流基本信息
+    # 源端口
+    ("srcPort", "Src Port", np.int64, 1),
+    # 目的端口
+    ("dstPort", "Dst Port", np.int64, 1),
+    # 传输层协议
+    ("protocol", "Protocol", np.int64, 1),
+    # 流时间信息
+    # 流持续时间(s)
+    ("flowDuration", "Flow Duration(s)", np.float64, 1),
+    # 数据包个数,首部字节数相关特征
+    # 正向数据包数量
+    ("fwdPktNum", "Fwd Pkt Num", np.int64, 1),
+    # 正向数据包头字节数平均值
+    ("fwdHeadByteMean", "Fwd Head Byte Mean", np.float64, 1),
+    # 正向数据包头字节数标准差
+    ("fwdHeadByteStd", "Fwd Head Byte Std", np.float64, 1),
+    # 反向数据包数量
+    ("bwdPktNum", "Bwd Pkt Num", np.int64, 1),
+    # 反向数据包头字节数平均值
+    ("bwdHeadByteMean", "Bwd Head Byte Mean", np.float64, 1),
+    # 反向数据包头字节数标准差
+    ("bwdHeadByteStd", "Bwd Head Byte Std", np.float64, 1),
+    # 数据包负载字节数相关特征
+    # 具有负载的数据包个数
+    ("flowPktNumWithPld", "Flow Pkt Num With Pld", np.int64, 1),
+    # 流负载字节数总和
+    ("flowPldByteSum", "Flow Pld Byte Sum", np.int64, 1),
+    # 流负载字节数最大值
+    ("flowPldByteMax", "Flow Pld Byte Max", np.int64, 1),
+    # 流负载字节数最小值
+    ("flowPldByteMin", "Flow Pld Byte Min", np.int64, 1),
+    # 流负载字节数平均值
+    ("flowPldByteMean", "Flow Pld Byte Mean", np.float64, 1),
+    # 流负载字节数标准差
+    ("flowPldByteStd", "Flow Pld Byte Std", np.float64, 1),
+    # 具有负载的正向数据包个数
+    ("fwdPktNumWithPld", "Fwd Pkt Num With Pld", np.int64, 1),
+    # 正向数据包负载字节数总和
+    ("fwdPldByteSum", "Fwd Pld Byte Sum", np.int64, 1),
+    # 正向数据包负载字节数最大值
+    ("fwdPldByteMax", "Fwd Pld Byte Max", np.int64, 1),
+    # 正向数据包负载字节数最小值
+    ("fwdPldByteMin", "Fwd Pld Byte Min", np.int64, 1),
+    # 正向数据包负载字节数平均值
+    ("fwdPldByteMean", "Fwd Pld Byte Mean", np.float64, 1),
+    # 正向数据包负载字节数标准差
+    ("fwdPldByteStd", "Fwd Pld Byte Std", np.float64, 1),
+    # 具有负载的反向数据包个数
+    ("bwdPktNumWithPld", "Bwd Pkt Num With Pld", np.int64, 1),
+    # 反向数据包负载字节数总和
+    ("bwdPldByteSum", "Bwd Pld Byte Sum", np.int64, 1),
+    # 反向数据包负载字节数最大值
+    ("bwdPldByteMax", "Bwd Pld Byte Max", np.int64, 1),
+    # 反向数据包负载字节数最小值
+    ("bwdPldByteMin", "Bwd Pld Byte Min", np.int64, 1),
+    # 反向数据包负载字节数平均值
+    ("bwdPldByteMean", "Bwd Pld Byte Mean", np.float64, 1),
+    # 反向数据包负载字节数标准差
+    ("bwdPldByteStd", "Bwd Pld Byte Std", np.float64, 1),
+    # 流速相关特征
+    # 每秒传输的数据包数
+    ("flowPktsS", "Flow Pkts/s", np.float64, 1),
+    # 每秒传输的数据包负载字节数
+    ("flowPldBytesS", "Flow Pld Bytes/s", np.float64, 1),
+    # 每秒正向传输的数据包数
+    ("fwdPktsS", "Fwd Pkts/s", np.float64, 1),
+    # 每秒正向传输的数据包负载字节数
+    ("fwdPldBytesS", "Fwd Pld Bytes/s", np.float64, 1),
+    # 每秒反向传输的数据包数
+    ("bwdPktsS", "Bwd Pkts/s", np.float64, 1),
+    # 每秒反向传输的数据包负载字节数
+    ("bwdPldBytesS", "Bwd Pld Bytes/s", np.float64, 1),
+    # 反向/正向传输的数据包数比例
+    ("pktsRatio", "Pkts Ratio", np.float64, 1),
+    # 反向/正向传输的数据包负载字节数比例
+    ("bytesRatio", "Bytes Ratio", np.float64, 1),
+    # 间隔时间相关特征
+    # 数据包间隔时间最大值
+    ("flowIatMax", "Flow IAT Max", np.float64, 1),
+    # 数据包间隔时间最小值
+    ("flowIatMin", "Flow IAT Min", np.float64, 1),
+    # 数据包间隔时间平均值
+    ("flowIatMean", "Flow IAT Mean", np.float64, 1),
+    # 数据包间隔时间标准差
+    ("flowIatStd", "Flow IAT Std", np.float64, 1),
+    # 正向数据包间隔时间最大值
+    ("fwdIatMax", "Fwd IAT Max", np.float64, 1),
+    # 正向数据包间隔时间最小值
+    ("fwdIatMin", "Fwd IAT Min", np.float64, 1),
+    # 正向数据包间隔时间平均值
+    ("fwdIatMean", "Fwd IAT Mean", np.float64, 1),
+    # 正向数据包间隔时间标准差
+    ("fwdIatStd", "Fwd IAT Std", np.float64, 1),
+    # 反向数据包间隔时间最大值
+    ("bwdIatMax", "Bwd IAT Max", np.float64, 1),
+    # 反向数据包间隔时间最小值
+    ("bwdIatMin", "Bwd IAT Min", np.float64, 1),
+    # 反向数据包间隔时间平均值
+    ("bwdIatMean", "Bwd IAT Mean", np.float64, 1),
+    # 反向数据包间隔时间标准差
+    ("bwdIatStd", "Bwd IAT Std", np.float64, 1),
+    # TCP标志相关特征
+    # 带有FIN的数据包数量
+    ("FINcnt", "FIN Count", np.int64, 1),
+    # 带有SYN的数据包数量
+    ("SYNcnt", "SYN Count", np.int64, 1),
+    # 带有RST的数据包数量
+    ("RSTcnt", "RST Count", np.int64, 1),
+    # 带有PSH的数据包数量
+    ("PSHcnt", "PSH Count", np.int64, 1),
+    # 带有ACK的数据包数量
+    ("ACKcnt", "ACK Count", np.int64, 1),
+    # 带有URG的数据包数量
+    ("URGcnt", "URG Count", np.int64, 1),
+    # 带有ECE的数据包数量
+    ("ECEcnt", "ECE Count", np.int64, 1),
+    # 带有CWR的数据包数量
+    ("CWRcnt", "CWR Count", np.int64, 1),
+    # 正向数据包中设置PSH标志的数量(UDP为0)
+    ("fwdPSHcnt", "Fwd PSH Count", np.int64, 1),
+    # 反向数据包中设置PSH标志的数量(UDP为0)
+    ("bwdPSHcnt", "Bwd PSH Count", np.int64, 1),
+    # 正向数据包中设置URG标志的数量(UDP为0)
+    ("fwdURGcnt", "Fwd URG Count", np.int64, 1),
+    # 反向数据包中设置URG标志的数量(UDP为0)
+    ("bwdURGcnt", "Bwd URG Count", np.int64, 1),
+    # 初始窗口大小
+    # 正向的初始TCP窗口大小(UDP为0)
+    ("fwdInitWinBytes", "Fwd Init Win Bytes", np.int64, 1),
+    # 反向的初始TCP窗口大小(UDP为0)
+    ("bwdInitWinBytes", "Bwd Init Win Bytes", np.int64, 1),
+    # 子流相关特征
+    # 正向子流中数据包的平均数量
+    ("subFlowFwdPkts", "Sub Flow Fwd Pkts", np.float64, 1),
+    # 正向子流中字节的平均数量
+    ("subFlowFwdPldBytes", "Sub Flow Fwd Bytes", np.float64, 1),
+    # 反向子流中数据包的平均数量
+    ("subFlowBwdPkts", "Sub Flow Bwd Pkts", np.float64, 1),
+    # 反向子流中字节的平均数量
+    ("subFlowBwdPldBytes", "Sub Flow Bwd Bytes", np.float64, 1),
+    # 流活动-空闲相关特征
+    # 流在空闲之前处于活动状态的个数
+    ("flowActNum", "Flow Act Num", np.int64, 1),
+    # 流在空闲之前处于活动状态的时间总和
+    ("flowActSum", "Flow Act Sum", np.float64, 1),
+    # 流在空闲之前处于活动状态的时间最大值
+    ("flowActMax", "Flow Act Max", np.float64, 1),
+    # 流在空闲之前处于活动状态的时间最小值
+    ("flowActMin", "Flow Act Min", np.float64, 1),
+    # 流在空闲之前处于活动状态的时间平均值
+    ("flowActMean", "Flow Act Mean", np.float64, 1),
+    # 流在空闲之前处于活动状态的时间标准差
+    ("flowActStd", "Flow Act Std", np.float64, 1),
+    # 流在激活之前处于空闲状态的个数
+    ("flowIdleNum", "Flow Idle Num", np.int64, 1),
+    # 流在激活之前处于空闲状态的时间总和
+    ("flowIdleSum", "Flow Idle Sum", np.float64, 1),
+    # 流在激活之前处于空闲状态的时间最大值
+    ("flowIdleMax", "Flow Idle Max", np.float64, 1),
+    # 流在激活之前处于空闲状态的时间最小值
+    ("flowIdleMin", "Flow Idle Min", np.float64, 1),
+    # 流在激活之前处于空闲状态的时间平均值
+    ("flowIdleMean", "Flow Idle Mean", np.float64, 1),
+    # 流在激活之前处于空闲状态的时间标准差
+    ("flowIdleStd", "Flow Idle Std", np.float64, 1),
+    # 数据包长度分布
+    ("fwdLenDist", "FwdIPlen", np.int64, 150),
+    ("bwdLenDist", "BwdIPlen", np.int64, 150),
+]
+
+# 统计量没有值时输出为整数0的特征组: (判断特征, 阈值, 组内特征), 判断特征的值不大于阈值时该组没有值
+# 第一个数据包总是正向的, 因此 subFlowFwdPkts 为0即子流个数为0; 每个方向的第一个间隔时间被跳过,
+# 因此该方向只有一个数据包时没有间隔时间; 输出的会话流至少有两个数据包, 会话流间隔时间总是有值
+emptyGroups = [
+    ("fwdPktNum", 0, ["fwdHeadByteMean", "fwdHeadByteStd"]),
+    ("bwdPktNum", 0, ["bwdHeadByteMean", "bwdHeadByteStd"]),
+    ("flowPktNumWithPld", 0, ["flowPldByteMean", "flowPldByteStd"]),
+    ("fwdPktNumWithPld", 0, ["fwdPldByteMean", "fwdPldByteStd"]),
+    ("bwdPktNumWithPld", 0, ["bwdPldByteMean", "bwdPldByteStd"]),
+    ("fwdPktNum", 1, ["fwdIatMax", "fwdIatMin", "fwdIatMean", "fwdIatStd"]),
+    ("bwdPktNum", 1, ["bwdIatMax", "bwdIatMin", "bwdIatMean", "bwdIatStd"]),
+    (
+        "subFlowFwdPkts",
+        0,
+        [
+            "subFlowFwdPkts",
+            "subFlowFwdPldBytes",
+            "subFlowBwdPkts",
+            "subFlowBwdPldBytes",
+        ],
+    ),
+    (
+        "flowActNum",
+        0,
+        ["flowActSum", "flowActMax", "flowActMin", "flowActMean", "flowActStd"],
+    ),
+    (
+        "flowIdleNum",
+        0,
+        ["flowIdleSum", "flowIdleMax", "flowIdleMin", "flowIdleMean", "flowIdleStd"],
+    ),
+]
+
+# 特征名 -> 第一个槽位的位置
+featureIndex = {}
+# 特征名 -> 全部槽位
+featureSlices = {}
+# 每个槽位的类型
+featureDtypes = []
+for name, _, dtype, width in featureSchema:
+    featureIndex[name] = len(featureDtypes)
+    featureSlices[name] = slice(len(featureDtypes), len(featureDtypes) + width)
+    featureDtypes.extend([dtype] * width)
+# 特征向量的长度
+featureNum = len(featureDtypes)
+
+# 类型为整数的连续槽位 [start, stop), 输出时转为整数
+intRuns = []
+for i, dtype in enumerate(featureDtypes):
+    if dtype != np.int64:
+        continue
+    if intRuns and intRuns[-1][1] == i:
+        intRuns[-1][1] = i + 1
+    else:
+        intRuns.append([i, i + 1])
+
+# 没有值的特征组: (判断特征的槽位, 阈值, 组内特征的槽位)
+emptySlots = [
+    (featureIndex[countName], threshold, [featureIndex[name] for name in names])
+    for countName, threshold, names in emptyGroups
+]
+
+
+def newFeatureMatrix(flowNum: int) -> np.ndarray:
+    """分配 flowNum 个会话流的特征矩阵, 每行为一个会话流的特征向量"""
+    return np.zeros((flowNum, featureNum), dtype=np.float64)
+
+
+def formatRows(matrix: np.ndarray) -> list:
+    """
+    将特征矩阵转为输出行
+
+    Parameters
+    ----------
+    matrix : np.ndarray
+        形状为 [会话流个数, featureNum] 的特征矩阵
+
+    Returns
+    -------
+    rows : list
+        每个会话流的特征值列表, 类型为整数的特征和没有值的统计量为 int, 其余为 float
+
+    """
+    rows = matrix.astype(object)
+    for start, stop in intRuns:
+        rows[:, start:stop] = matrix[:, start:stop].astype(np.int64).astype(object)
+    for countSlot, threshold, slots in emptySlots:
+        empty = np.flatnonzero(matrix[:, countSlot] <= threshold)
+        rows[np.ix_(empty, slots)] = 0
+    return rows.tolist()
+
+
 class FlowFeature:
     """会话流统计特征与数据包长度分布"""
 
-    def __init__(self) -> None:
-        """流基本信息"""
-        # # 流ID
-        # self.flowId = None
-        # # 源IP地址
-        # self.srcIP = None
-        # # 目的IP地址
-        # self.dstIP = None
-        # 源端口
-        self.srcPort = 0
-        # 目的端口
-        self.dstPort = 0
-        # 传输层协议
-        self.protocol = 0
-
-        """流时间信息"""
-        # # 流开始时间(s)
-        # self.startTime = 0
-        # # 流结束时间(s)
-        # self.endTime = 0
-        # 流持续时间(s)
-        self.flowDuration = 0
-
-        """数据包个数,首部字节数相关特征"""
-        # 正向数据包数量
-        self.fwdPktNum = 0
-        # 正向数据包头字节数平均值
-        self.fwdHeadByteMean = 0
-        # 正向数据包头字节数标准差
-        self.fwdHeadByteStd = 0
-
-        # 反向数据包数量
-        self.bwdPktNum = 0
-        # 反向数据包头字节数平均值
-        self.bwdHeadByteMean = 0
-        # 反向数据包头字节数标准差
-        self.bwdHeadByteStd = 0
-
-        """数据包负载字节数相关特征"""
-        # 具有负载的数据包个数
-        self.flowPktNumWithPld = 0
-        # 流负载字节数总和
-        self.flowPldByteSum = 0
-        # 流负载字节数最大值
-        self.flowPldByteMax = 0
-        # 流负载字节数最小值
-        self.flowPldByteMin = 0
-        # 流负载字节数平均值
-        self.flowPldByteMean = 0
-        # 流负载字节数标准差
-        self.flowPldByteStd = 0
-
-        # 具有负载的正向数据包个数
-        self.fwdPktNumWithPld = 0
-        # 正向数据包负载字节数总和
-        self.fwdPldByteSum = 0
-        # 正向数据包负载字节数最大值
-        self.fwdPldByteMax = 0
-        # 正向数据包负载字节数最小值
-        self.fwdPldByteMin = 0
-        # 正向数据包负载字节数平均值
-        self.fwdPldByteMean = 0
-        # 正向数据包负载字节数标准差
-        self.fwdPldByteStd = 0
-
-        # 具有负载的反向数据包个数
-        self.bwdPktNumWithPld = 0
-        # 反向数据包负载字节数总和
-        self.bwdPldByteSum = 0
-        # 反向数据包负载字节数最大值
-        self.bwdPldByteMax = 0
-        # 反向数据包负载字节数最小值
-        self.bwdPldByteMin = 0
-        # 反向数据包负载字节数平均值
-        self.bwdPldByteMean = 0
-        # 反向数据包负载字节数标准差
-        self.bwdPldByteStd = 0
-
-        """流速相关特征"""
-        # 每秒传输的数据包数
-        self.flowPktsS = 0
-        # 每秒传输的数据包负载字节数
-        self.flowPldBytesS = 0
-
-        # 每秒正向传输的数据包数
-        self.fwdPktsS = 0
-        # 每秒正向传输的数据包负载字节数
-        self.fwdPldBytesS = 0
-
-        # 每秒反向传输的数据包数
-        self.bwdPktsS = 0
-        # 每秒反向传输的数据包负载字节数
-        self.bwdPldBytesS = 0
-
-        # 反向/正向传输的数据包数比例
-        self.pktsRatio = 0
-        # 反向/正向传输的数据包负载字节数比例
-        self.bytesRatio = 0
-
-        """间隔时间相关特征"""
-        # 数据包间隔时间最大值
-        self.flowIatMax = 0
-        # 数据包间隔时间最小值
-        self.flowIatMin = 0
-        # 数据包间隔时间平均值
-        self.flowIatMean = 0
-        # 数据包间隔时间标准差
-        self.flowIatStd = 0
-
-        # 正向数据包间隔时间最大值
-        self.fwdIatMax = 0
-        # 正向数据包间隔时间最小值
-        self.fwdIatMin = 0
-        # 正向数据包间隔时间平均值
-        self.fwdIatMean = 0
-        # 正向数据包间隔时间标准差
-        self.fwdIatStd = 0
-
-        # 反向数据包间隔时间最大值
-        self.bwdIatMax = 0
-        # 反向数据包间隔时间最小值
-        self.bwdIatMin = 0
-        # 反向数据包间隔时间平均值
-        self.bwdIatMean = 0
-        # 反向数据包间隔时间标准差
-        self.bwdIatStd = 0
-
-        """TCP标志相关特征"""
-        # 带有FIN的数据包数量
-        self.FINcnt = 0
-        # 带有SYN的数据包数量
-        self.SYNcnt = 0
-        # 带有RST的数据包数量
-        self.RSTcnt = 0
-        # 带有PSH的数据包数量
-        self.PSHcnt = 0
-        # 带有ACK的数据包数量
-        self.ACKcnt = 0
-        # 带有URG的数据包数量
-        self.URGcnt = 0
-        # 带有ECE的数据包数量
-        self.ECEcnt = 0
-        # 带有CWR的数据包数量
-        self.CWRcnt = 0
-
-        # 正向数据包中设置PSH标志的数量(UDP为0)
-        self.fwdPSHcnt = 0
-        # 反向数据包中设置PSH标志的数量(UDP为0)
-        self.bwdPSHcnt = 0
-        # 正向数据包中设置URG标志的数量(UDP为0)
-        self.fwdURGcnt = 0
-        # 反向数据包中设置URG标志的数量(UDP为0)
-        self.bwdURGcnt = 0
-
-        """初始窗口大小"""
-        # 正向的初始TCP窗口大小(UDP为0)
-        self.fwdInitWinBytes = 0
-        # 反向的初始TCP窗口大小(UDP为0)
-        self.bwdInitWinBytes = 0
-
-        """子流相关特征"""
-        # 正向子流中数据包的平均数量
-        self.subFlowFwdPkts = 0
-        # 正向子流中字节的平均数量
-        self.subFlowFwdPldBytes = 0
-        # 反向子流中数据包的平均数量
-        self.subFlowBwdPkts = 0
-        # 反向子流中字节的平均数量
-        self.subFlowBwdPldBytes = 0
-
-        """流活动-空闲相关特征"""
-        # 流在空闲之前处于活动状态的个数
-        self.flowActNum = 0
-        # 流在空闲之前处于活动状态的时间总和
-        self.flowActSum = 0
-        # 流在空闲之前处于活动状态的时间最大值
-        self.flowActMax = 0
-        # 流在空闲之前处于活动状态的时间最小值
-        self.flowActMin = 0
-        # 流在空闲之前处于活动状态的时间平均值
-        self.flowActMean = 0
-        # 流在空闲之前处于活动状态的时间标准差
-        self.flowActStd = 0
-
-        # 流在激活之前处于空闲状态的个数
-        self.flowIdleNum = 0
-        # 流在激活之前处于空闲状态的时间总和
-        self.flowIdleSum = 0
-        # 流在激活之前处于空闲状态的时间最大值
-        self.flowIdleMax = 0
-        # 流在激活之前处于空闲状态的时间最小值
-        self.flowIdleMin = 0
-        # 流在激活之前处于空闲状态的时间平均值
-        self.flowIdleMean = 0
-        # 流在激活之前处于空闲状态的时间标准差
-        self.flowIdleStd = 0
-
-        """数据包长度分布"""
-        self.fwdLenDist = []
-        self.bwdLenDist = []
+    def __init__(self, values: np.ndarray = None) -> None:
+        """
+        初始化特征向量
+
+        Parameters
+        ----------
+        values : np.ndarray
+            特征向量, 可以是特征矩阵的一行, 为None时分配新的特征向量
+
+        Returns
+        -------
+        None
+
+        """
+        self.values = np.zeros(featureNum) if values is None else values
+
+    def __getitem__(self, name: str):
+        return self.values[featureIndex[name]]
+
+    def __setitem__(self, name: str, value) -> None:
+        self.values[featureIndex[name]] = value
+
+    def setValues(self, name: str, values) -> None:
+        """从特征 name 的槽位开始依次写入连续的多个槽位"""
+        start = featureIndex[name]
+        self.values[start : start + len(values)] = values
 
     def calRate(self) -> None:
         """
@@ -215,15 +316,15 @@ class FlowFeature:
         None
 
         """
-        self.fwdPktsS = self.fwdPktNum / self.flowDuration
-        self.fwdPldBytesS = self.fwdPldByteSum / self.flowDuration
-        self.bwdPktsS = self.bwdPktNum / self.flowDuration
-        self.bwdPldBytesS = self.bwdPldByteSum / self.flowDuration
-        self.flowPktsS = self.fwdPktsS + self.bwdPktsS
-        self.flowPldBytesS = self.fwdPldBytesS + self.bwdPldBytesS
+        self["fwdPktsS"] = self["fwdPktNum"] / self["flowDuration"]
+        self["fwdPldBytesS"] = self["fwdPldByteSum"] / self["flowDuration"]
+        self["bwdPktsS"] = self["bwdPktNum"] / self["flowDuration"]
+        self["bwdPldBytesS"] = self["bwdPldByteSum"] / self["flowDuration"]
+        self["flowPktsS"] = self["fwdPktsS"] + self["bwdPktsS"]
+        self["flowPldBytesS"] = self["fwdPldBytesS"] + self["bwdPldBytesS"]
 
-        self.pktsRatio = (self.bwdPktNum + 1) / (self.fwdPktNum + 1)
-        self.bytesRatio = (self.bwdPldByteSum + 1) / (self.fwdPldByteSum + 1)
+        self["pktsRatio"] = (self["bwdPktNum"] + 1) / (self["fwdPktNum"] + 1)
+        self["bytesRatio"] = (self["bwdPldByteSum"] + 1) / (self["fwdPldByteSum"] + 1)
 
     def calSubFlow(self, subFlowcnt: int) -> None:
         """
@@ -240,10 +341,16 @@ class FlowFeature:
 
         """
         if subFlowcnt > 0:
-            self.subFlowFwdPkts = self.fwdPktNum / subFlowcnt
-            self.subFlowFwdPldBytes = self.fwdPldByteSum / subFlowcnt
-            self.subFlowBwdPkts = self.bwdPktNum / subFlowcnt
-            self.subFlowBwdPldBytes = self.bwdPldByteSum / subFlowcnt
+            self["subFlowFwdPkts"] = self["fwdPktNum"] / subFlowcnt
+            self["subFlowFwdPldBytes"] = self["fwdPldByteSum"] / subFlowcnt
+            self["subFlowBwdPkts"] = self["bwdPktNum"] / subFlowcnt
+            self["subFlowBwdPldBytes"] = self["bwdPldByteSum"] / subFlowcnt
+        else:
+            # 参数扫描时同一个对象会依次计算多组参数的特征, 需要清除上一组参数的结果
+            self["subFlowFwdPkts"] = 0
+            self["subFlowFwdPldBytes"] = 0
+            self["subFlowBwdPkts"] = 0
+            self["subFlowBwdPldBytes"] = 0
 
     def returnFeature(self) -> list:
         """
@@ -256,110 +363,20 @@ class FlowFeature:
         Returns
         -------
         featureValue : list
-            会话流的统计特征
+            会话流的统计特征, 顺序与 getFeatureName 一致
 
         """
-        featureValue = []
-        # 遍历类中的所有特征
-        for name, value in vars(self).items():
-            if name == "fwdLenDist" or name == "bwdLenDist":
-                featureValue.extend(value)
-            else:
-                featureValue.append(value)
-        return featureValue
+        return formatRows(self.values[None, :])[0]
 
 
 def getFeatureName():
     """返回所有特征名"""
     # CSV文件列名
-    csvColumnName = [
-        # "Flow ID",
-        # "Src IP",
-        # "Dst IP",
-        "Src Port",
-        "Dst Port",
-        "Protocol",
-        # "Start Time(s)",
-        # "End Time(s)",
-        "Flow Duration(s)",
-        "Fwd Pkt Num",
-        "Fwd Head Byte Mean",
-        "Fwd Head Byte Std",
-        "Bwd Pkt Num",
-        "Bwd Head Byte Mean",
-        "Bwd Head Byte Std",
-        "Flow Pkt Num With Pld",
-        "Flow Pld Byte Sum",
-        "Flow Pld Byte Max",
-        "Flow Pld Byte Min",
-        "Flow Pld Byte Mean",
-        "Flow Pld Byte Std",
-        "Fwd Pkt Num With Pld",
-        "Fwd Pld Byte Sum",
-        "Fwd Pld Byte Max",
-        "Fwd Pld Byte Min",
-        "Fwd Pld Byte Mean",
-        "Fwd Pld Byte Std",
-        "Bwd Pkt Num With Pld",
-        "Bwd Pld Byte Sum",
-        "Bwd Pld Byte Max",
-        "Bwd Pld Byte Min",
-        "Bwd Pld Byte Mean",
-        "Bwd Pld Byte Std",
-        "Flow Pkts/s",
-        "Flow Pld Bytes/s",
-        "Fwd Pkts/s",
-        "Fwd Pld Bytes/s",
-        "Bwd Pkts/s",
-        "Bwd Pld Bytes/s",
-        "Pkts Ratio",
-        "Bytes Ratio",
-        "Flow IAT Max",
-        "Flow IAT Min",
-        "Flow IAT Mean",
-        "Flow IAT Std",
-        "Fwd IAT Max",
-        "Fwd IAT Min",
-        "Fwd IAT Mean",
-        "Fwd IAT Std",
-        "Bwd IAT Max",
-        "Bwd IAT Min",
-        "Bwd IAT Mean",
-        "Bwd IAT Std",
-        "FIN Count",
-        "SYN Count",
-        "RST Count",
-        "PSH Count",
-        "ACK Count",
-        "URG Count",
-        "ECE Count",
-        "CWR Count",
-        "Fwd PSH Count",
-        "Bwd PSH Count",
-        "Fwd URG Count",
-        "Bwd URG Count",
-        "Fwd Init Win Bytes",
-        "Bwd Init Win Bytes",
-        "Sub Flow Fwd Pkts",
-        "Sub Flow Fwd Bytes",
-        "Sub Flow Bwd Pkts",
-        "Sub Flow Bwd Bytes",
-        "Flow Act Num",
-        "Flow Act Sum",
-        "Flow Act Max",
-        "Flow Act Min",
-        "Flow Act Mean",
-        "Flow Act Std",
-        "Flow Idle Num",
-        "Flow Idle Sum",
-        "Flow Idle Max",
-        "Flow Idle Min",
-        "Flow Idle Mean",
-        "Flow Idle Std",
-    ]
-    for i in range(150):
-        csvColumnName.append("FwdIPlen" + str(i))
-    for i in range(150):
-        csvColumnName.append("BwdIPlen" + str(i))
+    csvColumnName = []
+    for _, columnName, _, width in featureSchema:
+        if width == 1:
+            csvColumnName.append(columnName)
+        else:
+            csvColumnName.extend(columnName + str(i) for i in range(width))
     csvColumnName.append("Label")
     return csvColumnName
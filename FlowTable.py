@@ -0,0 +1,421 @@
+import heapq
+import pickle
+import tempfile
+from itertools import count
+
+from BasicFlow import BasicFlow
+from BasicPacketInfo import BasicPacketInfo
+from TimerWheel import TimerWheel
+import config
+
+"""
+    多会话流的流表
+    一个pcap文件中可以包含任意多个会话流, 按与方向无关的五元组(见 BasicPacketInfo.getFlowKey)
+    在哈希表中查找或创建会话流(BasicFlow 或 flowClass), 会话流在以下情况下结束并立即交给输出函数:
+    1. 双方都发送了FIN, 或任一方发送了RST
+    2. 空闲时间超过 idleTimeout
+    3. 持续时间超过 flowTimeout
+    4. 文件读取完毕
+    超时由时间轮驱动: 每个会话流只保留一个定时器, 数据包到达时不移动定时器,
+    定时器到期时若会话流仍在活动, 则按其最新的超时时间重新添加(惰性重调度)
+    内存中的会话流个数超过 maxFlows 时, 按 evictPolicy 选出一批会话流写入磁盘(SpillStore),
+    之后该会话流的数据包到达时再读回内存继续统计, 定时器到期或文件读取完毕时从磁盘读出并输出,
+    读回的会话流留下的空间超过仍在磁盘上的会话流时整理临时文件, 因此磁盘占用与内存一样有上限,
+    因此输出的会话流及其顺序与不限制内存时完全相同
+    输出顺序只取决于数据包序列: 同一次时间推进中到期的会话流按超时时间和创建顺序结束,
+    定时器只在时间推进到超时时间所在的刻度后才结束会话流,
+    文件读取完毕时剩余的会话流(包括磁盘上的)按创建顺序结束
+"""
+
+# 淘汰策略 -> 排序依据, 值越小越先被写入磁盘
+evictPolicies = {
+    # 最久没有数据包到达
+    "lru": lambda flow: flow.flowEndTS,
+    # 数据包个数最少
+    "packets": lambda flow: flow.getPacketNum(),
+}
+
+
+# 临时文件中已读回的会话流占用的空间至少达到该字节数时才整理, 避免频繁复制很小的文件
+spillCompactBytes = 1 << 20
+
+
+class SpillStore:
+    """保存被淘汰会话流的磁盘存储, 会话流序列化后追加写入临时文件"""
+
+    def __init__(self, spillDir=None) -> None:
+        """
+        初始化磁盘存储
+
+        Parameters
+        ----------
+        spillDir : str
+            临时文件所在文件夹, 为None时使用系统临时文件夹
+
+        Returns
+        -------
+        None
+
+        """
+        self.spillDir = spillDir
+        self.spillFile = tempfile.TemporaryFile(dir=spillDir)
+        # 流键 -> (文件偏移, 长度, 会话流序号, 超时时间)
+        self.index = {}
+        # 仍在磁盘上的会话流的总字节数
+        self.liveBytes = 0
+        # 临时文件的总字节数
+        self.fileBytes = 0
+
+    def __contains__(self, flowKey: tuple) -> bool:
+        return flowKey in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def put(self, flowKey: tuple, flow: BasicFlow, serial: int, deadline: int) -> None:
+        """将会话流写入磁盘"""
+        data = pickle.dumps(flow, pickle.HIGHEST_PROTOCOL)
+        self.spillFile.seek(self.fileBytes)
+        self.spillFile.write(data)
+        self.index[flowKey] = (self.fileBytes, len(data), serial, deadline)
+        self.liveBytes += len(data)
+        self.fileBytes += len(data)
+
+    def pop(self, flowKey: tuple) -> BasicFlow:
+        """从磁盘读回会话流"""
+        offset, length, _, _ = self.index.pop(flowKey)
+        self.spillFile.seek(offset)
+        flow = pickle.loads(self.spillFile.read(length))
+        self.liveBytes -= length
+        # 已读回的会话流占用的空间超过仍在磁盘上的会话流时整理临时文件
+        deadBytes = self.fileBytes - self.liveBytes
+        if deadBytes > max(self.liveBytes, spillCompactBytes):
+            self.compact()
+        return flow
+
+    def compact(self) -> None:
+        """将仍在磁盘上的会话流按原顺序复制到新的临时文件, 释放已读回的会话流占用的空间"""
+        spillFile = tempfile.TemporaryFile(dir=self.spillDir)
+        entries = sorted(self.index.items(), key=lambda entry: entry[1][0])
+        for flowKey, (offset, length, serial, deadline) in entries:
+            self.spillFile.seek(offset)
+            self.index[flowKey] = (spillFile.tell(), length, serial, deadline)
+            spillFile.write(self.spillFile.read(length))
+        self.spillFile.close()
+        self.spillFile = spillFile
+        self.fileBytes = self.liveBytes
+
+    def getSerial(self, flowKey: tuple) -> int:
+        return self.index[flowKey][2]
+
+    def getDeadline(self, flowKey: tuple) -> int:
+        return self.index[flowKey][3]
+
+    def close(self) -> None:
+        """关闭并删除临时文件"""
+        self.spillFile.close()
+
+
+class FlowTable:
+    """按五元组管理多个会话流"""
+
+    def __init__(
+        self,
+        emit,
+        idleTimeout=config.activityTimeout,
+        flowTimeout=config.flowTimeout,
+        activityTimeout=config.activityTimeout,
+        subFlowTimeout=config.subFlowTimeout,
+        packetNumMax=config.packetNumMax,
+        packetLenMax=config.packetLenMax,
+        variants=(),
+        flowClass=BasicFlow,
+        tick=1000,
+        timerWheel=True,
+        maxFlows=0,
+        evictPolicy="lru",
+        spillDir=None,
+    ) -> None:
+        """
+        初始化流表
+
+        Parameters
+        ----------
+        emit : function
+            输出函数, 参数为已结束的 BasicFlow
+
+        idleTimeout : int
+            会话流空闲超时阈值(us), 超过后会话流结束
+
+        flowTimeout : int
+            会话流最大持续时间(us), 超过后会话流结束
+
+        activityTimeout, subFlowTimeout, packetNumMax, packetLenMax : int
+            传递给 BasicFlow 的参数
+
+        variants : list
+            参数扫描中其余各组 BasicFlow 参数, 见 BasicFlow.FlowVariant
+
+        flowClass : type
+            会话流的实现, BasicFlow 或接口相同的 ColumnarFlow
+
+        tick : int
+            超时检查的精度(us)
+
+        timerWheel : bool
+            是否使用时间轮, 为False时每隔 tick 扫描全部会话流(用于对比测试)
+
+        maxFlows : int
+            内存中最多保留的会话流个数, 为0时不限制
+
+        evictPolicy : str
+            超过 maxFlows 时的淘汰策略, 见 evictPolicies
+
+        spillDir : str
+            被淘汰会话流的临时文件所在文件夹
+
+        Returns
+        -------
+        None
+
+        """
+        self.emit = emit
+        self.idleTimeout = idleTimeout
+        self.flowTimeout = flowTimeout
+        self.activityTimeout = activityTimeout
+        self.subFlowTimeout = subFlowTimeout
+        self.packetNumMax = packetNumMax
+        self.packetLenMax = packetLenMax
+        self.variants = variants
+        self.flowClass = flowClass
+
+        # 流键 -> 会话流
+        self.flows = {}
+        # 流键 -> 已发送FIN的方向(1: 正向, 2: 反向)
+        self.finFlags = {}
+        # 流键 -> 会话流序号(内存中和磁盘上的会话流都有), 用于识别作废的定时器
+        self.serials = {}
+        self.serialGenerator = count()
+
+        # 内存限制和淘汰策略
+        self.maxFlows = maxFlows
+        self.evictKey = evictPolicies[evictPolicy]
+        self.spillStore = SpillStore(spillDir) if maxFlows > 0 else None
+        # 内存中会话流个数的峰值, 写入磁盘, 读回内存, 以及结束时在磁盘上的会话流个数
+        self.counters = {
+            "peakFlows": 0,
+            "spilled": 0,
+            "restored": 0,
+            "finishedOnDisk": 0,
+        }
+
+        # 已读取的最大时间戳, 数据包乱序时时间不回退
+        self.now = 0
+        # 时间轮, 定时器对象为 (流键, 会话流序号, 添加定时器时的超时时间)
+        self.timerWheel = TimerWheel(tick=tick) if timerWheel else None
+        # 不使用时间轮时, 扫描的间隔和下一次扫描超时会话流的时间
+        self.tick = tick
+        self.nextSweep = 0
+
+    def lookup(self, packet: BasicPacketInfo, flowKey: tuple):
+        """
+        查找数据包所属的会话流, 如果该会话流在这个数据包到达时已超时则先将其结束
+
+        Parameters
+        ----------
+        packet : BasicPacketInfo
+            基本数据包信息
+
+        flowKey : tuple
+            数据包的流键
+
+        Returns
+        -------
+        flow : BasicFlow
+            数据包所属的会话流, 不存在时返回None
+
+        """
+        flow = self.flows.get(flowKey)
+        # 会话流在磁盘上, 先读回内存
+        if flow is None and self.spillStore is not None and flowKey in self.spillStore:
+            self.makeRoom()
+            flow = self.spillStore.pop(flowKey)
+            self.flows[flowKey] = flow
+            self.counters["restored"] += 1
+        if flow is not None and self.isExpired(flow, packet.getTimeStamp()):
+            self.finishFlow(flowKey)
+            flow = None
+        return flow
+
+    def makeRoom(self) -> None:
+        """内存中的会话流个数达到上限时, 按淘汰策略将其中一批写入磁盘"""
+        if self.maxFlows <= 0 or len(self.flows) < self.maxFlows:
+            return
+        # 每次淘汰十分之一, 使选择的开销均摊到每个数据包上
+        evictNum = max(1, len(self.flows) // 10)
+        victims = heapq.nsmallest(
+            evictNum, self.flows.items(), key=lambda item: self.evictKey(item[1])
+        )
+        for flowKey, flow in victims:
+            del self.flows[flowKey]
+            self.spillStore.put(
+                flowKey, flow, self.serials[flowKey], self.getDeadline(flow)
+            )
+        self.counters["spilled"] += len(victims)
+
+    def isExpired(self, flow: BasicFlow, currentTS: int) -> bool:
+        """判断会话流在 currentTS 时刻是否已空闲超时或超过最大持续时间"""
+        return (
+            currentTS - flow.flowEndTS > self.idleTimeout
+            or currentTS - flow.flowStartTS > self.flowTimeout
+        )
+
+    def getDeadline(self, flow: BasicFlow) -> int:
+        """返回会话流最早的超时时间, 即 isExpired 第一次为True的时刻"""
+        return (
+            min(
+                flow.flowEndTS + self.idleTimeout,
+                flow.flowStartTS + self.flowTimeout,
+            )
+            + 1
+        )
+
+    def needPayload(self, packet: BasicPacketInfo) -> bool:
+        """返回数据包所属会话流是否还需要负载, 作为读取器的负载需求函数"""
+        flow = self.lookup(packet, packet.getFlowKey())
+        return flow is None or flow.needPayload(packet)
+
+    def addPacket(self, packet: BasicPacketInfo) -> None:
+        """
+        将数据包添加到所属会话流中, 必要时创建或结束会话流
+
+        Parameters
+        ----------
+        packet : BasicPacketInfo
+            基本数据包信息
+
+        Returns
+        -------
+        None
+
+        """
+        currentTS = packet.getTimeStamp()
+        flowKey = packet.getFlowKey()
+
+        # 查找会话流, 不存在或已超时则新建
+        flow = self.lookup(packet, flowKey)
+        if flow is None:
+            self.makeRoom()
+            flow = self.flowClass(
+                packet=packet,
+                activityTimeout=self.activityTimeout,
+                subFlowTimeout=self.subFlowTimeout,
+                packetNumMax=self.packetNumMax,
+                packetLenMax=self.packetLenMax,
+                variants=self.variants,
+            )
+            self.flows[flowKey] = flow
+            serial = next(self.serialGenerator)
+            self.serials[flowKey] = serial
+            if self.timerWheel is not None:
+                deadline = self.getDeadline(flow)
+                self.timerWheel.schedule(deadline, (flowKey, serial, deadline))
+            if len(self.flows) > self.counters["peakFlows"]:
+                self.counters["peakFlows"] = len(self.flows)
+        flow.addPacket(packet)
+
+        # TCP连接结束: 任一方发送RST, 或双方都发送了FIN
+        if packet.getProtocol() == 6:
+            if packet.hasFlagRST():
+                self.finishFlow(flowKey)
+            elif packet.hasFlagFIN():
+                finFlag = self.finFlags.get(flowKey, 0)
+                finFlag |= 1 if packet.getSrcIP() == flow.getSrcIP() else 2
+                if finFlag == 3:
+                    self.finishFlow(flowKey)
+                else:
+                    self.finFlags[flowKey] = finFlag
+
+        # 结束所有超时的会话流
+        if currentTS > self.now:
+            self.now = currentTS
+            if self.timerWheel is not None:
+                self.expire(self.now)
+            elif self.now >= self.nextSweep:
+                self.sweep(self.now)
+                self.nextSweep = self.now + self.tick
+
+    def expire(self, currentTS: int) -> None:
+        """推进时间轮, 结束到期的会话流"""
+        for _, _, flowKey, _ in self.dueFlows(currentTS):
+            self.finishFlow(flowKey)
+
+    def dueFlows(self, currentTS: int) -> list:
+        """
+        推进时间轮, 找出到期的会话流, 仍在活动的会话流重新添加定时器
+
+        Parameters
+        ----------
+        currentTS : int
+            当前时间(us)
+
+        Returns
+        -------
+        expired : list
+            [(超时时间, 会话流序号, 流键, 定时器的超时时间)], 按超时时间和创建顺序排列,
+            与定时器在时间轮中的位置无关
+
+        """
+        tick = self.timerWheel.tick
+        expired = []
+        for flowKey, serial, scheduled in self.timerWheel.advance(currentTS):
+            # 会话流已经结束(FIN/RST或到达时超时), 定时器作废
+            if self.serials.get(flowKey) != serial:
+                continue
+            flow = self.flows.get(flowKey)
+            if flow is not None:
+                deadline = self.getDeadline(flow)
+            else:
+                # 磁盘上的会话流不再更新, 超时时间在写入时已确定
+                deadline = self.spillStore.getDeadline(flowKey)
+            # 时间推进到超时时间所在的刻度后才结束
+            if -(-deadline // tick) <= currentTS // tick:
+                expired.append((deadline, serial, flowKey, scheduled))
+            else:
+                self.timerWheel.schedule(deadline, (flowKey, serial, deadline))
+        expired.sort()
+        return expired
+
+    def sweep(self, currentTS: int) -> None:
+        """扫描全部会话流, 结束所有在 currentTS 时刻已超时的会话流"""
+        expired = [
+            flowKey
+            for flowKey, flow in self.flows.items()
+            if self.isExpired(flow, currentTS)
+        ]
+        if self.spillStore is not None:
+            expired.extend(
+                flowKey
+                for flowKey in self.spillStore.index
+                if self.spillStore.getDeadline(flowKey) <= currentTS
+            )
+        for flowKey in expired:
+            self.finishFlow(flowKey)
+
+    def finishFlow(self, flowKey: tuple) -> None:
+        """结束会话流, 将其从流表(或磁盘)中移除并交给输出函数"""
+        flow = self.flows.pop(flowKey, None)
+        if flow is None:
+            flow = self.spillStore.pop(flowKey)
+            self.counters["finishedOnDisk"] += 1
+        self.finFlags.pop(flowKey, None)
+        self.serials.pop(flowKey, None)
+        flow.endSession()
+        self.emit(flow)
+
+    def close(self) -> None:
+        """文件读取完毕, 按创建顺序结束所有剩余的会话流(包括磁盘上的会话流)"""
+        for flowKey in sorted(self.serials, key=self.serials.get):
+            self.finishFlow(flowKey)
+        if self.spillStore is not None:
+            self.spillStore.close()
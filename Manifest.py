@@ -0,0 +1,257 @@
+import os
+import json
+import hashlib
+
+from PayloadShard import headerSize, payloadDtype, lensPath, truncateShard
+
+"""
+    已处理文件清单(extractDataPath/manifest.jsonl), 用于增量提取和崩溃后续跑
+    每行一个JSON对象:
+    1. 第一行 {"params": 参数}, 参数(超时时间, 负载形状, 过滤条件等)不同时清单作废, 重新提取全部文件
+    2. {"label": 标签, "files": [文件信息], "states": [[分片序号, 分片中的会话流个数,
+        统计特征分片字节数, 负载分片字节数], ...]}
+       表示这些文件的输出已完整写入, 以及写完后每组参数的输出中该标签输出分片的状态
+    3. {"reset": 标签}, 该标签已处理的文件发生了变化, 之前的记录作废
+    文件信息为 {"path": 相对pcapPath的路径, "size": 字节数, "mtime": 修改时间(ns), "hash": 内容哈希(可选)}
+    续跑时每个标签的输出分片回滚到最后一条记录的状态, 因此崩溃时写了一半的文件不会留下重复或缺失的行,
+    负载张量分片(.npy)及其附加文件按会话流个数截断, 并重写文件头
+    输出分片缺失或短于记录的状态时(系统崩溃或断电导致记录的数据没有写入磁盘), 重新提取该标签
+"""
+
+# 计算内容哈希时每次读取的字节数
+hashChunkSize = 1 << 20
+
+
+class Manifest:
+    """已处理文件清单"""
+
+    def __init__(self, extractDataPath, pcapPath, params, hashInputs=False) -> None:
+        """
+        初始化清单
+
+        Parameters
+        ----------
+        extractDataPath : str
+            数据提取文件夹, 清单保存在该文件夹下
+
+        pcapPath : str
+            pcap文件夹, 清单中的路径相对于该文件夹
+
+        params : dict
+            影响输出的参数, 与清单中记录的参数不同时清单作废
+
+        hashInputs : bool
+            是否记录并比较文件内容的哈希值, 为False时只比较文件大小和修改时间
+
+        Returns
+        -------
+        None
+
+        """
+        self.extractDataPath = extractDataPath
+        self.manifestFile = extractDataPath + "manifest.jsonl"
+        self.pcapPath = pcapPath
+        self.params = params
+        self.hashInputs = hashInputs
+        # 标签 -> {相对路径: 文件信息}
+        self.files = {}
+        # 标签 -> 每组参数的 (分片序号, 分片中的会话流个数, 统计特征分片字节数, 负载分片字节数)
+        self.states = {}
+
+    def create(self) -> None:
+        """创建新的清单, 写入参数"""
+        self.files, self.states = {}, {}
+        with open(self.manifestFile, "w") as f:
+            f.write(json.dumps({"params": self.params}) + "\n")
+
+    def load(self) -> bool:
+        """
+        读取已有的清单
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        valid : bool
+            清单存在且参数与当前参数一致时为True
+
+        """
+        if not os.path.exists(self.manifestFile):
+            return False
+        with open(self.manifestFile, "rb") as f:
+            lines = f.read().split(b"\n")
+        try:
+            if json.loads(lines[0])["params"] != self.params:
+                return False
+        except (ValueError, KeyError):
+            return False
+
+        # 最后一条记录之后的部分(崩溃时写了一半的行)在续跑时截断
+        validSize = len(lines[0]) + 1
+        for line in lines[1:]:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break
+            if "reset" in entry:
+                self.files.pop(entry["reset"], None)
+                self.states.pop(entry["reset"], None)
+            else:
+                label = entry["label"]
+                for info in entry["files"]:
+                    self.files.setdefault(label, {})[info["path"]] = info
+                self.states[label] = [tuple(state) for state in entry["states"]]
+            validSize += len(line) + 1
+        with open(self.manifestFile, "r+b") as f:
+            f.truncate(validSize)
+        return True
+
+    def fileInfo(self, pcapFile: str) -> dict:
+        """返回文件的路径, 大小, 修改时间和(可选的)内容哈希"""
+        stat = os.stat(pcapFile)
+        info = {
+            "path": os.path.relpath(pcapFile, self.pcapPath),
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+        }
+        if self.hashInputs:
+            digest = hashlib.sha256()
+            with open(pcapFile, "rb") as f:
+                for chunk in iter(lambda: f.read(hashChunkSize), b""):
+                    digest.update(chunk)
+            info["hash"] = digest.hexdigest()
+        return info
+
+    def isUnchanged(self, recorded: dict, pcapFile: str) -> bool:
+        """判断文件与清单中的记录是否一致, 两者都有哈希值时不比较修改时间"""
+        info = self.fileInfo(pcapFile)
+        if info["size"] != recorded["size"]:
+            return False
+        if "hash" in info and "hash" in recorded:
+            return info["hash"] == recorded["hash"]
+        return info["mtime"] == recorded["mtime"]
+
+    def plan(self, labelFiles: dict, outputInfos: list) -> set:
+        """
+        确定需要跳过的文件, 并将输出分片恢复到清单记录的状态
+
+        已处理的文件被修改或删除时, 该标签的输出无法只替换其中一部分, 因此重新提取整个标签
+
+        Parameters
+        ----------
+        labelFiles : dict
+            标签 -> 该标签下的全部pcap文件
+
+        outputInfos : list
+            每组参数的输出文件信息(OutputInfo), 恢复后包含各标签当前的分片序号和会话流个数
+
+        Returns
+        -------
+        doneFiles : set
+            已处理且没有变化的pcap文件
+
+        """
+        doneFiles = set()
+        for label, recorded in list(self.files.items()):
+            current = {
+                os.path.relpath(f, self.pcapPath): f for f in labelFiles.get(label, [])
+            }
+            if self.isIntact(label, outputInfos) and all(
+                path in current and self.isUnchanged(info, current[path])
+                for path, info in recorded.items()
+            ):
+                doneFiles.update(current[path] for path in recorded)
+                continue
+            # 该标签的记录作废
+            print("Re-extracting", label)
+            del self.files[label]
+            self.states.pop(label, None)
+            self.append({"reset": label})
+
+        for i, outputInfo in enumerate(outputInfos):
+            # 删除没有记录的标签的输出, 回滚有记录的标签的输出
+            for dataPath, sizeIdx in (
+                (outputInfo.stcDataPath, 2),
+                (outputInfo.pldDataPath, 3),
+            ):
+                for name in os.listdir(dataPath):
+                    stem = name.split(".")[0]
+                    label = stem.rstrip("0123456789")
+                    shard = int(stem[len(label) :])
+                    state = self.states[label][i] if label in self.states else None
+                    if state is None or shard > state[0]:
+                        os.remove(dataPath + name)
+                    elif shard == state[0] and name.endswith(".npy"):
+                        truncateShard(dataPath + name, state[1])
+                    elif shard == state[0]:
+                        with open(dataPath + name, "r+b") as f:
+                            f.truncate(state[sizeIdx])
+
+            for label, states in self.states.items():
+                shard, rows, _, _ = states[i]
+                outputInfo.info[label] = [
+                    shard,
+                    rows,
+                    outputInfo.stcDataPath + label + str(shard) + ".csv",
+                    outputInfo.pldDataPath + label + str(shard) + outputInfo.pldExt,
+                ]
+        return doneFiles
+
+    def isIntact(self, label: str, outputInfos: list) -> bool:
+        """判断该标签每组参数的输出分片是否都存在, 且当前分片不短于清单记录的状态"""
+        if label not in self.states:
+            return False
+        for outputInfo, (shard, rows, stcSize, pldSize) in zip(
+            outputInfos, self.states[label]
+        ):
+            stem = label + str(shard)
+            # 之前的分片已写满, 只检查是否存在
+            for i in range(shard):
+                if not (
+                    os.path.exists(outputInfo.stcDataPath + label + str(i) + ".csv")
+                    and os.path.exists(
+                        outputInfo.pldDataPath + label + str(i) + outputInfo.pldExt
+                    )
+                ):
+                    return False
+            sizes = [
+                (outputInfo.stcDataPath + stem + ".csv", stcSize),
+                (outputInfo.pldDataPath + stem + outputInfo.pldExt, pldSize),
+            ]
+            if outputInfo.payloadFormat == "npy" and rows > 0:
+                lensSize = payloadDtype(outputInfo.payloadShape[0]).itemsize * rows
+                sizes.append((lensPath(sizes[1][0]), headerSize + lensSize))
+            for path, size in sizes:
+                if size > 0 and (
+                    not os.path.exists(path) or os.path.getsize(path) < size
+                ):
+                    return False
+        return True
+
+    def record(self, label: str, pcapFiles: list, outputInfos: list) -> None:
+        """所有文件的输出都已写入输出文件后, 记录这些文件和每组参数中该标签输出分片的状态"""
+        infos = [self.fileInfo(pcapFile) for pcapFile in pcapFiles]
+        for info in infos:
+            self.files.setdefault(label, {})[info["path"]] = info
+        self.states[label] = []
+        for outputInfo in outputInfos:
+            shard, rows, stcFile, pldFile = outputInfo.info[label]
+            self.states[label].append(
+                (
+                    shard,
+                    rows,
+                    os.path.getsize(stcFile),
+                    os.path.getsize(pldFile) if os.path.exists(pldFile) else 0,
+                )
+            )
+        # 所有参数的状态写在同一行, 崩溃后各组参数的输出总是回滚到同一位置
+        self.append({"label": label, "files": infos, "states": self.states[label]})
+
+    def append(self, entry: dict) -> None:
+        """追加一条记录, 写入磁盘后才返回"""
+        with open(self.manifestFile, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
@@ -0,0 +1,384 @@
+import os
+import json
+import mmap
+import hashlib
+
+import numpy as np
+
+from BasicPacketInfo import BasicPacketInfo
+from PacketFilter import PacketFilter
+from PacketIndex import packetDtype
+from PacketReader import openPacketReader
+from PayloadShard import createShard, appendShard, readHeader
+import config
+
+"""
+    解析结果缓存
+    第一次读取pcap文件时, 将所有TCP和UDP数据包的首部字段和负载的前 payloadLen 个字节
+    保存到缓存文件夹, 之后再次提取时直接从缓存构造 BasicPacketInfo, 不再读取和解析原始文件,
+    适用于只修改超时时间或负载形状的参数扫描
+    列式会话流(ColumnarFlow)可以通过 nextColumns 按批次读取缓存的各列, 不逐个构造 BasicPacketInfo
+    生成缓存时按 buildChunk 个数据包一批追加到缓存文件(与 PayloadShard 相同的固定长度文件头),
+    内存占用与pcap文件大小无关
+    每个pcap文件对应三个缓存文件, 文件名为其绝对路径的哈希值:
+    *.pkt.npy: 数据包字段(cacheDtype), payloadOffset 为负载在 *.pld.npy 中的偏移
+    *.pld.npy: 所有数据包负载的前 payloadLen 个字节, 首尾相接
+    *.json: 文件大小, 修改时间和 payloadLen, 与当前文件不一致时重新生成缓存
+    过滤条件在读取缓存时应用, 因此同一个缓存可以用于不同的过滤条件
+"""
+
+# 缓存的传输层协议, 与 PacketReader 支持的协议一致
+cacheProtocols = (6, 17)
+
+# 缓存的数据包字段, 在 PacketIndex.packetDtype 之后增加实际缓存的负载字节数
+# (捕获长度被截断时可能小于 payloadBytes)
+cacheDtype = np.dtype(packetDtype.descr + [("cachedBytes", np.int32)])
+
+# 生成缓存时每批追加的数据包个数
+buildChunk = 1 << 16
+
+# *.pkt.npy 的文件头字节数, cacheDtype 的字段描述超过 PayloadShard.headerSize
+cacheHeaderSize = 512
+
+
+def cacheStem(cachePath: str, filename: str) -> str:
+    """返回pcap文件对应的缓存文件路径前缀"""
+    key = hashlib.sha1(os.path.abspath(filename).encode()).hexdigest()
+    return os.path.join(cachePath, key)
+
+
+def fileIdentity(filename: str, payloadLen: int) -> dict:
+    """返回用于判断缓存是否有效的文件信息"""
+    stat = os.stat(filename)
+    return {
+        "path": os.path.abspath(filename),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime_ns,
+        "payloadLen": payloadLen,
+    }
+
+
+def buildCache(filename: str, cachePath: str, payloadLen: int) -> None:
+    """
+    读取pcap文件, 生成缓存文件
+
+    Parameters
+    ----------
+    filename : str
+        pcap或pcapng文件名, 可以经过压缩
+
+    cachePath : str
+        缓存文件夹
+
+    payloadLen : int
+        每个数据包缓存的最大负载字节数
+
+    Returns
+    -------
+    None
+
+    """
+    stem = cacheStem(cachePath, filename)
+    identity = fileIdentity(filename, payloadLen)
+    packetReader = openPacketReader(
+        filename,
+        packetLenMax=payloadLen,
+        packetFilter=PacketFilter(protocols=cacheProtocols),
+    )
+    # 先写数据文件, 最后写入文件信息, 中断时不会留下看似有效的缓存
+    createShard(stem + ".pkt.tmp.npy", cacheDtype, (), cacheHeaderSize)
+    createShard(stem + ".pld.tmp.npy", np.uint8, ())
+
+    def flush():
+        # 将当前批次追加到缓存文件
+        appendShard(stem + ".pkt.tmp.npy", np.array(rows, dtype=cacheDtype))
+        appendShard(
+            stem + ".pld.tmp.npy", np.frombuffer(b"".join(payloads), dtype=np.uint8)
+        )
+        rows.clear()
+        payloads.clear()
+
+    rows, payloads = [], []
+    payloadOffset = 0
+    packet = packetReader.nextPacket()
+    while packet is not None:
+        rows.append(
+            (
+                packet.id,
+                packet.timeStamp,
+                packet.ipVersion,
+                packet.srcIP >> 64,
+                packet.srcIP & 0xFFFFFFFFFFFFFFFF,
+                packet.dstIP >> 64,
+                packet.dstIP & 0xFFFFFFFFFFFFFFFF,
+                packet.srcPort,
+                packet.dstPort,
+                packet.protocol,
+                packet.ipLength,
+                packet.headBytes,
+                packet.payloadBytes,
+                payloadOffset,
+                packet.flags,
+                packet.sequence or 0,
+                packet.acknowledgment or 0,
+                packet.TCPWindow,
+                len(packet.payload),
+            )
+        )
+        payloads.append(packet.payload)
+        payloadOffset += len(packet.payload)
+        if len(rows) >= buildChunk:
+            flush()
+        packet = packetReader.nextPacket()
+    packetReader.close()
+    flush()
+
+    os.replace(stem + ".pkt.tmp.npy", stem + ".pkt.npy")
+    os.replace(stem + ".pld.tmp.npy", stem + ".pld.npy")
+    with open(stem + ".json.tmp", "w") as f:
+        json.dump(identity, f)
+    os.replace(stem + ".json.tmp", stem + ".json")
+
+
+def isCacheValid(filename: str, cachePath: str, packetLenMax: int) -> bool:
+    """判断缓存是否存在, 与pcap文件一致, 且缓存的负载不短于 packetLenMax"""
+    stem = cacheStem(cachePath, filename)
+    try:
+        with open(stem + ".json") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return False
+    identity = fileIdentity(filename, cached["payloadLen"])
+    return cached == identity and cached["payloadLen"] >= packetLenMax
+
+
+def mapCache(filename: str) -> tuple:
+    """
+    以只读内存映射方式打开缓存文件
+
+    Parameters
+    ----------
+    filename : str
+        .npy 缓存文件名
+
+    Returns
+    -------
+    cacheMap : mmap.mmap
+        内存映射对象, 释放数组之后才能关闭
+
+    array : np.ndarray
+        缓存文件中的一维数组
+
+    """
+    with open(filename, "rb") as f:
+        dtype, _, recordBytes = readHeader(f)
+        offset = f.tell()
+        rows = (os.fstat(f.fileno()).st_size - offset) // recordBytes
+        cacheMap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return cacheMap, np.frombuffer(cacheMap, dtype=dtype, count=rows, offset=offset)
+
+
+class PacketCache:
+    """从缓存读取数据包, 提供与PacketReader相同的nextPacket接口"""
+
+    def __init__(
+        self,
+        filename: str,
+        cachePath: str,
+        packetLenMax: int = config.packetLenMax,
+        payloadLen: int = None,
+        chunkSize: int = 1 << 16,
+        packetFilter: PacketFilter = None,
+    ) -> None:
+        """
+        打开pcap文件的缓存, 缓存无效时先生成缓存
+
+        Parameters
+        ----------
+        filename : str
+            pcap文件名
+
+        cachePath : str
+            缓存文件夹
+
+        packetLenMax : int
+            每个数据包保留的最大负载字节数
+
+        payloadLen : int
+            生成缓存时每个数据包缓存的最大负载字节数, 为None时等于 packetLenMax
+
+        chunkSize : int
+            每个批次的数据包个数
+
+        packetFilter : PacketFilter
+            数据包过滤器, 为None时只保留TCP数据包
+
+        Returns
+        -------
+        None
+
+        """
+        if not isCacheValid(filename, cachePath, packetLenMax):
+            os.makedirs(cachePath, exist_ok=True)
+            buildCache(filename, cachePath, max(payloadLen or 0, packetLenMax))
+        stem = cacheStem(cachePath, filename)
+
+        # 以内存映射方式打开, 只读取用到的部分
+        self.columnsMap, self.columns = mapCache(stem + ".pkt.npy")
+        self.payloadMap, self.payload = mapCache(stem + ".pld.npy")
+
+        self.packetLenMax = packetLenMax
+        self.chunkSize = chunkSize
+        self.packetFilter = PacketFilter() if packetFilter is None else packetFilter
+        # 负载需求函数, 见 PacketReader
+        self.payloadDemand = None
+
+        # 当前批次通过过滤的数据包字段
+        self.chunk = np.empty(0, dtype=cacheDtype)
+        # 当前批次的数据包字段(转为元组列表以加快逐个访问)
+        self.rows = []
+        self.rowPtr = 0
+        # 下一个批次的起始位置
+        self.columnPtr = 0
+
+    def nextChunk(self) -> bool:
+        """读取下一个批次中通过过滤的数据包字段, 已读完时返回False"""
+        if self.columnPtr >= len(self.columns):
+            return False
+        columns = self.columns[self.columnPtr : self.columnPtr + self.chunkSize]
+        # 布尔索引得到的是副本, 不引用内存映射
+        self.chunk = columns[self.packetFilter.mask(columns)]
+        self.rows = []
+        self.rowPtr = 0
+        self.columnPtr += self.chunkSize
+        return True
+
+    def nextColumns(self, payloadNum: int) -> tuple:
+        """
+        读取下一批数据包的各列, 用于列式会话流
+
+        Parameters
+        ----------
+        payloadNum : int
+            需要负载的数据包个数, 只复制本批次前 payloadNum 个数据包的负载
+
+        Returns
+        -------
+        columns : np.ndarray
+            通过过滤的数据包字段(cacheDtype), 包括 nextPacket 尚未返回的数据包, 已读完时为None
+
+        payloads : list
+            前 payloadNum 个数据包的负载, 每个负载最多 packetLenMax 个字节
+
+        """
+        # 先返回当前批次中 nextPacket 尚未返回的数据包
+        columns = self.chunk[self.rowPtr :]
+        while len(columns) == 0:
+            if not self.nextChunk():
+                return None, []
+            columns = self.chunk
+        # 当前批次已全部返回, 之后的 nextPacket 从下一个批次开始
+        self.chunk = self.chunk[:0]
+        self.rows = []
+        self.rowPtr = 0
+
+        payloads = [
+            self.payload[
+                offset : offset + min(cachedBytes, self.packetLenMax)
+            ].tobytes()
+            for offset, cachedBytes in zip(
+                columns["payloadOffset"][:payloadNum].tolist(),
+                columns["cachedBytes"][:payloadNum].tolist(),
+            )
+        ]
+        return columns, payloads
+
+    def nextPacket(self):
+        """
+        读取下一个数据包
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        packetInfo : BasicPacketInfo
+            基本数据包信息
+
+        """
+        # 当前批次已读完, 按过滤器筛选下一个批次
+        while self.rowPtr >= len(self.rows):
+            # 当前批次尚未转换为元组列表
+            if self.rowPtr == 0 and len(self.chunk) > 0:
+                self.rows = self.chunk.tolist()
+            elif not self.nextChunk():
+                return None
+
+        (
+            pktID,
+            timeStamp,
+            ipVersion,
+            srcIPHi,
+            srcIPLo,
+            dstIPHi,
+            dstIPLo,
+            srcPort,
+            dstPort,
+            protocol,
+            ipLength,
+            headBytes,
+            payloadBytes,
+            payloadOffset,
+            flags,
+            sequence,
+            acknowledgment,
+            TCPWindow,
+            cachedBytes,
+        ) = self.rows[self.rowPtr]
+        self.rowPtr += 1
+
+        # UDP没有序列号和确认号, 与 PacketReader 保持一致
+        if protocol != 6:
+            sequence, acknowledgment = None, None
+
+        packetInfo = BasicPacketInfo(
+            pktID=pktID,
+            srcIP=(srcIPHi << 64) | srcIPLo,
+            dstIP=(dstIPHi << 64) | dstIPLo,
+            srcPort=srcPort,
+            dstPort=dstPort,
+            protocol=protocol,
+            timeStamp=timeStamp,
+            ipLength=ipLength,
+            headBytes=headBytes,
+            payloadBytes=payloadBytes,
+            payload=b"",
+            flags=flags,
+            sequence=sequence,
+            acknowledgment=acknowledgment,
+            TCPWindow=TCPWindow,
+            packetLenMax=self.packetLenMax,
+            ipVersion=ipVersion,
+        )
+
+        # 负载, 只在会话流仍需要负载时复制, 且只复制需要保留的前 packetLenMax 个字节
+        if self.payloadDemand is None or self.payloadDemand(packetInfo):
+            packetInfo.payload = self.payload[
+                payloadOffset : payloadOffset + min(cachedBytes, self.packetLenMax)
+            ].tobytes()
+
+        return packetInfo
+
+    def close(self) -> None:
+        """释放缓存文件的内存映射"""
+        # 先释放引用内存映射的数组, 否则内存映射无法关闭
+        self.columns = self.payload = self.chunk = None
+        self.columnsMap.close()
+        self.payloadMap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
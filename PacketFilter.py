@@ -0,0 +1,285 @@
+import sys
+import struct
+from socket import inet_pton, AF_INET, AF_INET6
+
+import numpy as np
+
+import config
+
+"""
+    数据包过滤条件下推
+    在链路层和网络层解析之后, 构造 BasicPacketInfo 之前, 直接在原始数据帧上判断数据包是否保留
+    过滤条件:
+    protocols: 保留的传输层协议集合, 例如 6,17
+    ports: 保留的端口范围, 源端口或目的端口在任一范围内即保留, 例如 80,443,8000-8080
+    allowIP: 保留的IP地址段(CIDR), 源IP或目的IP在任一地址段内即保留
+    denyIP: 丢弃的IP地址段(CIDR), 源IP或目的IP在任一地址段内即丢弃, 优先于allowIP
+"""
+
+# 传输层首部的源端口和目的端口(TCP和UDP相同)
+portHeader = struct.Struct("!HH")
+
+# IP版本 -> IP地址位数
+ipAddressBits = {4: 32, 6: 128}
+
+
+class IPSet:
+    """IP地址段集合, 按前缀长度分组, 每组用集合保存网络号"""
+
+    def __init__(self, cidrs: list) -> None:
+        """
+        初始化IP地址段集合
+
+        Parameters
+        ----------
+        cidrs : list
+            CIDR格式的地址段列表, 例如 ["10.0.0.0/8", "2001:db8::/32", "192.168.1.2"]
+
+        Returns
+        -------
+        None
+
+        """
+        # IP版本 -> {前缀长度: 网络号集合}
+        prefixes = {4: {}, 6: {}}
+        for cidr in cidrs:
+            ip, _, prefixLen = cidr.strip().partition("/")
+            ipVersion = 6 if ":" in ip else 4
+            ipBytes = inet_pton(AF_INET6 if ipVersion == 6 else AF_INET, ip)
+            bits = ipAddressBits[ipVersion]
+            prefixLen = int(prefixLen) if prefixLen else bits
+            if not 0 <= prefixLen <= bits:
+                raise ValueError(cidr)
+            network = int.from_bytes(ipBytes, "big") >> (bits - prefixLen)
+            prefixes[ipVersion].setdefault(prefixLen, set()).add(network)
+
+        # IP版本 -> [(右移位数, 网络号集合)], 前缀短的地址段优先匹配
+        self.groups = {
+            ipVersion: [
+                (ipAddressBits[ipVersion] - prefixLen, networks)
+                for prefixLen, networks in sorted(groups.items())
+            ]
+            for ipVersion, groups in prefixes.items()
+        }
+
+    def contains(self, ip: int, ipVersion: int) -> bool:
+        """判断整数形式的IP地址是否在集合中"""
+        for shift, networks in self.groups[ipVersion]:
+            if ip >> shift in networks:
+                return True
+        return False
+
+    def mask(
+        self, ipVersion: np.ndarray, high: np.ndarray, low: np.ndarray
+    ) -> np.ndarray:
+        """
+        批量判断IP地址是否在集合中, 供 PacketIndex 使用
+
+        Parameters
+        ----------
+        ipVersion : np.ndarray
+            IP版本(4或6)
+
+        high : np.ndarray
+            IP地址的高64位(IPv4为0)
+
+        low : np.ndarray
+            IP地址的低64位
+
+        Returns
+        -------
+        mask : np.ndarray
+            每个IP地址是否在集合中
+
+        """
+        mask = np.zeros(len(ipVersion), dtype=bool)
+        isV4 = ipVersion == 4
+        for shift, networks in self.groups[4]:
+            networks = np.fromiter(networks, dtype=np.uint64)
+            mask |= isV4 & np.isin(low >> np.uint64(shift), networks)
+        for shift, networks in self.groups[6]:
+            if shift >= 64:
+                # 前缀不超过64位, 只需比较高64位
+                if shift < 128:
+                    value = high >> np.uint64(shift - 64)
+                else:
+                    value = np.zeros_like(high)
+                networks = np.fromiter(networks, dtype=np.uint64)
+                mask |= ~isV4 & np.isin(value, networks)
+            else:
+                # 前缀超过64位, 先用高64位筛选候选, 再逐个精确比较
+                highs = np.fromiter(
+                    (network >> (64 - shift) for network in networks), dtype=np.uint64
+                )
+                for i in np.flatnonzero(~isV4 & np.isin(high, highs)):
+                    value = (int(high[i]) << 64 | int(low[i])) >> shift
+                    mask[i] |= value in networks
+        return mask
+
+
+class PacketFilter:
+    """数据包过滤器, 初始化时将过滤条件编译为一个判断函数"""
+
+    def __init__(
+        self,
+        protocols=(6,),
+        ports=None,
+        allowIP=None,
+        denyIP=None,
+    ) -> None:
+        """
+        初始化并编译数据包过滤器
+
+        Parameters
+        ----------
+        protocols : iterable
+            保留的传输层协议号
+
+        ports : list
+            保留的端口范围 [(起始端口, 结束端口)], 为None时不按端口过滤
+
+        allowIP : list
+            保留的IP地址段(CIDR), 为None时不限制
+
+        denyIP : list
+            丢弃的IP地址段(CIDR), 为None时不限制
+
+        Returns
+        -------
+        None
+
+        """
+        self.protocols = frozenset(protocols)
+        # 端口查找表, 下标为端口号, 值为是否保留
+        self.portTable = None
+        if ports:
+            self.portTable = bytearray(65536)
+            for low, high in ports:
+                if not 0 <= low <= high <= 65535:
+                    raise ValueError((low, high))
+                self.portTable[low : high + 1] = b"\x01" * (high - low + 1)
+        self.allowIP = IPSet(allowIP) if allowIP else None
+        self.denyIP = IPSet(denyIP) if denyIP else None
+
+        # 编译后的判断函数
+        self.match = self.compile()
+
+    def __call__(self, packetData: memoryview, network: tuple) -> bool:
+        return self.match(packetData, network)
+
+    def compile(self):
+        """
+        将过滤条件编译为一个判断函数, 只检查实际设置了的条件
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        match : function
+            match(packetData, network), 参数为原始数据帧和网络层解析结果
+            (见 PacketReader.parseIPv4), 返回数据包是否保留
+
+        """
+        protocols, portTable = self.protocols, self.portTable
+        allowIP, denyIP = self.allowIP, self.denyIP
+
+        # 默认只按协议过滤, 例如只保留TCP数据包
+        if portTable is None and allowIP is None and denyIP is None:
+
+            def match(packetData, network):
+                return network[2] in protocols
+
+            return match
+
+        unpackPorts = portHeader.unpack_from
+
+        def match(packetData, network):
+            srcIP, dstIP, protocol, _, l4Start, l4End, ipVersion = network
+            if protocol not in protocols:
+                return False
+            if denyIP is not None and (
+                denyIP.contains(srcIP, ipVersion) or denyIP.contains(dstIP, ipVersion)
+            ):
+                return False
+            if allowIP is not None and not (
+                allowIP.contains(srcIP, ipVersion) or allowIP.contains(dstIP, ipVersion)
+            ):
+                return False
+            if portTable is not None:
+                # 传输层首部不完整时无法取得端口
+                if l4End - l4Start < 4:
+                    return False
+                srcPort, dstPort = unpackPorts(packetData, l4Start)
+                if not (portTable[srcPort] or portTable[dstPort]):
+                    return False
+            return True
+
+        return match
+
+    def mask(self, columns: np.ndarray) -> np.ndarray:
+        """
+        批量判断数据包是否保留, 供 PacketIndex 使用
+
+        Parameters
+        ----------
+        columns : np.ndarray
+            数据包字段, 数据类型为 PacketIndex.packetDtype
+
+        Returns
+        -------
+        mask : np.ndarray
+            每个数据包是否保留
+
+        """
+        mask = np.isin(columns["protocol"], list(self.protocols))
+        ipVersion = columns["ipVersion"]
+        if self.denyIP is not None:
+            mask &= ~self.denyIP.mask(ipVersion, columns["srcIPHi"], columns["srcIPLo"])
+            mask &= ~self.denyIP.mask(ipVersion, columns["dstIPHi"], columns["dstIPLo"])
+        if self.allowIP is not None:
+            mask &= self.allowIP.mask(
+                ipVersion, columns["srcIPHi"], columns["srcIPLo"]
+            ) | self.allowIP.mask(ipVersion, columns["dstIPHi"], columns["dstIPLo"])
+        if self.portTable is not None:
+            portTable = np.frombuffer(self.portTable, dtype=np.uint8).astype(bool)
+            mask &= portTable[columns["srcPort"]] | portTable[columns["dstPort"]]
+        return mask
+
+
+def parsePorts(spec: str) -> list:
+    """将 "80,443,8000-8080" 形式的端口描述解析为端口范围列表"""
+    ports = []
+    for item in spec.split(","):
+        low, _, high = item.strip().partition("-")
+        ports.append((int(low), int(high or low)))
+    return ports
+
+
+def getPacketFilter(args) -> PacketFilter:
+    """
+    根据命令行参数生成数据包过滤器
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        命令行参数, 见 config.parser
+
+    Returns
+    -------
+    packetFilter : PacketFilter
+        数据包过滤器
+
+    """
+    try:
+        return PacketFilter(
+            protocols=[int(p) for p in args.protocols.split(",")],
+            ports=parsePorts(args.ports) if args.ports else None,
+            allowIP=args.allowIP.split(",") if args.allowIP else None,
+            denyIP=args.denyIP.split(",") if args.denyIP else None,
+        )
+    except (ValueError, OSError):
+        # 协议号, 端口或地址段格式错误
+        print(config.FilterError)
+        sys.exit(1)
@@ -0,0 +1,589 @@
+import os
+import mmap
+
+import numpy as np
+
+from BasicPacketInfo import BasicPacketInfo
+from PacketFilter import PacketFilter
+from PacketReader import PcapHeader, vlanTypes, inet6Families, ipv6ExtHeaders
+import config
+
+"""
+    两阶段向量化解析PCAP文件
+    第一阶段: 顺序扫描所有 Packet Header, 得到每条记录的位置, 时间戳和捕获长度
+    第二阶段: 在整个文件的 np.frombuffer 视图上用花式索引一次性提取所有TCP和UDP数据包的
+             网络层类型, 上层协议, IP长度, IP地址, 端口, 控制位和窗口大小等字段
+"""
+
+# 记录索引的数据类型: 数据帧在文件中的偏移, 时间戳高位, 时间戳低位, 捕获长度
+recordDtype = np.dtype(
+    [
+        ("offset", np.int64),
+        ("tsSec", np.uint32),
+        ("tsUsec", np.uint32),
+        ("caplen", np.uint32),
+    ]
+)
+
+# 扫描记录时每批写入记录索引的记录条数
+recordBlock = 1 << 16
+
+# 数据包字段的数据类型, 与 BasicPacketInfo 的字段一一对应
+# IP地址按大端拆分为高64位和低64位, IPv4地址只占低32位
+packetDtype = np.dtype(
+    [
+        ("pktID", np.int64),
+        ("timeStamp", np.int64),
+        ("ipVersion", np.uint8),
+        ("srcIPHi", np.uint64),
+        ("srcIPLo", np.uint64),
+        ("dstIPHi", np.uint64),
+        ("dstIPLo", np.uint64),
+        ("srcPort", np.uint16),
+        ("dstPort", np.uint16),
+        ("protocol", np.uint8),
+        ("ipLength", np.uint16),
+        ("headBytes", np.uint16),
+        ("payloadBytes", np.int64),
+        ("payloadOffset", np.int64),
+        ("flags", np.uint8),
+        ("sequence", np.uint32),
+        ("acknowledgment", np.uint32),
+        ("TCPWindow", np.uint16),
+    ]
+)
+
+
+def appendRecords(records: np.ndarray, recordNum: int, block: list) -> np.ndarray:
+    """将一批记录写入记录索引的 [recordNum, recordNum + len(block)) 位置, 容量不足时倍增, 返回记录索引"""
+    if recordNum + len(block) > len(records):
+        grown = np.empty(
+            max(2 * len(records), recordNum + len(block)), dtype=recordDtype
+        )
+        grown[:recordNum] = records[:recordNum]
+        records = grown
+    if block:
+        records[recordNum : recordNum + len(block)] = np.array(block, dtype=recordDtype)
+    return records
+
+
+def readBE(data: np.ndarray, pos: np.ndarray, size: int, dtype=np.int64) -> np.ndarray:
+    """
+    按大端模式批量读取无符号整数
+
+    Parameters
+    ----------
+    data : np.ndarray
+        整个文件的uint8视图
+
+    pos : np.ndarray
+        每个整数在文件中的起始位置
+
+    size : int
+        整数所占字节数
+
+    dtype : np.dtype
+        结果的数据类型, 读取8字节整数时应为 np.uint64
+
+    Returns
+    -------
+    value : np.ndarray
+        读取到的整数
+
+    """
+    value = data[pos].astype(dtype)
+    for i in range(1, size):
+        value = (value << 8) | data[pos + i]
+    return value
+
+
+def decodeLinkLayer(
+    data: np.ndarray, base: np.ndarray, caplen: np.ndarray, linkType: int
+) -> tuple:
+    """
+    按链路类型批量解码链路层, 与 PacketReader 中的链路层解码表一致
+
+    Parameters
+    ----------
+    data : np.ndarray
+        整个文件的uint8视图
+
+    base : np.ndarray
+        每个数据帧在文件中的起始位置
+
+    caplen : np.ndarray
+        每个数据帧的捕获长度
+
+    linkType : int
+        链路类型
+
+    Returns
+    -------
+    etherType : np.ndarray
+        网络层协议类型, 无法解码时为0
+
+    l3Offset : np.ndarray
+        网络层首部在数据帧中的位置
+
+    """
+    etherType = np.zeros(len(base), dtype=np.int64)
+    l3Offset = np.zeros(len(base), dtype=np.int64)
+
+    # 以太网
+    if linkType == 1:
+        ok = np.flatnonzero(caplen >= 14)
+        etherType[ok] = readBE(data, base[ok] + 12, 2)
+        l3Offset[ok] = 14
+        # 逐层跳过VLAN标签, 每轮只处理仍带有标签的数据帧
+        tagged = ok[np.isin(etherType[ok], vlanTypes)]
+        while len(tagged) > 0:
+            tagged = tagged[caplen[tagged] >= l3Offset[tagged] + 4]
+            etherType[tagged] = readBE(data, base[tagged] + l3Offset[tagged] + 2, 2)
+            l3Offset[tagged] += 4
+            tagged = tagged[np.isin(etherType[tagged], vlanTypes)]
+    # Linux cooked capture
+    elif linkType == 113:
+        ok = np.flatnonzero(caplen >= 16)
+        etherType[ok] = readBE(data, base[ok] + 14, 2)
+        l3Offset[ok] = 16
+    # Linux cooked capture v2
+    elif linkType == 276:
+        ok = np.flatnonzero(caplen >= 20)
+        etherType[ok] = readBE(data, base[ok], 2)
+        l3Offset[ok] = 20
+    # Raw IP
+    elif linkType in (12, 14, 101):
+        ok = np.flatnonzero(caplen >= 1)
+        version = data[base[ok]] >> 4
+        etherType[ok[version == 4]] = 0x0800
+        etherType[ok[version == 6]] = 0x86DD
+    # IPv4, IPv6
+    elif linkType == 228:
+        etherType[:] = 0x0800
+    elif linkType == 229:
+        etherType[:] = 0x86DD
+    # BSD loopback
+    elif linkType in (0, 108):
+        ok = np.flatnonzero(caplen >= 4)
+        family = data[base[ok]] | data[base[ok] + 3]
+        etherType[ok[family == 2]] = 0x0800
+        etherType[ok[np.isin(family, inet6Families)]] = 0x86DD
+        l3Offset[ok] = 4
+
+    return etherType, l3Offset
+
+
+class PacketIndex:
+    """向量化的PCAP索引, 提供与PacketReader相同的nextPacket接口"""
+
+    def __init__(
+        self,
+        filename: str,
+        packetLenMax: int = config.packetLenMax,
+        chunkSize: int = 1 << 13,
+        packetFilter: PacketFilter = None,
+    ) -> None:
+        """
+        初始化PCAP索引并扫描所有记录边界
+
+        Parameters
+        ----------
+        filename : str
+            pcap文件名
+
+        packetLenMax : int
+            每个数据包保留的最大负载字节数
+
+        chunkSize : int
+            第二阶段每次批量提取的记录个数, 每批转为Python元组逐个访问, 用于限制内存占用
+
+        packetFilter : PacketFilter
+            数据包过滤器, 为None时只保留TCP数据包(本索引只提取TCP和UDP数据包)
+
+        Returns
+        -------
+        None
+
+        """
+        # 以二进制格式打开文件
+        self.pcapFile = open(filename, "rb")
+        # 内存映射对象(空文件无法映射, 交由PcapHeader报错)
+        self.pcapMap = None
+        if os.fstat(self.pcapFile.fileno()).st_size >= 24:
+            self.pcapMap = mmap.mmap(self.pcapFile.fileno(), 0, access=mmap.ACCESS_READ)
+            self.pcapData = memoryview(self.pcapMap)
+        else:
+            self.pcapData = memoryview(self.pcapFile.read())
+
+        # 解析pcap包头信息
+        self.pcapHeader = PcapHeader(bytes(self.pcapData[0:24]))
+
+        self.packetLenMax = packetLenMax
+        self.chunkSize = chunkSize
+        self.packetFilter = PacketFilter() if packetFilter is None else packetFilter
+        # 负载需求函数, 见 PacketReader
+        self.payloadDemand = None
+
+        # 第一阶段: 扫描所有记录边界
+        self.records = self.scanRecords()
+
+        # 当前批次的数据包字段(转为元组列表以加快逐个访问)
+        self.rows = []
+        # 当前批次中下一个数据包的位置
+        self.rowPtr = 0
+        # 下一个批次的起始记录位置
+        self.recordPtr = 0
+
+    def scanRecords(self) -> np.ndarray:
+        """
+        第一阶段: 顺序扫描所有 Packet Header
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        records : np.ndarray
+            记录索引, 数据类型为 recordDtype
+
+        """
+        pcapData = self.pcapData
+        unpackFrom = self.pcapHeader.recordHeader.unpack_from
+        pcapLen = len(pcapData)
+
+        # 记录索引按容量倍增, 每攒够 recordBlock 条记录写入一次, 不为每条记录保留Python对象
+        records = np.empty(recordBlock, dtype=recordDtype)
+        recordNum = 0
+        block = []
+        pcapPtr = 24
+        # 最后一条记录不完整时丢弃
+        while pcapPtr + 16 <= pcapLen:
+            timeHigh, timeLow, caplen = unpackFrom(pcapData, pcapPtr)
+            if pcapPtr + 16 + caplen > pcapLen:
+                break
+            block.append((pcapPtr + 16, timeHigh, timeLow, caplen))
+            pcapPtr += 16 + caplen
+            if len(block) == recordBlock:
+                records = appendRecords(records, recordNum, block)
+                recordNum += len(block)
+                block = []
+        records = appendRecords(records, recordNum, block)
+        recordNum += len(block)
+        # 释放多余的容量
+        return records[:recordNum].copy()
+
+    def extractColumns(self, start: int, stop: int) -> np.ndarray:
+        """
+        第二阶段: 批量提取 [start, stop) 范围内所有TCP和UDP数据包的字段
+
+        Parameters
+        ----------
+        start : int
+            起始记录位置
+
+        stop : int
+            结束记录位置(不含)
+
+        Returns
+        -------
+        columns : np.ndarray
+            数据包字段, 数据类型为 packetDtype, 其它协议的数据包和不满足过滤条件的数据包已被过滤
+
+        """
+        data = np.frombuffer(self.pcapData, dtype=np.uint8)
+        records = self.records[start:stop]
+        # 数据包编号从1开始, 与 IdGenerator 保持一致
+        pktID = np.arange(start + 1, stop + 1, dtype=np.int64)
+
+        base = records["offset"]
+        caplen = records["caplen"].astype(np.int64)
+
+        # 链路层解码, 得到网络层协议类型和网络层首部位置
+        etherType, l3Offset = decodeLinkLayer(
+            data, base, caplen, self.pcapHeader.linkType
+        )
+
+        # 分别解析IPv4和IPv6首部, 每个元素为 (记录位置, 网络层字段)
+        networks = [
+            self.parseIPv4(data, base, caplen, l3Offset, etherType),
+            self.parseIPv6(data, base, caplen, l3Offset, etherType),
+        ]
+        # 合并后按记录顺序排列
+        sel = np.concatenate([network[0] for network in networks])
+        order = np.argsort(sel, kind="stable")
+        sel = sel[order]
+        network = {
+            name: np.concatenate([network[1][name] for network in networks])[order]
+            for name in networks[0][1]
+        }
+        protocol, l4Start, l4End = (
+            network["protocol"],
+            network["l4Start"],
+            network["l4End"],
+        )
+
+        # 只保留TCP和UDP数据包, 若TCP数据包长度小于20或UDP数据包长度小于8, 则跳过
+        keep = np.flatnonzero(
+            ((protocol == 6) & (l4End - l4Start >= 20))
+            | ((protocol == 17) & (l4End - l4Start >= 8))
+        )
+        sel = sel[keep]
+        network = {name: value[keep] for name, value in network.items()}
+        records, pktID, base = records[sel], pktID[sel], base[sel]
+        ipLen, l4Start, l4End = network["ipLen"], network["l4Start"], network["l4End"]
+        l4 = base + l4Start
+        # TCP数据包的位置及其首部在文件中的位置
+        isTCP = np.flatnonzero(network["protocol"] == 6)
+        tcp = l4[isTCP]
+
+        # 传输层首部长度(UDP固定为8), 负载起始位置和负载长度
+        headLen = np.full(len(records), 8, dtype=np.int64)
+        headLen[isTCP] = (data[tcp + 12] & 0xF0).astype(np.int64) >> 2
+        pldStart = l4Start + headLen
+
+        columns = np.empty(len(records), dtype=packetDtype)
+        columns["pktID"] = pktID
+        tsSec = records["tsSec"].astype(np.int64)
+        tsUsec = records["tsUsec"].astype(np.int64) // self.pcapHeader.tsDivisor
+        columns["timeStamp"] = tsSec * 1000000 + tsUsec
+        columns["ipVersion"] = network["ipVersion"]
+        columns["srcIPHi"] = network["srcIPHi"]
+        columns["srcIPLo"] = network["srcIPLo"]
+        columns["dstIPHi"] = network["dstIPHi"]
+        columns["dstIPLo"] = network["dstIPLo"]
+        columns["srcPort"] = readBE(data, l4, 2)
+        columns["dstPort"] = readBE(data, l4 + 2, 2)
+        columns["protocol"] = network["protocol"]
+        columns["ipLength"] = ipLen
+        columns["headBytes"] = headLen
+        columns["payloadBytes"] = np.maximum(l4End - pldStart, 0)
+        columns["payloadOffset"] = base + pldStart
+        # UDP没有控制位, 序列号, 确认号和窗口, 置零以便统计TCP特征
+        for name in ("flags", "sequence", "acknowledgment", "TCPWindow"):
+            columns[name] = 0
+        columns["flags"][isTCP] = data[tcp + 13]
+        columns["sequence"][isTCP] = readBE(data, tcp + 4, 4)
+        columns["acknowledgment"][isTCP] = readBE(data, tcp + 8, 4)
+        columns["TCPWindow"][isTCP] = readBE(data, tcp + 14, 2)
+        # 按过滤器批量筛选数据包
+        return columns[self.packetFilter.mask(columns)]
+
+    def parseIPv4(
+        self,
+        data: np.ndarray,
+        base: np.ndarray,
+        caplen: np.ndarray,
+        l3Offset: np.ndarray,
+        etherType: np.ndarray,
+    ) -> tuple:
+        """
+        批量解析IPv4首部
+
+        Parameters
+        ----------
+        data : np.ndarray
+            整个文件的uint8视图
+
+        base : np.ndarray
+            每个数据帧在文件中的起始位置
+
+        caplen : np.ndarray
+            每个数据帧的捕获长度
+
+        l3Offset : np.ndarray
+            网络层首部在数据帧中的位置
+
+        etherType : np.ndarray
+            网络层协议类型
+
+        Returns
+        -------
+        sel : np.ndarray
+            IPv4数据包的记录位置
+
+        network : dict
+            网络层字段: IP版本, IP地址, 上层协议, IP数据包长度, 传输层在数据帧中的起止位置
+
+        """
+        # IPv4首部固定部分共20字节, 不足则跳过
+        sel = np.flatnonzero((etherType == 0x0800) & (caplen >= l3Offset + 20))
+        l3 = l3Offset[sel]
+        ip = base[sel] + l3
+
+        ipLen = readBE(data, ip + 2, 2)
+        zeros = np.zeros(len(sel), dtype=np.uint64)
+        return sel, {
+            "ipVersion": np.full(len(sel), 4, dtype=np.uint8),
+            "srcIPHi": zeros,
+            "srcIPLo": readBE(data, ip + 12, 4, np.uint64),
+            "dstIPHi": zeros,
+            "dstIPLo": readBE(data, ip + 16, 4, np.uint64),
+            "protocol": data[ip + 9],
+            "ipLen": ipLen,
+            # 传输层数据包在数据帧中的起止位置(受捕获长度限制)
+            "l4Start": l3 + ((data[ip] & 0x0F).astype(np.int64) << 2),
+            "l4End": np.minimum(l3 + ipLen, caplen[sel]),
+        }
+
+    def parseIPv6(
+        self,
+        data: np.ndarray,
+        base: np.ndarray,
+        caplen: np.ndarray,
+        l3Offset: np.ndarray,
+        etherType: np.ndarray,
+    ) -> tuple:
+        """批量解析IPv6首部, 逐轮跳过扩展首部, 参数和返回值同 parseIPv4"""
+        # IPv6首部固定部分共40字节, 不足则跳过
+        sel = np.flatnonzero((etherType == 0x86DD) & (caplen >= l3Offset + 40))
+        base, l3 = base[sel], l3Offset[sel]
+        ip = base + l3
+
+        ipLen = 40 + readBE(data, ip + 4, 2)
+        nextHeader = data[ip + 6].astype(np.int64)
+        l4Start = l3 + 40
+        l4End = np.minimum(l3 + ipLen, caplen[sel])
+
+        # 每轮只处理下一个首部仍是扩展首部的数据包
+        ext = np.flatnonzero(np.isin(nextHeader, ipv6ExtHeaders))
+        while len(ext) > 0:
+            # 扩展首部至少8字节, 不足则丢弃
+            short = l4Start[ext] + 8 > l4End[ext]
+            nextHeader[ext[short]] = -1
+            ext = ext[~short]
+            pos = base[ext] + l4Start[ext]
+
+            # 不是第一个分片, 不含上层首部, 丢弃
+            isFrag = nextHeader[ext] == 44
+            notFirst = isFrag & ((readBE(data, pos + 2, 2) >> 3) != 0)
+            nextHeader[ext[notFirst]] = -1
+            keep = ~notFirst
+            ext, pos, isFrag = ext[keep], pos[keep], isFrag[keep]
+
+            # 扩展首部长度
+            extLen = (data[pos + 1].astype(np.int64) + 1) << 3
+            extLen[nextHeader[ext] == 51] = (
+                data[pos[nextHeader[ext] == 51] + 1].astype(np.int64) + 2
+            ) << 2
+            extLen[isFrag] = 8
+
+            nextHeader[ext] = data[pos]
+            l4Start[ext] += extLen
+            ext = ext[np.isin(nextHeader[ext], ipv6ExtHeaders)]
+
+        return sel, {
+            "ipVersion": np.full(len(sel), 6, dtype=np.uint8),
+            "srcIPHi": readBE(data, ip + 8, 8, np.uint64),
+            "srcIPLo": readBE(data, ip + 16, 8, np.uint64),
+            "dstIPHi": readBE(data, ip + 24, 8, np.uint64),
+            "dstIPLo": readBE(data, ip + 32, 8, np.uint64),
+            "protocol": nextHeader,
+            "ipLen": ipLen,
+            "l4Start": l4Start,
+            "l4End": l4End,
+        }
+
+    def nextPacket(self):
+        """
+        读取下一个数据包
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        packetInfo : BasicPacketInfo
+            基本数据包信息
+
+        """
+        # 当前批次已读完, 提取下一个批次
+        while self.rowPtr >= len(self.rows):
+            if self.recordPtr >= len(self.records):
+                return None
+            stop = min(self.recordPtr + self.chunkSize, len(self.records))
+            self.rows = self.extractColumns(self.recordPtr, stop).tolist()
+            self.rowPtr = 0
+            self.recordPtr = stop
+
+        (
+            pktID,
+            timeStamp,
+            ipVersion,
+            srcIPHi,
+            srcIPLo,
+            dstIPHi,
+            dstIPLo,
+            srcPort,
+            dstPort,
+            protocol,
+            ipLength,
+            headBytes,
+            payloadBytes,
+            payloadOffset,
+            flags,
+            sequence,
+            acknowledgment,
+            TCPWindow,
+        ) = self.rows[self.rowPtr]
+        self.rowPtr += 1
+
+        # UDP没有序列号和确认号, 与 PacketReader 保持一致
+        if protocol != 6:
+            sequence, acknowledgment = None, None
+
+        packetInfo = BasicPacketInfo(
+            pktID=pktID,
+            srcIP=(srcIPHi << 64) | srcIPLo,
+            dstIP=(dstIPHi << 64) | dstIPLo,
+            srcPort=srcPort,
+            dstPort=dstPort,
+            protocol=protocol,
+            timeStamp=timeStamp,
+            ipLength=ipLength,
+            headBytes=headBytes,
+            payloadBytes=payloadBytes,
+            payload=b"",
+            flags=flags,
+            sequence=sequence,
+            acknowledgment=acknowledgment,
+            TCPWindow=TCPWindow,
+            packetLenMax=self.packetLenMax,
+            ipVersion=ipVersion,
+        )
+
+        # 负载, 只在会话流仍需要负载时复制, 且只复制需要保留的前 packetLenMax 个字节
+        if self.payloadDemand is None or self.payloadDemand(packetInfo):
+            packetInfo.payload = bytes(
+                self.pcapData[
+                    payloadOffset : payloadOffset + min(payloadBytes, self.packetLenMax)
+                ]
+            )
+
+        return packetInfo
+
+    def close(self) -> None:
+        """
+        释放文件映射和文件句柄
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+
+        """
+        # 先释放memoryview, 否则内存映射无法关闭
+        self.pcapData.release()
+        if self.pcapMap is not None:
+            self.pcapMap.close()
+        self.pcapFile.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -1,7 +1,13 @@
+import os
 import sys
+import bz2
+import gzip
+import lzma
+import mmap
 import struct
 
 from BasicPacketInfo import BasicPacketInfo
+from PacketFilter import PacketFilter
 from utils import IdGenerator
 import config
 
@@ -38,7 +44,302 @@ import config
     UDP协议首部长度为8个字节
     源端口: 16位        目的端口: 16位
     数据包长度: 16位    校验和: 16位
+
+    IPv6协议首部固定部分长度为40个字节
+    版本: 4位   流量类别: 8位   流标签: 20位
+    负载长度: 16位(扩展首部和上层数据之和的长度)   下一个首部: 8位   跳数限制: 8位
+    源IP地址: 128位            目的IP地址: 128位
+    扩展首部通过 下一个首部 字段串联, 最后一个扩展首部的 下一个首部 即为上层协议
+    逐跳选项(0), 路由(43), 目的选项(60): 下一个首部 8位, 长度 8位(以8字节为单位, 不含前8字节)
+    分片(44): 下一个首部 8位, 保留 8位, 片偏移 13位, 标志 3位, 标识 32位, 共8字节
+    认证首部(51): 下一个首部 8位, 长度 8位(以4字节为单位, 不含前8字节)
+"""
+
+# 预编译的首部解析结构, 每个数据包只需一两次 unpack_from 调用
+# Packet Header: 时间戳高位, 时间戳低位, 捕获长度(忽略实际长度)
+recordHeaderBE = struct.Struct(">III")
+recordHeaderLE = struct.Struct("<III")
+# IPv4首部固定部分: 版本与首部长度, 总长度, 上层协议, 源IP地址, 目的IP地址
+ipv4Header = struct.Struct("!BxH5xB2xII")
+# IPv6首部固定部分: 负载长度, 下一个首部, 源IP地址, 目的IP地址
+ipv6Header = struct.Struct("!4xHBxQQQQ")
+# TCP首部固定部分: 源端口, 目的端口, 序列号, 确认号, 数据偏移, 控制位, 窗口
+tcpHeader = struct.Struct("!HHIIBBH")
+# UDP首部: 源端口, 目的端口
+udpHeader = struct.Struct("!HH")
+
+# 经典pcap文件的魔数(微秒精度大端模式, 小端模式, 纳秒精度大端模式, 小端模式)
+pcapMagics = (
+    b"\xa1\xb2\xc3\xd4",
+    b"\xd4\xc3\xb2\xa1",
+    b"\xa1\xb2\x3c\x4d",
+    b"\x4d\x3c\xb2\xa1",
+)
+# pcapng 文件以 Section Header Block 开头, 其块类型为 0x0A0D0D0A
+pcapngMagic = b"\x0a\x0d\x0d\x0a"
+
+# 压缩格式的魔数及对应的打开函数(gzip, bzip2, xz)
+compressMagics = (
+    (b"\x1f\x8b", gzip.open),
+    (b"BZh", bz2.open),
+    (b"\xfd7zXZ\x00", lzma.open),
+)
+# 压缩文件每次解压读取的字节数, 决定了读取缓冲区的大小
+streamChunkSize = 1 << 20
+
 """
+    pcapng文件由若干个块组成, 每个块的格式为
+    块类型: 32位   块长度: 32位   块内容: 不定长(按4字节对齐)   块长度: 32位
+    块内的整数字节序由所在 Section Header Block 的字节序标记(0x1A2B3C4D)决定
+    Section Header Block(SHB, 0x0A0D0D0A): 字节序标记, 版本号, 节长度, 选项
+    Interface Description Block(IDB, 1): 链路类型, 保留, 最大存储长度, 选项
+        选项 if_tsresol(9) 表示时间戳精度, 最高位为0表示 10^-x 秒, 为1表示 2^-x 秒
+        选项 if_tsoffset(14) 表示时间戳偏移的秒数
+    Enhanced Packet Block(EPB, 6): 接口编号, 时间戳高位, 时间戳低位,
+        捕获长度, 实际长度, 数据帧, 选项
+    Simple Packet Block(SPB, 3): 实际长度, 数据帧(不含时间戳, 属于0号接口)
+    Packet Block(PB, 2, 已废弃): 接口编号(16位), 丢包数(16位), 时间戳高位,
+        时间戳低位, 捕获长度, 实际长度, 数据帧, 选项
+"""
+# 块类型
+blockSHB = 0x0A0D0D0A
+blockIDB = 1
+blockPB = 2
+blockSPB = 3
+blockEPB = 6
+# 每种块的最小长度: 块头(8字节), 固定字段和块尾(4字节), 其它类型的块至少12字节
+blockMinLens = {blockIDB: 20, blockPB: 32, blockSPB: 16, blockEPB: 32}
+# 字节序标记
+byteOrderMagicBE = b"\x1a\x2b\x3c\x4d"
+byteOrderMagicLE = b"\x4d\x3c\x2b\x1a"
+
+"""
+    链路层解码表, 根据链路类型确定网络层协议类型和网络层首部在数据帧中的位置
+    以太网(1): 类型位于12-13字节, 网络层首部从第14字节开始,
+        每层 802.1Q(0x8100) / 802.1ad(0x88A8, 0x9100) 标签额外占4字节
+    Linux cooked(SLL, 113): 协议类型位于14-15字节, 网络层首部从第16字节开始
+    Linux cooked v2(SLL2, 276): 协议类型位于0-1字节, 网络层首部从第20字节开始
+    Raw IP(101, 以及部分平台上的12, 14): 没有链路层首部, 由IP版本号区分IPv4和IPv6
+    IPv4(228), IPv6(229): 没有链路层首部
+    BSD loopback(NULL 0, LOOP 108): 4字节的协议族, NULL为主机字节序, LOOP为网络字节序
+"""
+# VLAN标签类型
+vlanTypes = (0x8100, 0x88A8, 0x9100)
+# BSD loopback 中表示IPv6的协议族(Linux, NetBSD/OpenBSD, FreeBSD, macOS)
+inet6Families = (10, 24, 28, 30)
+
+
+def decodeEthernet(packetData: memoryview) -> tuple:
+    """
+    解码以太网数据帧
+
+    Parameters
+    ----------
+    packetData : memoryview
+        链路层数据帧
+
+    Returns
+    -------
+    etherType : int
+        网络层协议类型(IPv4: 0x0800, IPv6: 0x86DD), 无法解码时为0
+
+    l3Offset : int
+        网络层首部在数据帧中的位置
+
+    """
+    if len(packetData) < 14:
+        return 0, 0
+    etherType = (packetData[12] << 8) | packetData[13]
+    l3Offset = 14
+    # 逐层跳过VLAN标签(含QinQ多层标签)
+    while etherType in vlanTypes and len(packetData) >= l3Offset + 4:
+        etherType = (packetData[l3Offset + 2] << 8) | packetData[l3Offset + 3]
+        l3Offset += 4
+    return etherType, l3Offset
+
+
+def decodeSLL(packetData: memoryview) -> tuple:
+    """解码 Linux cooked capture 数据帧, 返回值同 decodeEthernet"""
+    if len(packetData) < 16:
+        return 0, 0
+    return (packetData[14] << 8) | packetData[15], 16
+
+
+def decodeSLL2(packetData: memoryview) -> tuple:
+    """解码 Linux cooked capture v2 数据帧, 返回值同 decodeEthernet"""
+    if len(packetData) < 20:
+        return 0, 0
+    return (packetData[0] << 8) | packetData[1], 20
+
+
+def decodeRaw(packetData: memoryview) -> tuple:
+    """解码没有链路层首部的IP数据包, 返回值同 decodeEthernet"""
+    if len(packetData) < 1:
+        return 0, 0
+    version = packetData[0] >> 4
+    if version == 4:
+        return 0x0800, 0
+    if version == 6:
+        return 0x86DD, 0
+    return 0, 0
+
+
+def decodeIPv4(packetData: memoryview) -> tuple:
+    """解码链路类型为IPv4的数据包, 返回值同 decodeEthernet"""
+    return 0x0800, 0
+
+
+def decodeIPv6(packetData: memoryview) -> tuple:
+    """解码链路类型为IPv6的数据包, 返回值同 decodeEthernet"""
+    return 0x86DD, 0
+
+
+def decodeNull(packetData: memoryview) -> tuple:
+    """解码 BSD loopback 数据帧, 返回值同 decodeEthernet"""
+    if len(packetData) < 4:
+        return 0, 0
+    # 协议族的值都小于256, 非零的那个字节即为协议族, 与字节序无关
+    family = packetData[0] | packetData[3]
+    if family == 2:
+        return 0x0800, 4
+    if family in inet6Families:
+        return 0x86DD, 4
+    return 0, 0
+
+
+# 链路类型 -> 解码函数
+linkDecoders = {
+    0: decodeNull,
+    1: decodeEthernet,
+    12: decodeRaw,
+    14: decodeRaw,
+    101: decodeRaw,
+    108: decodeNull,
+    113: decodeSLL,
+    228: decodeIPv4,
+    229: decodeIPv6,
+    276: decodeSLL2,
+}
+
+
+def openCapture(filename: str):
+    """
+    打开捕获文件, 根据魔数(而非扩展名)识别压缩格式
+
+    Parameters
+    ----------
+    filename : str
+        文件名
+
+    Returns
+    -------
+    captureFile : file object
+        文件对象, 压缩文件返回流式解压的文件对象
+
+    compressed : bool
+        是否为压缩文件
+
+    """
+    with open(filename, "rb") as f:
+        head = f.read(6)
+    for magic, opener in compressMagics:
+        if head.startswith(magic):
+            return opener(filename, "rb"), True
+    return open(filename, "rb"), False
+
+
+def parseIPv4(packetData: memoryview, l3Offset: int):
+    """
+    解析IPv4首部
+
+    Parameters
+    ----------
+    packetData : memoryview
+        链路层数据帧
+
+    l3Offset : int
+        网络层首部在数据帧中的位置
+
+    Returns
+    -------
+    network : tuple
+        (源IP地址, 目的IP地址, 上层协议, IP数据包长度, 传输层起始位置, 传输层结束位置, IP版本),
+        IP地址为32位整数, 首部不完整时返回None
+
+    """
+    # IPv4首部固定部分共20字节, 不足则跳过
+    if len(packetData) < l3Offset + 20:
+        return None
+    # 版本与首部长度, IP数据包长度, 传输层协议(TCP:6 UDP:17), 源IP地址, 目的IP地址
+    verIhl, ipLen, protocol, srcIP, dstIP = ipv4Header.unpack_from(packetData, l3Offset)
+    # 传输层数据包在数据帧中的起止位置(受捕获长度限制)
+    l4Start = l3Offset + ((verIhl & 0x0F) << 2)
+    l4End = min(l3Offset + ipLen, len(packetData))
+    return srcIP, dstIP, protocol, ipLen, l4Start, l4End, 4
+
+
+def parseIPv6(packetData: memoryview, l3Offset: int):
+    """
+    解析IPv6首部, 并跳过逐跳选项, 路由, 分片, 目的选项和认证扩展首部
+
+    Parameters
+    ----------
+    packetData : memoryview
+        链路层数据帧
+
+    l3Offset : int
+        网络层首部在数据帧中的位置
+
+    Returns
+    -------
+    network : tuple
+        同 parseIPv4, IP地址为128位整数,
+        首部不完整或不是第一个分片(不含上层首部)时返回None
+
+    """
+    # IPv6首部固定部分共40字节, 不足则跳过
+    if len(packetData) < l3Offset + 40:
+        return None
+    # 负载长度, 下一个首部, 源IP地址, 目的IP地址
+    payloadLen, nextHeader, srcHigh, srcLow, dstHigh, dstLow = ipv6Header.unpack_from(
+        packetData, l3Offset
+    )
+    srcIP = (srcHigh << 64) | srcLow
+    dstIP = (dstHigh << 64) | dstLow
+    # IP数据包长度(首部和负载之和, 与IPv4的总长度含义一致)
+    ipLen = 40 + payloadLen
+    # 传输层数据包在数据帧中的结束位置(受捕获长度限制)
+    l4End = min(l3Offset + ipLen, len(packetData))
+
+    # 逐个跳过扩展首部
+    l4Start = l3Offset + 40
+    while nextHeader in ipv6ExtHeaders:
+        # 扩展首部至少8字节
+        if l4Start + 8 > l4End:
+            return None
+        if nextHeader == 44:
+            # 不是第一个分片, 不含上层首部
+            if ((packetData[l4Start + 2] << 8) | packetData[l4Start + 3]) >> 3:
+                return None
+            extLen = 8
+        elif nextHeader == 51:
+            extLen = (packetData[l4Start + 1] + 2) << 2
+        else:
+            extLen = (packetData[l4Start + 1] + 1) << 3
+        nextHeader = packetData[l4Start]
+        l4Start += extLen
+
+    return srcIP, dstIP, nextHeader, ipLen, l4Start, l4End, 6
+
+
+# IPv6扩展首部: 逐跳选项, 路由, 分片, 认证, 目的选项
+ipv6ExtHeaders = (0, 43, 44, 51, 60)
+
+# 网络层协议类型 -> 解析函数
+networkParsers = {
+    0x0800: parseIPv4,
+    0x86DD: parseIPv6,
+}
 
 
 class PcapHeader:
@@ -66,6 +367,7 @@ class PcapHeader:
         # 保存数据内容
         self.bytesData = pcapheader
         # 识别文件和字节顺序, 0xa1b2c3d4 表示是大端模式, 0xd4c3b2a1 表示是小端模式
+        # 0xa1b23c4d 和 0x4d3cb2a1 分别表示时间戳低位精确到纳秒的大端和小端模式
         # 注意: 这里的大小端仅仅指 Pcap 文件的 Global Header 和 Packet Header
         # 而与 Packet Data 里的内容无关, Packet Data 里捕获的数据包都是符合网络字节序的
         # 而网络字节序就是大端模式
@@ -84,27 +386,40 @@ class PcapHeader:
         self.LinkType = pcapheader[20:24]
 
         # 设置转换模式, > 表示以大端模式转换, < 表示以小端模式转换, I 表示integer, 占4个字节
-        if self.Magic == b"\xa1\xb2\xc3\xd4":
+        if self.Magic in (pcapMagics[0], pcapMagics[2]):
             self.TypeI = ">I"
-        elif self.Magic == b"\xd4\xc3\xb2\xa1":
+            self.recordHeader = recordHeaderBE
+        elif self.Magic in (pcapMagics[1], pcapMagics[3]):
             self.TypeI = "<I"
+            self.recordHeader = recordHeaderLE
         else:  # 如果上述两个都不满足, 表明这不是一个PCAP文件, 报错
             print(config.PcapHeaderError)
             sys.exit(1)
 
+        # 时间戳低位换算为微秒的除数, 纳秒精度为1000, 微秒精度为1
+        self.tsDivisor = 1000 if self.Magic in pcapMagics[2:] else 1
+
         # 解析 最大的存储长度 和 链路类型
         self.snapLen = struct.unpack(self.TypeI, self.SnapLen)[0]
         self.linkType = struct.unpack(self.TypeI, self.LinkType)[0]
 
-        if self.linkType != 1:
+        # 根据链路类型选择解码函数, 不支持的链路类型报错
+        if self.linkType not in linkDecoders:
             print(config.LinkLayerError)
             sys.exit(1)
+        self.linkDecoder = linkDecoders[self.linkType]
 
 
 class PacketReader:
     """从PCAP文件读取数据包,并生成BasicPacketInfo格式的数据"""
 
-    def __init__(self, filename: str) -> None:
+    def __init__(
+        self,
+        filename: str,
+        useMmap: bool = True,
+        packetLenMax: int = config.packetLenMax,
+        packetFilter: PacketFilter = None,
+    ) -> None:
         """
         初始化数据包读取器
 
@@ -113,36 +428,161 @@ class PacketReader:
         filename : str
             pcap文件名
 
+        useMmap : bool
+            是否以内存映射方式读取文件, 为False时将整个文件读入内存
+
+        packetLenMax : int
+            每个数据包保留的最大负载字节数
+
+        packetFilter : PacketFilter
+            数据包过滤器, 为None时只保留TCP数据包
+
         Returns
         -------
         None
 
         """
-        # 以二进制格式打开文件
-        openFile = open(filename, "rb")
-        # 读取PCAP文件中的所有数据
-        self.pcapData = openFile.read()
-        # 关闭文件
-        openFile.close()
-
-        # 解析pcap包头信息
-        pcapheader = PcapHeader(self.pcapData[0:24])
+        # 以二进制格式打开文件, 压缩文件以流的方式解压
+        self.pcapFile, compressed = openCapture(filename)
+        # 内存映射对象(不使用内存映射时为None)
+        self.pcapMap = None
+        # 解压流(非压缩文件为None)
+        self.pcapStream = None
 
-        # Global Header 和 Packet Header 部分的字节序
-        self.headTypeI = pcapheader.TypeI
+        if compressed:
+            # 压缩文件分块解压到读取缓冲区, 解压后的文件不落盘
+            self.pcapStream = self.pcapFile
+            buffer = b""
+        # 空文件无法映射, 交由PcapHeader报错
+        elif useMmap and os.fstat(self.pcapFile.fileno()).st_size >= 24:
+            # 将文件映射到内存, 由操作系统按需换页, 不再一次性读入全部数据
+            self.pcapMap = mmap.mmap(self.pcapFile.fileno(), 0, access=mmap.ACCESS_READ)
+            buffer = self.pcapMap
+        else:
+            # 读取PCAP文件中的所有数据
+            buffer = self.pcapFile.read()
+            # 关闭文件
+            self.pcapFile.close()
 
-        # Packet Data 部分的字节序为网络字节序, 即大端模式
-        self.pktTypeI = "!I"
-        self.pktTypeH = "!H"
+        # 通过memoryview访问数据, 切片时不复制字节
+        self.pcapData = memoryview(buffer)
 
         # PCAP文件的长度
         self.pcapLen = len(self.pcapData)
         # 当前指针指向PCAP文件中的字节位置
-        self.pcapPtr = 24
+        self.pcapPtr = 0
+
+        # 解析文件头信息
+        self.readFileHeader()
+
+        # 数据包负载长度截取阈值, 只有这部分负载会被复制出来
+        self.packetLenMax = packetLenMax
+
+        # 数据包过滤器, 在构造 BasicPacketInfo 之前判断是否保留数据包
+        self.packetFilter = PacketFilter() if packetFilter is None else packetFilter
+
+        # 负载需求函数, 参数为 BasicPacketInfo, 返回其所属会话流是否还需要负载
+        # 为None时总是复制负载, 否则只在需要时复制, 不需要时只计算负载长度
+        self.payloadDemand = None
 
         # 数据包ID生成器
         self.idGenerator = IdGenerator()
 
+    def fill(self, size: int) -> bool:
+        """
+        确保从当前指针开始至少有 size 个字节可读
+
+        对于压缩文件, 保留缓冲区中未读取的部分, 并从解压流中读取下一块数据,
+        缓冲区大小只与 streamChunkSize 和最大的记录长度有关
+
+        Parameters
+        ----------
+        size : int
+            需要的字节数
+
+        Returns
+        -------
+        enough : bool
+            是否有足够的字节, 文件读取完毕时为False
+
+        """
+        if self.pcapPtr + size <= self.pcapLen:
+            return True
+        if self.pcapStream is None:
+            return False
+
+        # 缓冲区中未读取的部分
+        chunks = [bytes(self.pcapData[self.pcapPtr :])]
+        need = size - len(chunks[0])
+        while need > 0:
+            chunk = self.pcapStream.read(max(need, streamChunkSize))
+            # 解压流读取完毕
+            if not chunk:
+                break
+            chunks.append(chunk)
+            need -= len(chunk)
+
+        # 新的缓冲区, 指针指向缓冲区开头
+        self.pcapData = memoryview(b"".join(chunks))
+        self.pcapLen = len(self.pcapData)
+        self.pcapPtr = 0
+        return need <= 0
+
+    def readFileHeader(self) -> None:
+        """
+        解析pcap文件头信息
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+
+        """
+        # 读取 Global Header
+        self.fill(24)
+        # 解析pcap包头信息
+        pcapheader = PcapHeader(bytes(self.pcapData[0:24]))
+
+        # Global Header 和 Packet Header 部分的字节序
+        self.headTypeI = pcapheader.TypeI
+        # Packet Header 解析结构
+        self.recordHeader = pcapheader.recordHeader
+        # 时间戳低位换算为微秒的除数
+        self.tsDivisor = pcapheader.tsDivisor
+        # 链路层解码函数, 每个文件只确定一次
+        self.linkDecoder = pcapheader.linkDecoder
+
+        # 跳过 Global Header
+        self.pcapPtr = 24
+
+    def close(self) -> None:
+        """
+        释放文件映射和文件句柄
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+
+        """
+        # 先释放memoryview, 否则内存映射无法关闭
+        self.pcapData.release()
+        if self.pcapMap is not None:
+            self.pcapMap.close()
+        self.pcapFile.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
     def nextPacket(self):
         """
         读取下一个数据包
@@ -161,42 +601,71 @@ class PacketReader:
         # 数据包内容
         packetInfo = None
 
-        while self.pcapPtr < self.pcapLen and packetInfo is None:
+        while packetInfo is None:
+            # 读取下一条记录
+            record = self.nextRecord()
+            # 文件读取完毕
+            if record is None:
+                break
+
             pktID = self.idGenerator.nextId()  # 调试用
 
-            # 捕获数据包的时间戳高位,精确到秒
-            timeHigh = self.pcapData[self.pcapPtr : self.pcapPtr + 4]
-            timeHigh = struct.unpack(self.headTypeI, timeHigh)[0]
+            # 时间戳, 链路层数据帧
+            timeStamp, packetData = record
 
-            # 捕获数据包的时间戳低位,精确到微秒(1s=10^6us)
-            timeLow = self.pcapData[self.pcapPtr + 4 : self.pcapPtr + 8]
-            timeLow = struct.unpack(self.headTypeI, timeLow)[0]
+            # 网络层协议类型, 网络层首部位置
+            etherType, l3Offset = self.linkDecoder(packetData)
+            # 不是IPv4或IPv6数据包, 则跳过
+            if etherType not in networkParsers:
+                continue
 
-            # 时间戳
-            timeStamp = 1000000 * timeHigh + timeLow
+            # 解析网络层首部
+            network = networkParsers[etherType](packetData, l3Offset)
 
-            # 捕获的数据包的长度, 用于计算下一个数据包的位置
-            caplen = self.pcapData[self.pcapPtr + 8 : self.pcapPtr + 12]
-            caplen = struct.unpack(self.headTypeI, caplen)[0]
+            # 通过过滤器(默认只保留TCP包)后, 再对其进行解析
+            if network is not None and self.packetFilter.match(packetData, network):
+                # 解析数据包信息
+                packetInfo = self.getPacketInfo(pktID, timeStamp, packetData, network)
 
-            # 实际的数据包的长度
-            # actlen = self.pcapData[self.pcapPtr + 12 : self.pcapPtr + 16]
-            # actlen = struct.unpack(self.headTypeI, actlen)[0]
+        return packetInfo
 
-            # 指针向后移动 16 + caplen 位
-            self.pcapPtr += 16 + caplen
+    def nextRecord(self):
+        """
+        读取下一条数据包记录
 
-            # 链路层数据帧
-            packetData = self.pcapData[self.pcapPtr - caplen : self.pcapPtr]
-            # 如果是TCP包, 则对其进行解析
-            if packetData[12:14] == b"\x08\x00" and packetData[23] == 6:
-                # 解析数据包信息
-                packetInfo = self.getPacketInfo(pktID, timeStamp, packetData)
+        Parameters
+        ----------
+        None
 
-        return packetInfo
+        Returns
+        -------
+        record : tuple
+            (时间戳, 链路层数据帧), 文件读取完毕时返回None
+
+        """
+        if not self.fill(16):
+            return None
+
+        # 时间戳高位(s), 时间戳低位(us), 捕获的数据包的长度
+        timeHigh, timeLow, caplen = self.recordHeader.unpack_from(
+            self.pcapData, self.pcapPtr
+        )
+
+        # 最后一条记录不完整时丢弃
+        if not self.fill(16 + caplen):
+            return None
+
+        # 指针向后移动 16 + caplen 位
+        self.pcapPtr += 16 + caplen
+
+        # 时间戳, 链路层数据帧(memoryview切片, 不复制字节)
+        return (
+            1000000 * timeHigh + timeLow // self.tsDivisor,
+            self.pcapData[self.pcapPtr - caplen : self.pcapPtr],
+        )
 
     def getPacketInfo(
-        self, pktID: int, timeStamp: int, packetData: bytes
+        self, pktID: int, timeStamp: int, packetData: memoryview, network: tuple
     ) -> BasicPacketInfo:
         """
         获取数据包信息
@@ -209,9 +678,12 @@ class PacketReader:
         timeStamp : int
             数据包时间戳
 
-        packetData : bytes
+        packetData : memoryview
             链路层数据帧
 
+        network : tuple
+            网络层解析结果, 见 parseIPv4 和 parseIPv6
+
         Returns
         -------
         packetInfo : BasicPacketInfo
@@ -220,42 +692,30 @@ class PacketReader:
         """
 
         """提取IP首部信息"""
-        # IP数据包首部长度
-        ipHeadLen = (packetData[14] & 0x0F) << 2
-        # IP数据包长度
-        ipLen = struct.unpack(self.pktTypeH, packetData[16:18])[0]
-        # 传输层协议(TCP:6 UDP:17)
-        protocol = packetData[23]
-        # 源IP地址
-        srcIP = ".".join([str(i) for i in packetData[26:30]])
-        # 目的IP地址
-        dstIP = ".".join([str(i) for i in packetData[30:34]])
+        # 源IP地址, 目的IP地址, 传输层协议(TCP:6 UDP:17), IP数据包长度, 传输层起止位置, IP版本
+        srcIP, dstIP, protocol, ipLen, l4Start, l4End, ipVersion = network
 
         # 如果是TCP包
         if protocol == 6:
-            # TCP数据包内容
-            packetTCP = packetData[14 + ipHeadLen : 14 + ipLen]
             # 若TCP数据包长度小于20, 则直接返回
-            if len(packetTCP) < 20:
+            if l4End - l4Start < 20:
                 return None
-            # 源端口
-            srcPort = struct.unpack(self.pktTypeH, packetTCP[0:2])[0]
-            # 目的端口
-            dstPort = struct.unpack(self.pktTypeH, packetTCP[2:4])[0]
-            # 序列号
-            sequence = struct.unpack(self.pktTypeI, packetTCP[4:8])[0]
-            # 确认号
-            acknowledgment = struct.unpack(self.pktTypeI, packetTCP[8:12])[0]
+            # 源端口, 目的端口, 序列号, 确认号, 数据偏移, TCP控制位, 窗口大小
+            (
+                srcPort,
+                dstPort,
+                sequence,
+                acknowledgment,
+                dataOffset,
+                flags,
+                windowSize,
+            ) = tcpHeader.unpack_from(packetData, l4Start)
             # TCP数据包头长度
-            tcpHeadLen = (packetTCP[12] & 0xF0) >> 2
-            # TCP控制位
-            flags = packetTCP[13]
-            # 窗口大小
-            windowSize = struct.unpack(self.pktTypeH, packetTCP[14:16])[0]
-            # 负载
-            payload = packetTCP[tcpHeadLen:]
+            tcpHeadLen = (dataOffset & 0xF0) >> 2
+            # 负载起始位置
+            pldStart = l4Start + tcpHeadLen
             # 负载长度
-            payloadBytes = len(payload)
+            payloadBytes = max(l4End - pldStart, 0)
 
             # 生成基本数据包信息
             packetInfo = BasicPacketInfo(
@@ -269,26 +729,26 @@ class PacketReader:
                 ipLength=ipLen,
                 headBytes=tcpHeadLen,
                 payloadBytes=payloadBytes,
-                payload=payload,
+                payload=b"",
                 flags=flags,
                 sequence=sequence,
                 acknowledgment=acknowledgment,
                 TCPWindow=windowSize,
-                packetLenMax=config.packetLenMax,
+                packetLenMax=self.packetLenMax,
+                ipVersion=ipVersion,
             )
 
         # 如果是UDP包
-        else:
-            # UDP数据包内容
-            packetUDP = packetData[14 + ipHeadLen : 14 + ipLen]
-            # 源端口
-            srcPort = struct.unpack(self.pktTypeH, packetUDP[0:2])[0]
-            # 目的端口
-            dstPort = struct.unpack(self.pktTypeH, packetUDP[2:4])[0]
-            # 负载
-            payload = packetUDP[8:]
+        elif protocol == 17:
+            # 若UDP数据包长度小于8, 则直接返回
+            if l4End - l4Start < 8:
+                return None
+            # 源端口, 目的端口
+            srcPort, dstPort = udpHeader.unpack_from(packetData, l4Start)
+            # 负载起始位置
+            pldStart = l4Start + 8
             # 负载长度
-            payloadBytes = len(payload)
+            payloadBytes = max(l4End - pldStart, 0)
 
             # 生成基本数据包信息
             packetInfo = BasicPacketInfo(
@@ -302,7 +762,285 @@ class PacketReader:
                 ipLength=ipLen,
                 headBytes=8,
                 payloadBytes=payloadBytes,
-                payload=payload,
+                payload=b"",
+                # UDP没有控制位和窗口, 置零以便统计TCP特征
+                flags=0,
+                TCPWindow=0,
+                packetLenMax=self.packetLenMax,
+                ipVersion=ipVersion,
+            )
+
+        # 其它协议不解析
+        else:
+            return None
+
+        # 负载, 只在会话流仍需要负载时复制, 且只复制需要保留的前 packetLenMax 个字节
+        if self.payloadDemand is None or self.payloadDemand(packetInfo):
+            packetInfo.payload = bytes(
+                packetData[pldStart : min(pldStart + self.packetLenMax, l4End)]
             )
 
         return packetInfo
+
+
+class PcapngReader(PacketReader):
+    """从pcapng文件读取数据包,并生成BasicPacketInfo格式的数据"""
+
+    def readFileHeader(self) -> None:
+        """
+        检查pcapng文件头, 第一个Section Header Block在读取记录时解析
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+
+        """
+        # pcapng文件必须以 Section Header Block 开头, 否则报错
+        if not self.fill(28) or bytes(self.pcapData[0:4]) != pcapngMagic:
+            print(config.PcapHeaderError)
+            sys.exit(1)
+
+        # 当前节的接口列表, 每个元素为 (链路层解码函数, 最大存储长度, 时间戳精度, 时间戳偏移)
+        self.interfaces = []
+        # 最近一个数据包的时间戳, Simple Packet Block 不含时间戳时沿用该值
+        self.lastTimeStamp = 0
+
+        # 按第一个节的字节序初始化解析结构
+        self.readSectionHeader(0)
+        self.pcapPtr = 0
+
+    def readSectionHeader(self, start: int) -> None:
+        """
+        解析 Section Header Block, 确定当前节的字节序
+
+        Parameters
+        ----------
+        start : int
+            块在文件中的起始位置
+
+        Returns
+        -------
+        None
+
+        """
+        # 字节序标记
+        byteOrder = bytes(self.pcapData[start + 8 : start + 12])
+        if byteOrder == byteOrderMagicBE:
+            endian = ">"
+        elif byteOrder == byteOrderMagicLE:
+            endian = "<"
+        else:  # 字节序标记错误, 表明这不是一个pcapng文件, 报错
+            print(config.PcapHeaderError)
+            sys.exit(1)
+
+        # 预编译当前节的解析结构
+        # 块头: 块类型, 块长度
+        self.blockHeader = struct.Struct(endian + "II")
+        # EPB: 接口编号, 时间戳高位, 时间戳低位, 捕获长度
+        self.epbHeader = struct.Struct(endian + "IIII")
+        # PB: 接口编号, 丢包数, 时间戳高位, 时间戳低位, 捕获长度
+        self.pbHeader = struct.Struct(endian + "HHIII")
+        # SPB: 实际长度
+        self.spbHeader = struct.Struct(endian + "I")
+        # IDB: 链路类型, 保留, 最大存储长度
+        self.idbHeader = struct.Struct(endian + "HHI")
+        # 选项头: 选项代码, 选项长度
+        self.optionHeader = struct.Struct(endian + "HH")
+        # if_tsoffset 选项内容
+        self.tsOffset = struct.Struct(endian + "q")
+
+        # 新的节开始, 接口列表清空
+        self.interfaces = []
+
+    def readInterface(self, start: int, blockLen: int) -> None:
+        """
+        解析 Interface Description Block, 记录链路类型和时间戳精度
+
+        Parameters
+        ----------
+        start : int
+            块在文件中的起始位置
+
+        blockLen : int
+            块长度
+
+        Returns
+        -------
+        None
+
+        """
+        linkType, _, snapLen = self.idbHeader.unpack_from(self.pcapData, start + 8)
+
+        # 默认时间戳精度为微秒(10^-6秒), 偏移为0
+        tsResol = (False, 6)
+        tsOffset = 0
+
+        # 遍历选项
+        optPtr = start + 16
+        optEnd = start + blockLen - 4
+        while optPtr + 4 <= optEnd:
+            optCode, optLen = self.optionHeader.unpack_from(self.pcapData, optPtr)
+            # opt_endofopt
+            if optCode == 0:
+                break
+            # if_tsresol
+            if optCode == 9 and optLen >= 1:
+                value = self.pcapData[optPtr + 4]
+                tsResol = (bool(value & 0x80), value & 0x7F)
+            # if_tsoffset
+            elif optCode == 14 and optLen >= 8:
+                tsOffset = self.tsOffset.unpack_from(self.pcapData, optPtr + 4)[0]
+            # 选项内容按4字节对齐
+            optPtr += 4 + ((optLen + 3) & ~3)
+
+        # 不支持的链路类型解码函数为None, 其数据包会被跳过
+        self.interfaces.append((linkDecoders.get(linkType), snapLen, tsResol, tsOffset))
+
+    def toMicrosecond(self, interface: tuple, timeHigh: int, timeLow: int) -> int:
+        """
+        按接口的时间戳精度将时间戳转换为微秒
+
+        Parameters
+        ----------
+        interface : tuple
+            接口信息 (链路层解码函数, 最大存储长度, 时间戳精度, 时间戳偏移)
+
+        timeHigh : int
+            时间戳高32位
+
+        timeLow : int
+            时间戳低32位
+
+        Returns
+        -------
+        timeStamp : int
+            以微秒为单位的时间戳
+
+        """
+        _, _, (isPow2, exponent), tsOffset = interface
+        ticks = (timeHigh << 32) | timeLow
+        if isPow2:
+            timeStamp = (ticks * 1000000) >> exponent
+        elif exponent >= 6:
+            timeStamp = ticks // 10 ** (exponent - 6)
+        else:
+            timeStamp = ticks * 10 ** (6 - exponent)
+        return timeStamp + tsOffset * 1000000
+
+    def nextRecord(self):
+        """
+        读取下一条数据包记录, 跳过非数据包的块
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        record : tuple
+            (时间戳, 链路层数据帧), 文件读取完毕时返回None
+
+        """
+        while self.fill(12):
+            start = self.pcapPtr
+
+            blockType, blockLen = self.blockHeader.unpack_from(self.pcapData, start)
+            # 新的节开始(SHB的块类型与字节序无关), 确定字节序后重新读取块长度
+            if blockType == blockSHB:
+                self.readSectionHeader(start)
+                blockType, blockLen = self.blockHeader.unpack_from(self.pcapData, start)
+            # 块长度错误(短于该类型块的最小长度或未按4字节对齐)或块不完整, 停止读取
+            if (
+                blockLen < blockMinLens.get(blockType, 12)
+                or blockLen & 3
+                or not self.fill(blockLen)
+            ):
+                break
+
+            # 读取缓冲区可能已经移动, 重新获取块的起始位置
+            start = self.pcapPtr
+            pcapData = self.pcapData
+            # 指针向后移动 blockLen 位
+            self.pcapPtr += blockLen
+
+            if blockType == blockEPB:
+                interfaceId, timeHigh, timeLow, caplen = self.epbHeader.unpack_from(
+                    pcapData, start + 8
+                )
+                # 捕获长度受块长度限制(块头28字节, 块尾4字节)
+                caplen = min(caplen, blockLen - 32)
+                dataStart = start + 28
+            elif blockType == blockSPB:
+                # SPB只属于0号接口, 捕获长度受最大存储长度和块长度限制
+                interfaceId = 0
+                caplen = min(
+                    self.spbHeader.unpack_from(pcapData, start + 8)[0],
+                    blockLen - 16,
+                )
+                if self.interfaces and self.interfaces[0][1] > 0:
+                    caplen = min(caplen, self.interfaces[0][1])
+                dataStart = start + 12
+            elif blockType == blockPB:
+                (
+                    interfaceId,
+                    _,
+                    timeHigh,
+                    timeLow,
+                    caplen,
+                ) = self.pbHeader.unpack_from(pcapData, start + 8)
+                caplen = min(caplen, blockLen - 32)
+                dataStart = start + 28
+            else:
+                if blockType == blockIDB:
+                    self.readInterface(start, blockLen)
+                continue
+
+            # 接口不存在, 跳过该数据包
+            if interfaceId >= len(self.interfaces):
+                continue
+            interface = self.interfaces[interfaceId]
+            # 不支持的链路类型, 跳过该数据包
+            if interface[0] is None:
+                continue
+            # 链路层解码函数随接口变化
+            self.linkDecoder = interface[0]
+
+            # 时间戳(SPB不含时间戳, 沿用上一个数据包的时间戳)
+            if blockType != blockSPB:
+                self.lastTimeStamp = self.toMicrosecond(interface, timeHigh, timeLow)
+
+            # 时间戳, 链路层数据帧(memoryview切片, 不复制字节)
+            return self.lastTimeStamp, pcapData[dataStart : dataStart + caplen]
+
+        return None
+
+
+def openPacketReader(filename: str, **kwargs) -> PacketReader:
+    """
+    根据文件开头的魔数选择对应的数据包读取器
+
+    Parameters
+    ----------
+    filename : str
+        pcap或pcapng文件名, 可以经过gzip, bzip2或xz压缩
+
+    kwargs : dict
+        传递给读取器的其它参数
+
+    Returns
+    -------
+    packetReader : PacketReader
+        数据包读取器
+
+    """
+    # 读取(解压后)文件开头的魔数
+    captureFile, _ = openCapture(filename)
+    with captureFile:
+        magic = captureFile.read(4)
+    if magic == pcapngMagic:
+        return PcapngReader(filename, **kwargs)
+    return PacketReader(filename, **kwargs)
@@ -0,0 +1,130 @@
+import os
+
+import numpy as np
+
+"""
+    负载张量分片(--payloadFormat npy)
+    每个输出分片 label{i}.npy 是形状为 [会话流个数, packetNumMax, packetLenMax] 的 uint8 数组,
+    每个会话流一条记录, 不足 packetNumMax 个数据包或 packetLenMax 字节的部分补零;
+    附加文件 label{i}.len.npy 是同样行数的结构化数组(payloadDtype), 记录每个会话流实际保存的数据包个数
+    和每个数据包实际保存的负载字节数
+    两个文件都是标准的 .npy 格式, 可以直接 np.load(filename, mmap_mode="r") 读取, 不需要解析文本
+    文件头固定占用 headerSize 个字节, 追加记录后只需原地改写文件头中的行数, 因此分片可以在提取过程中不断追加,
+    中断后截断到任意整行也能重新生成有效的文件头
+"""
+
+# 文件头(魔数, 版本, 头部长度和头部字典)占用的字节数, 是64的倍数以保持数据对齐
+headerSize = 256
+
+
+def payloadDtype(packetNumMax: int) -> np.dtype:
+    """附加文件的记录类型: 实际保存的数据包个数, 每个数据包实际保存的负载字节数"""
+    return np.dtype(
+        [("packetNum", np.int32), ("payloadLens", np.int32, (packetNumMax,))]
+    )
+
+
+def lensPath(shardFile: str) -> str:
+    """返回负载分片对应的附加文件名"""
+    return shardFile[: -len(".npy")] + ".len.npy"
+
+
+def shardHeader(
+    dtype: np.dtype, recordShape: tuple, rows: int, size: int = headerSize
+) -> bytes:
+    """
+    生成固定长度的 .npy 文件头
+
+    Parameters
+    ----------
+    dtype : np.dtype
+        元素类型
+
+    recordShape : tuple
+        每条记录的形状
+
+    rows : int
+        记录条数
+
+    size : int
+        文件头的字节数, 是64的倍数, 字段较多的结构化类型需要大于 headerSize
+
+    Returns
+    -------
+    header : bytes
+        长度为 size 的文件头
+
+    """
+    header = repr(
+        {
+            "descr": np.lib.format.dtype_to_descr(np.dtype(dtype)),
+            "fortran_order": False,
+            "shape": (rows,) + tuple(recordShape),
+        }
+    ).encode("latin1")
+    # 魔数(6字节), 版本(2字节), 头部长度(2字节), 头部字典以空格补齐并以换行结尾
+    prefix = b"\x93NUMPY\x01\x00" + (size - 10).to_bytes(2, "little")
+    if len(prefix) + len(header) >= size:
+        raise ValueError(size)
+    return prefix + header.ljust(size - len(prefix) - 1) + b"\n"
+
+
+def readHeader(f) -> tuple:
+    """读取文件头, 返回 (元素类型, 每条记录的形状, 每条记录的字节数)"""
+    f.seek(0)
+    np.lib.format.read_magic(f)
+    shape, _, dtype = np.lib.format.read_array_header_1_0(f)
+    recordShape = shape[1:]
+    return dtype, recordShape, dtype.itemsize * int(np.prod(recordShape))
+
+
+def createShard(
+    filename: str, dtype: np.dtype, recordShape: tuple, size: int = headerSize
+) -> None:
+    """创建没有记录的分片, 文件头占用 size 个字节"""
+    with open(filename, "wb") as f:
+        f.write(shardHeader(dtype, recordShape, 0, size))
+
+
+def updateHeader(filename: str) -> None:
+    """按文件大小改写文件头中的记录条数, 文件头长度不变"""
+    with open(filename, "r+b") as f:
+        dtype, recordShape, recordBytes = readHeader(f)
+        size = f.tell()
+        rows = (os.path.getsize(filename) - size) // recordBytes
+        f.seek(0)
+        f.write(shardHeader(dtype, recordShape, rows, size))
+
+
+def truncateShard(filename: str, rows: int) -> None:
+    """将分片截断到前 rows 条记录"""
+    with open(filename, "r+b") as f:
+        dtype, recordShape, recordBytes = readHeader(f)
+        size = f.tell()
+        f.truncate(size + rows * recordBytes)
+        f.seek(0)
+        f.write(shardHeader(dtype, recordShape, rows, size))
+
+
+def appendShard(filename: str, records: np.ndarray) -> None:
+    """
+    将多条记录追加到分片, 分片不存在时创建
+
+    Parameters
+    ----------
+    filename : str
+        分片文件名
+
+    records : np.ndarray
+        第一维为记录条数, 其余维度和类型与分片一致
+
+    Returns
+    -------
+    None
+
+    """
+    if not os.path.exists(filename):
+        createShard(filename, records.dtype, records.shape[1:])
+    with open(filename, "ab") as f:
+        f.write(np.ascontiguousarray(records).tobytes())
+    updateHeader(filename)
@@ -6,11 +6,21 @@ import numpy as np
 import pandas as pd
 
 import config
+from BasicFlow import getFlowConfigs
+from PayloadShard import lensPath, appendShard
 
 MAX_SESS_LEN = config.packetNumMax
 
 
-def writePLD(oldfile: str, newfile: str, newpath: str, sampleNum: int, indexList: list):
+def writePLD(
+    oldfile: str,
+    newfile: str,
+    newpath: str,
+    sampleNum: int,
+    indexList: list,
+    packetNumMax: int = MAX_SESS_LEN,
+    payloadFormat: str = "csv",
+):
     """
     写入负载信息和负载附加信息
 
@@ -31,11 +41,26 @@ def writePLD(oldfile: str, newfile: str, newpath: str, sampleNum: int, indexList
     indexList : list
         索引列表
 
+    packetNumMax : int
+        每个会话流的负载数据行数
+
+    payloadFormat : str
+        负载文件格式, csv 或 npy
+
     Returns
     -------
     None
 
     """
+    if payloadFormat == "npy":
+        # 以内存映射方式打开负载分片和附加文件, 只读取被采样的会话流
+        idx = indexList[:sampleNum]
+        payloads = np.load(oldfile, mmap_mode="r")
+        appendShard(newpath + newfile, payloads[idx])
+        payloadLens = np.load(lensPath(oldfile), mmap_mode="r")
+        appendShard(lensPath(newpath + newfile), payloadLens[idx])
+        return
+
     # 读取原文件
     oldfile = np.array(pd.read_csv(oldfile, header=None))
     with open(newpath + newfile, "a", newline="") as csvFile:
@@ -44,8 +69,8 @@ def writePLD(oldfile: str, newfile: str, newpath: str, sampleNum: int, indexList
         # 将前sampleNum条数据写入新文件
         for i in range(sampleNum):
             idx = indexList[i]
-            l = MAX_SESS_LEN * idx
-            r = MAX_SESS_LEN * (idx + 1)
+            l = packetNumMax * idx
+            r = packetNumMax * (idx + 1)
             pld = oldfile[l:r]
             writer.writerows(pld)
 
@@ -57,6 +82,8 @@ def process(
     pldPath_e: str,
     stcPath_s: str,
     pldPath_s: str,
+    packetNumMax: int = MAX_SESS_LEN,
+    payloadFormat: str = "csv",
 ):
     """
     对文件进行采样
@@ -81,6 +108,12 @@ def process(
     pldPath_s : str
         负载信息采样文件夹
 
+    packetNumMax : int
+        每个会话流的负载数据行数
+
+    payloadFormat : str
+        负载文件格式, csv 或 npy
+
     Returns
     -------
     None
@@ -126,9 +159,17 @@ def process(
 
     # 是否要对payload采样
     if FLAG & 1:
-        # 处理负载数据
-        payloadFile = pldPath_e + file
-        writePLD(payloadFile, newfile, pldPath_s, sampleNum, indexList)
+        # 处理负载数据, 负载文件与统计特征文件同名, 扩展名为负载格式
+        payloadFile = pldPath_e + file[: -len(".csv")] + "." + payloadFormat
+        writePLD(
+            payloadFile,
+            label + "." + payloadFormat,
+            pldPath_s,
+            sampleNum,
+            indexList,
+            packetNumMax,
+            payloadFormat,
+        )
 
 
 def sampleData(args):
@@ -138,37 +179,45 @@ def sampleData(args):
     # 创建采样数据文件夹
     os.mkdir(args.sampleDataPath)
 
-    # 统计特征原始文件夹
-    stcPath_e = args.extractDataPath + "statistics/"
-    # 负载信息原始文件夹
-    pldPath_e = args.extractDataPath + "payload/"
-    # 统计特征采样文件夹
-    stcPath_s = args.sampleDataPath + "statistics/"
-    # 负载信息采样文件夹
-    pldPath_s = args.sampleDataPath + "payload/"
-
-    FLAG = args.flag
-    # 是否要对statistics采样
-    if (FLAG >> 1) & 1:
-        # 创建统计特征文件夹(包括统计特征和包长分布)
-        os.mkdir(stcPath_s)
-
-    # 是否要对payload采样
-    if FLAG & 1:
-        # 创建负载信息文件夹
-        os.mkdir(pldPath_s)
-
-    # 文件名列表
-    files = os.listdir(stcPath_e)
-    # 依次处理文件
-    for file in files:
-        if file[0:6] != "Benign" and file[-5] != "0":
-            continue
-        process(
-            file,
-            FLAG,
-            stcPath_e,
-            pldPath_e,
-            stcPath_s,
-            pldPath_s,
-        )
+    # 参数扫描时每组参数的输出分别采样, 保存到同名子文件夹
+    for name, params in getFlowConfigs(args):
+        if name:
+            print("sample", name)
+            os.mkdir(args.sampleDataPath + name)
+
+        # 统计特征原始文件夹
+        stcPath_e = args.extractDataPath + name + "statistics/"
+        # 负载信息原始文件夹
+        pldPath_e = args.extractDataPath + name + "payload/"
+        # 统计特征采样文件夹
+        stcPath_s = args.sampleDataPath + name + "statistics/"
+        # 负载信息采样文件夹
+        pldPath_s = args.sampleDataPath + name + "payload/"
+
+        FLAG = args.flag
+        # 是否要对statistics采样
+        if (FLAG >> 1) & 1:
+            # 创建统计特征文件夹(包括统计特征和包长分布)
+            os.mkdir(stcPath_s)
+
+        # 是否要对payload采样
+        if FLAG & 1:
+            # 创建负载信息文件夹
+            os.mkdir(pldPath_s)
+
+        # 文件名列表
+        files = os.listdir(stcPath_e)
+        # 依次处理文件
+        for file in files:
+            if file[0:6] != "Benign" and file[-5] != "0":
+                continue
+            process(
+                file,
+                FLAG,
+                stcPath_e,
+                pldPath_e,
+                stcPath_s,
+                pldPath_s,
+                params["packetNumMax"],
+                args.payloadFormat,
+            )
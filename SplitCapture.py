@@ -0,0 +1,434 @@
+import os
+import mmap
+import pickle
+import struct
+
+import numpy as np
+
+from PacketReader import PacketReader, PcapHeader
+from PacketFilter import getPacketFilter
+from BasicPacketInfo import BasicPacketInfo
+from BasicFlow import getFlowConfigs
+from FlowTable import FlowTable
+from ColumnarFlow import batchFlowRows
+from utils import formatCSV, formatPayload
+import config
+
+"""
+    单个大pcap文件的文件内并行, 输出与串行处理(main.processFlows)完全相同
+    1. 切分: 在文件中大约等间隔的 N 个字节位置向后搜索记录边界,
+       从某个位置开始连续 checkNum 条记录首部都合法且首尾相接时, 才认为该位置是记录边界
+    2. 解析: N 个子进程各自解析一段记录, 按流键的哈希值将数据包分发给 N 个流所有者,
+       写入 (段, 所有者) 临时文件, 同时保存本段所有数据包的时间戳
+    3. 统计: 每个流所有者按段的顺序读取属于自己的数据包并送入流表,
+       在每个数据包之前用全部数据包的时间戳推进时间轮, 因此会话流的拆分与串行处理一致
+    4. 合并: 每个会话流带有它在串行处理中的输出位置 (数据包序号, 阶段, 超时时间, 创建序号),
+       主进程按该位置归并各流所有者的输出
+    只支持一组会话流参数, 参数扫描时不切分文件
+"""
+
+# 验证记录边界时检查的连续记录个数
+checkNum = 8
+# 记录首部捕获长度的上限(与快照长度取较大值)
+caplenMax = 262144
+# 记录时间戳与第一条记录的最大相差秒数
+timeRange = 366 * 86400
+# 每次序列化写入临时文件的数据包个数
+packetChunkSize = 4096
+
+
+def isRecordStart(pcapData, pos: int, limits: tuple) -> bool:
+    """
+    判断 pos 是否为记录边界, 即从 pos 开始连续 checkNum 条记录首部都合法且首尾相接
+
+    Parameters
+    ----------
+    pcapData : mmap.mmap
+        pcap文件内容
+
+    pos : int
+        候选位置
+
+    limits : tuple
+        (记录首部解析结构, 文件长度, 捕获长度上限, 时间戳低位上限, 第一条记录的时间戳高位)
+
+    Returns
+    -------
+    valid : bool
+        是否为记录边界
+
+    """
+    recordHeader, pcapLen, capMax, timeLowMax, firstTime = limits
+    for _ in range(checkNum):
+        # 恰好到达文件末尾
+        if pos == pcapLen:
+            return True
+        if pos + 16 > pcapLen:
+            return False
+        timeHigh, timeLow, caplen, origlen = recordHeader.unpack_from(pcapData, pos)
+        if (
+            caplen > capMax
+            or caplen > origlen
+            or timeLow >= timeLowMax
+            or abs(timeHigh - firstTime) > timeRange
+        ):
+            return False
+        pos += 16 + caplen
+    return pos <= pcapLen
+
+
+def findBoundaries(pcapFile: str, rangeNum: int) -> list:
+    """
+    将经典pcap文件切分为大约等长的若干段, 每段的起止位置都是记录边界
+
+    Parameters
+    ----------
+    pcapFile : str
+        未压缩的经典pcap文件名
+
+    rangeNum : int
+        段数
+
+    Returns
+    -------
+    boundaries : list
+        各段的起始位置和最后一段的结束位置(文件长度), 长度不超过 rangeNum + 1
+
+    """
+    with open(pcapFile, "rb") as f:
+        pcapLen = os.fstat(f.fileno()).st_size
+        pcapHeader = PcapHeader(f.read(24))
+        if pcapLen < 24 + 16:
+            return [24, max(pcapLen, 24)]
+        pcapData = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    # 记录首部: 时间戳高位, 时间戳低位, 捕获长度, 实际长度
+    recordHeader = struct.Struct(pcapHeader.TypeI[0] + "IIII")
+    limits = (
+        recordHeader,
+        pcapLen,
+        max(pcapHeader.snapLen, caplenMax),
+        1000000 * pcapHeader.tsDivisor,
+        recordHeader.unpack_from(pcapData, 24)[0],
+    )
+
+    boundaries = [24]
+    for i in range(1, rangeNum):
+        pos = max(24 + (pcapLen - 24) * i // rangeNum, boundaries[-1] + 1)
+        # 向后搜索记录边界, 找不到时该段延伸到文件末尾
+        while pos < pcapLen and not isRecordStart(pcapData, pos, limits):
+            pos += 1
+        if pos >= pcapLen:
+            break
+        boundaries.append(pos)
+    boundaries.append(pcapLen)
+    pcapData.close()
+    return boundaries
+
+
+def rangePath(partPath: str, rangeIdx: int, owner: int) -> str:
+    """第 rangeIdx 段中属于第 owner 个流所有者的数据包的临时文件名"""
+    return "%s.r%d.o%d" % (partPath, rangeIdx, owner)
+
+
+def parseRange(task: tuple) -> int:
+    """
+    解析一段记录, 将数据包按流键分发给各流所有者
+
+    Parameters
+    ----------
+    task : tuple
+        (pcap文件名, 段序号, 起始位置, 结束位置, 流所有者个数, 临时文件路径前缀, 命令行参数)
+
+    Returns
+    -------
+    packetNum : int
+        本段通过过滤的数据包个数
+
+    """
+    pcapFile, rangeIdx, start, end, ownerNum, partPath, args = task
+    packetReader = PacketReader(
+        pcapFile,
+        packetLenMax=getFlowConfigs(args)[0][1]["packetLenMax"],
+        packetFilter=getPacketFilter(args),
+    )
+    # 只读取 [start, end) 之间的记录
+    packetReader.pcapPtr = start
+    packetReader.pcapLen = end
+
+    ownerFiles = [open(rangePath(partPath, rangeIdx, o), "wb") for o in range(ownerNum)]
+    # 每个流所有者待写入的数据包, 数据包以 BasicPacketInfo 的构造参数保存
+    # 第一个参数为本段内的序号, 负载总是完整保留, 由流所有者决定是否需要
+    chunks = [[] for _ in range(ownerNum)]
+    timeStamps = []
+
+    packet = packetReader.nextPacket()
+    while packet is not None:
+        owner = hash(packet.getFlowKey()) % ownerNum
+        chunks[owner].append(
+            (
+                len(timeStamps),
+                packet.srcIP,
+                packet.dstIP,
+                packet.srcPort,
+                packet.dstPort,
+                packet.protocol,
+                packet.timeStamp,
+                packet.ipLength,
+                packet.headBytes,
+                packet.payloadBytes,
+                packet.payload,
+                packet.flags,
+                packet.sequence,
+                packet.acknowledgment,
+                packet.TCPWindow,
+                packet.packetLenMax,
+                packet.ipVersion,
+            )
+        )
+        if len(chunks[owner]) >= packetChunkSize:
+            pickle.dump(chunks[owner], ownerFiles[owner], pickle.HIGHEST_PROTOCOL)
+            chunks[owner] = []
+        timeStamps.append(packet.timeStamp)
+        packet = packetReader.nextPacket()
+    packetReader.close()
+
+    for chunk, ownerFile in zip(chunks, ownerFiles):
+        if chunk:
+            pickle.dump(chunk, ownerFile, pickle.HIGHEST_PROTOCOL)
+        ownerFile.close()
+    np.save("%s.r%d.ts.npy" % (partPath, rangeIdx), np.array(timeStamps, np.int64))
+    return len(timeStamps)
+
+
+def readPackets(partPath: str, rangeIdx: int, owner: int):
+    """按顺序读出第 rangeIdx 段中属于第 owner 个流所有者的数据包构造参数"""
+    with open(rangePath(partPath, rangeIdx, owner), "rb") as f:
+        while True:
+            try:
+                chunk = pickle.load(f)
+            except EOFError:
+                break
+            yield from chunk
+    os.remove(rangePath(partPath, rangeIdx, owner))
+
+
+class OwnerFlowTable(FlowTable):
+    """流所有者的流表, 为每个会话流计算它在串行处理中的输出位置"""
+
+    def __init__(self, emit, nowArray: np.ndarray, **kwargs) -> None:
+        """
+        初始化流所有者的流表
+
+        Parameters
+        ----------
+        emit : function
+            输出函数, 参数为已结束的 BasicFlow, 输出位置见 outputKey
+
+        nowArray : np.ndarray
+            串行处理中每个数据包处理完之后的时间(已读取的最大时间戳)
+
+        kwargs : dict
+            传递给 FlowTable 的其它参数, 必须使用时间轮
+
+        Returns
+        -------
+        None
+
+        """
+        super().__init__(emit, **kwargs)
+        self.nowArray = nowArray
+        # 当前数据包在全部数据包中的序号
+        self.packetIdx = 0
+        # 会话流在流表中结束的阶段: 0 数据包到达时超时, 1 FIN/RST, 2 定时器到期, 3 文件读取完毕
+        self.phase = 0
+        # 正在输出的会话流在串行处理中的输出位置
+        self.outputKey = None
+        # 会话流序号为其第一个数据包的序号, 与串行处理中的创建顺序一致
+        self.serialGenerator = iter(lambda: self.packetIdx, None)
+
+    def catchUp(self, packetIdx: int) -> None:
+        """将时间推进到串行处理中第 packetIdx 个数据包到达之前的时刻"""
+        self.packetIdx = packetIdx
+        if packetIdx > 0:
+            now = int(self.nowArray[packetIdx - 1])
+            if now > self.now:
+                self.now = now
+                self.expire(now)
+
+    def lookup(self, packet: BasicPacketInfo, flowKey: tuple):
+        """查找会话流, 此时结束的会话流属于阶段0, 之后结束的属于阶段1"""
+        self.phase = 0
+        flow = super().lookup(packet, flowKey)
+        self.phase = 1
+        return flow
+
+    def expire(self, currentTS: int) -> None:
+        """推进时间轮, 此时结束的会话流属于阶段2"""
+        self.phase = 2
+        for deadline, serial, flowKey, scheduled in self.dueFlows(currentTS):
+            # 串行处理中定时器到期并且时间已推进到超时时间所在刻度的第一个数据包,
+            # 数据包乱序时超时时间可能早于定时器的超时时间
+            packetIdx = max(
+                self.firstPacketAfter(scheduled), self.firstPacketAfter(deadline)
+            )
+            self.outputKey = (packetIdx, 2, deadline, serial)
+            self.finishFlow(flowKey)
+
+    def firstPacketAfter(self, deadline: int) -> int:
+        """串行处理中第一个使时间推进到 deadline 所在刻度的数据包的序号"""
+        tick = self.timerWheel.tick
+        return int(np.searchsorted(self.nowArray, -(-deadline // tick) * tick))
+
+    def close(self) -> None:
+        """推进到全部数据包之后的时刻, 剩余的会话流属于阶段3"""
+        self.catchUp(len(self.nowArray))
+        self.phase = 3
+        super().close()
+
+    def finishFlow(self, flowKey: tuple) -> None:
+        """记录会话流的输出位置后结束会话流"""
+        serial = self.serials[flowKey]
+        # 阶段2的输出位置在 expire 中计算
+        if self.phase == 3:
+            self.outputKey = (len(self.nowArray), 3, 0, serial)
+        elif self.phase != 2:
+            self.outputKey = (self.packetIdx, self.phase, 0, serial)
+        super().finishFlow(flowKey)
+
+
+def ownFlows(task: tuple) -> list:
+    """
+    统计属于一个流所有者的全部会话流, 输出行写入临时文件
+
+    Parameters
+    ----------
+    task : tuple
+        (流所有者序号, 各段第一个数据包的序号, 临时文件路径前缀, 标签, 流表参数, 负载输出格式)
+
+    Returns
+    -------
+    outputs : list
+        按输出位置排序的 (输出位置, 流所有者序号, 统计特征行偏移, 长度, 负载数据行偏移, 长度)
+
+    """
+    owner, offsets, partPath, label, flowTableArgs, payloadFormat = task
+    nowArray = np.load(partPath + ".now.npy", mmap_mode="r")
+    outputs = []
+
+    stcFile = open("%s.o%d.stc" % (partPath, owner), "wb")
+    pldFile = open("%s.o%d.pld" % (partPath, owner), "wb")
+
+    # 已结束的会话流及其输出位置, 与串行处理相同, 每 flowBatchSize 个一批计算特征
+    flowBatch, outputKeys = [], []
+
+    def flush():
+        for outputKey, rows in zip(outputKeys, batchFlowRows(flowBatch, label)):
+            if rows is None:
+                continue
+            features, payloads, payloadLens = rows[0]
+            stcData = formatCSV([features])
+            pldData = formatPayload(payloads, payloadLens, payloadFormat)
+            outputs.append(
+                (
+                    outputKey,
+                    owner,
+                    stcFile.tell(),
+                    len(stcData),
+                    pldFile.tell(),
+                    len(pldData),
+                )
+            )
+            stcFile.write(stcData)
+            pldFile.write(pldData)
+        flowBatch.clear()
+        outputKeys.clear()
+
+    def emit(flow):
+        flowBatch.append(flow)
+        outputKeys.append(flowTable.outputKey)
+        if len(flowBatch) >= config.flowBatchSize:
+            flush()
+
+    flowTable = OwnerFlowTable(emit, nowArray, **flowTableArgs)
+    for rangeIdx, offset in enumerate(offsets):
+        for fields in readPackets(partPath, rangeIdx, owner):
+            packetIdx = offset + fields[0]
+            flowTable.catchUp(packetIdx)
+            packet = BasicPacketInfo(packetIdx, *fields[1:])
+            # 与串行处理相同, 只为负载槽位未满的会话流保留负载
+            payload, packet.payload = packet.payload, b""
+            if flowTable.needPayload(packet):
+                packet.payload = payload
+            flowTable.addPacket(packet)
+    flowTable.close()
+    flush()
+    stcFile.close()
+    pldFile.close()
+    if flowTable.counters["spilled"] > 0:
+        print(partPath, owner, flowTable.counters)
+
+    outputs.sort()
+    return outputs
+
+
+def splitFlows(pool, pcapFile: str, partPath: str, label: str, args, flowTableArgs):
+    """
+    用进程池中的全部子进程处理一个大pcap文件
+
+    Parameters
+    ----------
+    pool : multiprocessing.Pool
+        进程池
+
+    pcapFile : str
+        未压缩的经典pcap文件名
+
+    partPath : str
+        临时文件路径前缀
+
+    label : str
+        标签
+
+    args : argparse.Namespace
+        命令行参数, 见 config.parser
+
+    flowTableArgs : dict
+        流表参数
+
+    Returns
+    -------
+    outputs : list
+        每个流所有者按输出位置排序的输出, 见 ownFlows
+
+    """
+    ownerNum = args.workers
+    boundaries = findBoundaries(pcapFile, args.workers)
+    packetNums = pool.map(
+        parseRange,
+        [
+            (pcapFile, i, boundaries[i], boundaries[i + 1], ownerNum, partPath, args)
+            for i in range(len(boundaries) - 1)
+        ],
+    )
+    # 各段第一个数据包在全部数据包中的序号
+    offsets = np.concatenate([[0], np.cumsum(packetNums)[:-1]]).tolist()
+
+    # 串行处理中每个数据包处理完之后的时间
+    timeStamps = []
+    for i in range(len(packetNums)):
+        timeStamps.append(np.load("%s.r%d.ts.npy" % (partPath, i)))
+        os.remove("%s.r%d.ts.npy" % (partPath, i))
+    nowArray = np.maximum.accumulate(np.concatenate(timeStamps))
+    np.save(partPath + ".now.npy", nowArray)
+    del timeStamps, nowArray
+
+    outputs = pool.map(
+        ownFlows,
+        [
+            (owner, offsets, partPath, label, flowTableArgs, args.payloadFormat)
+            for owner in range(ownerNum)
+        ],
+    )
+    os.remove(partPath + ".now.npy")
+    return outputs
@@ -0,0 +1,157 @@
+import heapq
+from itertools import count
+
+"""
+    分层时间轮
+    每层有 2^slotBits 个槽位, 第 i 层每个槽位的跨度为 tick * 2^(slotBits*i) 微秒
+    定时器先放入能容纳其剩余时间的最低层, 时间推进到高层槽位时再逐级下放到低层,
+    因此添加定时器和每个时间刻度的推进都是均摊 O(1) 的, 与定时器总数无关
+    低层为空时直接跳到下一个需要下放的时间刻度, 空闲的时间段不会被逐刻度遍历
+    超出最高层范围的定时器放入按到期刻度排序的小根堆, 进入范围后再放入时间轮
+"""
+
+
+class TimerWheel:
+    """以数据包时间戳为时钟的分层时间轮"""
+
+    def __init__(self, tick=1000, slotBits=8, levelNum=4) -> None:
+        """
+        初始化时间轮
+
+        Parameters
+        ----------
+        tick : int
+            时间刻度(us), 即定时器的精度
+
+        slotBits : int
+            每层槽位个数的二进制位数
+
+        levelNum : int
+            层数, 超出最高层范围的定时器放入溢出列表
+
+        Returns
+        -------
+        None
+
+        """
+        self.tick = tick
+        self.slotBits = slotBits
+        self.slotMask = (1 << slotBits) - 1
+        self.levelNum = levelNum
+        # 每层的槽位, 每个槽位保存 (到期刻度, 定时器对象) 列表
+        self.levels = [[[] for _ in range(1 << slotBits)] for _ in range(levelNum)]
+        # 每层的定时器个数
+        self.counts = [0] * levelNum
+        # 超出最高层范围的定时器, 小根堆, 元素为 (到期刻度, 序号, 定时器对象)
+        self.overflow = []
+        self.overflowSeq = count()
+        # 已到期但尚未取出的定时器
+        self.expired = []
+        # 当前时间刻度, 第一次添加定时器或推进时间时初始化
+        self.current = None
+
+    def __len__(self) -> int:
+        return sum(self.counts) + len(self.overflow) + len(self.expired)
+
+    def schedule(self, deadline: int, timer) -> None:
+        """
+        添加定时器
+
+        Parameters
+        ----------
+        deadline : int
+            到期时间(us), 时间推进到不早于该时间的刻度时定时器到期
+
+        timer : object
+            定时器对象, 到期时原样返回
+
+        Returns
+        -------
+        None
+
+        """
+        # 向上取整, 保证到期时时间不早于 deadline
+        expire = -(-deadline // self.tick)
+        if self.current is None:
+            self.current = expire - 1
+        self.place(expire, timer)
+
+    def place(self, expire: int, timer) -> None:
+        """将定时器放入能容纳其剩余时间的最低层"""
+        delta = expire - self.current
+        if delta <= 0:
+            self.expired.append(timer)
+            return
+        for level in range(self.levelNum):
+            if delta < 1 << (self.slotBits * (level + 1)):
+                slot = (expire >> (self.slotBits * level)) & self.slotMask
+                self.levels[level][slot].append((expire, timer))
+                self.counts[level] += 1
+                return
+        heapq.heappush(self.overflow, (expire, next(self.overflowSeq), timer))
+
+    def cascade(self) -> None:
+        """当前刻度跨过高层槽位边界时, 将对应槽位的定时器下放到低层"""
+        for level in range(1, self.levelNum):
+            shift = self.slotBits * level
+            # 低层刚好转完一圈时才需要处理本层
+            if self.current & ((1 << shift) - 1):
+                return
+            slots = self.levels[level]
+            slot = (self.current >> shift) & self.slotMask
+            timers, slots[slot] = slots[slot], []
+            self.counts[level] -= len(timers)
+            for expire, timer in timers:
+                self.place(expire, timer)
+        # 最高层也转完一圈, 将进入范围的溢出定时器放入时间轮
+        limit = self.current + (1 << (self.slotBits * self.levelNum))
+        while self.overflow and self.overflow[0][0] < limit:
+            expire, _, timer = heapq.heappop(self.overflow)
+            self.place(expire, timer)
+
+    def advance(self, now: int) -> list:
+        """
+        将时间推进到 now, 返回所有到期的定时器
+
+        Parameters
+        ----------
+        now : int
+            当前时间(us)
+
+        Returns
+        -------
+        timers : list
+            到期的定时器, 同一刻度内按添加顺序排列
+
+        """
+        target = now // self.tick
+        if self.current is None:
+            self.current = target
+        while self.current < target:
+            # 找到最低的非空层, 在其下一个槽位边界之前不会有定时器到期
+            level = 0
+            while level < self.levelNum and self.counts[level] == 0:
+                level += 1
+            if level == self.levelNum and not self.overflow:
+                self.current = target
+                break
+            if level > 0:
+                span = 1 << (self.slotBits * level)
+                boundary = (self.current // span + 1) * span
+                if boundary > target:
+                    self.current = target
+                    break
+                self.current = boundary - 1
+
+            # 推进一个刻度
+            self.current += 1
+            if not self.current & self.slotMask:
+                self.cascade()
+            slot = self.levels[0][self.current & self.slotMask]
+            if slot:
+                self.counts[0] -= len(slot)
+                self.expired.extend(timer for _, timer in slot)
+                slot.clear()
+
+        timers, self.expired = self.expired, []
+        return timers
@@ -0,0 +1,636 @@
+import os
+import time
+import random
+import struct
+import argparse
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from PacketReader import PacketReader
+from PacketIndex import PacketIndex
+from BasicPacketInfo import BasicPacketInfo
+from FlowTable import FlowTable
+from BasicFlow import BasicFlow
+from ColumnarFlow import ColumnarFlow, batchFlowRows
+from PacketCache import PacketCache
+from utils import flowRows, formatCSV, formatPayload, OutputInfo, PayloadMatrix
+
+"""
+    性能基准测试
+    在合成的PCAP文件上测量各个模块的吞吐量, 用法:
+    python benchmark.py reader --packets 200000
+    python benchmark.py index --packets 200000
+    python benchmark.py timer --packets 200000
+    python benchmark.py cache --packets 200000
+    python benchmark.py flow --packets 200000
+    python benchmark.py batch --packets 200000
+    python benchmark.py payload --packets 200000
+"""
+
+
+def writeSyntheticPcap(filename: str, packetNum: int, seed: int = 0) -> None:
+    """
+    生成一个合成的PCAP文件(以太网 + IPv4 + TCP, 小端模式)
+
+    Parameters
+    ----------
+    filename : str
+        输出文件名
+
+    packetNum : int
+        数据包个数
+
+    seed : int
+        随机数种子
+
+    Returns
+    -------
+    None
+
+    """
+    rng = random.Random(seed)
+    # 预先生成若干负载, 避免生成数据本身成为瓶颈
+    payloads = [bytes(rng.getrandbits(8) for _ in range(n)) for n in (0, 64, 512, 1400)]
+    timeStamp = 1500000000000000
+    with open(filename, "wb") as f:
+        # Global Header
+        f.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1))
+        for i in range(packetNum):
+            payload = payloads[i % len(payloads)]
+            # 一半数据包为反向
+            if i & 1:
+                srcIP, dstIP, srcPort, dstPort = (
+                    b"\xc0\xa8\x01\x02",
+                    b"\x0a\x00\x00\x01",
+                    80,
+                    40000,
+                )
+            else:
+                srcIP, dstIP, srcPort, dstPort = (
+                    b"\x0a\x00\x00\x01",
+                    b"\xc0\xa8\x01\x02",
+                    40000,
+                    80,
+                )
+            tcp = struct.pack(
+                "!HHIIBBHHH", srcPort, dstPort, i, i, 5 << 4, 0x18, 65535, 0, 0
+            )
+            ip = struct.pack(
+                "!BBHHHBBH4s4s",
+                0x45,
+                0,
+                20 + len(tcp) + len(payload),
+                i & 0xFFFF,
+                0,
+                64,
+                6,
+                0,
+                srcIP,
+                dstIP,
+            )
+            frame = b"\x00" * 12 + b"\x08\x00" + ip + tcp + payload
+            timeStamp += rng.randint(1, 2000)
+            # Packet Header
+            f.write(
+                struct.pack(
+                    "<IIII",
+                    timeStamp // 1000000,
+                    timeStamp % 1000000,
+                    len(frame),
+                    len(frame),
+                )
+            )
+            f.write(frame)
+
+
+def legacyParse(filename: str) -> int:
+    """
+    逐字段 struct.unpack 的旧版解析方式, 作为对照组
+
+    Parameters
+    ----------
+    filename : str
+        pcap文件名
+
+    Returns
+    -------
+    packetNum : int
+        解析出的TCP数据包个数
+
+    """
+    with open(filename, "rb") as f:
+        pcapData = f.read()
+    headTypeI = "<I"
+    pcapPtr, pcapLen, packetNum = 24, len(pcapData), 0
+    while pcapPtr < pcapLen:
+        timeHigh = struct.unpack(headTypeI, pcapData[pcapPtr : pcapPtr + 4])[0]
+        timeLow = struct.unpack(headTypeI, pcapData[pcapPtr + 4 : pcapPtr + 8])[0]
+        timeStamp = 1000000 * timeHigh + timeLow
+        caplen = struct.unpack(headTypeI, pcapData[pcapPtr + 8 : pcapPtr + 12])[0]
+        pcapPtr += 16 + caplen
+        packetData = pcapData[pcapPtr - caplen : pcapPtr]
+        if packetData[12:14] == b"\x08\x00" and packetData[23] == 6:
+            ipHeadLen = (packetData[14] & 0x0F) << 2
+            ipLen = struct.unpack("!H", packetData[16:18])[0]
+            # 旧版逐字节格式化IP地址的开销(BasicPacketInfo现在使用整数IP地址)
+            ".".join([str(i) for i in packetData[26:30]])
+            ".".join([str(i) for i in packetData[30:34]])
+            srcIP = int.from_bytes(packetData[26:30], "big")
+            dstIP = int.from_bytes(packetData[30:34], "big")
+            packetTCP = packetData[14 + ipHeadLen : 14 + ipLen]
+            srcPort = struct.unpack("!H", packetTCP[0:2])[0]
+            dstPort = struct.unpack("!H", packetTCP[2:4])[0]
+            sequence = struct.unpack("!I", packetTCP[4:8])[0]
+            acknowledgment = struct.unpack("!I", packetTCP[8:12])[0]
+            windowSize = struct.unpack("!H", packetTCP[14:16])[0]
+            tcpHeadLen = (packetTCP[12] & 0xF0) >> 2
+            payload = packetTCP[tcpHeadLen:]
+            BasicPacketInfo(
+                pktID=packetNum,
+                srcIP=srcIP,
+                dstIP=dstIP,
+                srcPort=srcPort,
+                dstPort=dstPort,
+                protocol=6,
+                timeStamp=timeStamp,
+                ipLength=ipLen,
+                headBytes=tcpHeadLen,
+                payloadBytes=len(payload),
+                payload=payload,
+                flags=packetTCP[13],
+                sequence=sequence,
+                acknowledgment=acknowledgment,
+                TCPWindow=windowSize,
+            )
+            packetNum += 1
+    return packetNum
+
+
+def readerParse(filename: str) -> int:
+    """
+    使用 PacketReader 解析全部数据包
+
+    Parameters
+    ----------
+    filename : str
+        pcap文件名
+
+    Returns
+    -------
+    packetNum : int
+        解析出的TCP数据包个数
+
+    """
+    packetNum = 0
+    with PacketReader(filename) as packetReader:
+        while packetReader.nextPacket() is not None:
+            packetNum += 1
+    return packetNum
+
+
+def indexParse(filename: str) -> int:
+    """
+    使用 PacketIndex 提取全部数据包的字段列(不构造 BasicPacketInfo)
+
+    Parameters
+    ----------
+    filename : str
+        pcap文件名
+
+    Returns
+    -------
+    packetNum : int
+        解析出的TCP数据包个数
+
+    """
+    with PacketIndex(filename) as packetIndex:
+        columns = packetIndex.extractColumns(0, len(packetIndex.records))
+        packetNum = len(columns)
+        del columns
+    return packetNum
+
+
+def indexReaderParse(filename: str) -> int:
+    """
+    使用 PacketIndex 的 nextPacket 接口解析全部数据包
+
+    Parameters
+    ----------
+    filename : str
+        pcap文件名
+
+    Returns
+    -------
+    packetNum : int
+        解析出的TCP数据包个数
+
+    """
+    packetNum = 0
+    with PacketIndex(filename) as packetIndex:
+        while packetIndex.nextPacket() is not None:
+            packetNum += 1
+    return packetNum
+
+
+def cacheParse(filename: str, cachePath: str) -> int:
+    """
+    使用 PacketCache 读取全部数据包, 缓存不存在时先生成缓存
+
+    Parameters
+    ----------
+    filename : str
+        pcap文件名
+
+    cachePath : str
+        缓存文件夹
+
+    Returns
+    -------
+    packetNum : int
+        读取的TCP数据包个数
+
+    """
+    packetNum = 0
+    with PacketCache(filename, cachePath) as packetCache:
+        while packetCache.nextPacket() is not None:
+            packetNum += 1
+    return packetNum
+
+
+def cacheFlowParse(filename: str, cachePath: str, columnar: bool) -> int:
+    """
+    从缓存读取全部数据包并添加到一个 ColumnarFlow, 与 main.process 相同
+
+    Parameters
+    ----------
+    filename : str
+        pcap文件名
+
+    cachePath : str
+        缓存文件夹
+
+    columnar : bool
+        是否通过 nextColumns 按批次追加各列, 否则逐个添加 BasicPacketInfo
+
+    Returns
+    -------
+    packetNum : int
+        会话流的数据包个数
+
+    """
+    with PacketCache(filename, cachePath) as packetCache:
+        packet = packetCache.nextPacket()
+        flow = ColumnarFlow(packet)
+        packetCache.payloadDemand = flow.needPayload
+        flow.addPacket(packet)
+        if columnar:
+            columns, payloads = packetCache.nextColumns(flow.payloadSlots())
+            while columns is not None:
+                flow.addColumns(columns, payloads)
+                columns, payloads = packetCache.nextColumns(flow.payloadSlots())
+        else:
+            packet = packetCache.nextPacket()
+            while packet is not None:
+                flow.addPacket(packet)
+                packet = packetCache.nextPacket()
+    flow.generateFlowFeatures()
+    return flow.getPacketNum()
+
+
+def synFloodPackets(packetNum: int, interval: int = 20, seed: int = 0) -> list:
+    """
+    生成SYN洪泛的数据包, 每个数据包来自不同的源地址和端口, 即各自构成一个半开连接
+
+    Parameters
+    ----------
+    packetNum : int
+        数据包个数
+
+    interval : int
+        相邻数据包的时间间隔(us)
+
+    seed : int
+        随机数种子
+
+    Returns
+    -------
+    packets : list
+        BasicPacketInfo 列表
+
+    """
+    rng = random.Random(seed)
+    timeStamp = 1500000000000000
+    packets = []
+    for i in range(packetNum):
+        timeStamp += interval
+        packets.append(
+            BasicPacketInfo(
+                pktID=i + 1,
+                srcIP=rng.getrandbits(32),
+                dstIP=0x0A000001,
+                srcPort=rng.randint(1024, 65535),
+                dstPort=80,
+                protocol=6,
+                timeStamp=timeStamp,
+                ipLength=40,
+                headBytes=20,
+                payloadBytes=0,
+                payload=b"",
+                flags=0x02,
+                sequence=i,
+                acknowledgment=0,
+                TCPWindow=1024,
+            )
+        )
+    return packets
+
+
+def flowTableParse(packets: list, timerWheel: bool) -> int:
+    """
+    将数据包送入流表, 超时时间为1s, 超时检查精度为10ms
+
+    Parameters
+    ----------
+    packets : list
+        BasicPacketInfo 列表
+
+    timerWheel : bool
+        是否使用时间轮, 为False时每个检查周期扫描全部会话流
+
+    Returns
+    -------
+    packetNum : int
+        处理的数据包个数
+
+    """
+    emitted = []
+    flowTable = FlowTable(
+        emit=emitted.append, idleTimeout=1000000, tick=10000, timerWheel=timerWheel
+    )
+    for packet in packets:
+        flowTable.addPacket(packet)
+    expiredNum = len(emitted)
+    flowTable.close()
+    print("%-24s %10d flows expired before close" % ("", expiredNum))
+    return len(packets)
+
+
+def longFlowPackets(packetNum: int, seed: int = 0) -> list:
+    """
+    生成一个长会话流的数据包, 双向交替, 间隔时间中偶尔出现超过活动超时的空闲
+
+    Parameters
+    ----------
+    packetNum : int
+        数据包个数
+
+    seed : int
+        随机数种子
+
+    Returns
+    -------
+    packets : list
+        BasicPacketInfo 列表
+
+    """
+    rng = random.Random(seed)
+    timeStamp = 1500000000000000
+    packets = []
+    for i in range(packetNum):
+        timeStamp += rng.randint(1, 2000)
+        # 约千分之一的间隔为空闲时间
+        if rng.random() < 0.001:
+            timeStamp += rng.randint(5000000, 20000000)
+        payloadBytes = rng.choice((0, 0, 64, 512, 1400))
+        srcIP, dstIP = (0xC0A80102, 0x0A000001) if i & 1 else (0x0A000001, 0xC0A80102)
+        packets.append(
+            BasicPacketInfo(
+                pktID=i + 1,
+                srcIP=srcIP,
+                dstIP=dstIP,
+                srcPort=80 if i & 1 else 40000,
+                dstPort=40000 if i & 1 else 80,
+                protocol=6,
+                timeStamp=timeStamp,
+                ipLength=40 + payloadBytes,
+                headBytes=20,
+                payloadBytes=payloadBytes,
+                payload=b"",
+                flags=0x18 if payloadBytes else 0x10,
+                sequence=i,
+                acknowledgment=i,
+                TCPWindow=65535,
+            )
+        )
+    return packets
+
+
+def flowParse(packets: list, flowClass) -> int:
+    """
+    将数据包全部加入一个会话流并生成特征
+
+    Parameters
+    ----------
+    packets : list
+        同一个会话流的 BasicPacketInfo 列表
+
+    flowClass : type
+        会话流的实现, BasicFlow 或 ColumnarFlow
+
+    Returns
+    -------
+    packetNum : int
+        处理的数据包个数
+
+    """
+    flow = flowClass(packet=packets[0])
+    for packet in packets:
+        flow.addPacket(packet)
+    flow.endSession()
+    flow.generateFlowFeatures()
+    return len(packets)
+
+
+def shortFlowsParse(packets: list, flowSize: int, batch: bool) -> int:
+    """
+    每 flowSize 个数据包构成一个短会话流, 生成全部会话流的输出行
+
+    Parameters
+    ----------
+    packets : list
+        BasicPacketInfo 列表
+
+    flowSize : int
+        每个会话流的数据包个数
+
+    batch : bool
+        是否批量计算特征, 为False时逐个会话流调用 flowRows
+
+    Returns
+    -------
+    packetNum : int
+        处理的数据包个数
+
+    """
+    flows = []
+    for i in range(0, len(packets), flowSize):
+        flow = ColumnarFlow(packet=packets[i])
+        for packet in packets[i : i + flowSize]:
+            flow.addPacket(packet)
+        flows.append(flow)
+    if batch:
+        batchFlowRows(flows, "Benign")
+    else:
+        for flow in flows:
+            flowRows(flow, "Benign")
+    return len(packets)
+
+
+def payloadWriteRead(dataPath: str, flowPayloads: list, payloadFormat: str) -> int:
+    """
+    将会话流的负载写入输出文件后全部读回
+
+    Parameters
+    ----------
+    dataPath : str
+        输出文件夹, 需包含 statistics 和 payload 子文件夹
+
+    flowPayloads : list
+        每个会话流的 (负载数据行, 负载长度)
+
+    payloadFormat : str
+        负载输出格式, csv 或 npy
+
+    Returns
+    -------
+    packetNum : int
+        写入和读取的负载数据行数
+
+    """
+    outputInfo = OutputInfo(dataPath, ["Label"], payloadFormat)
+    outputInfo.check("Benign")
+    for payloads, payloadLens in flowPayloads:
+        outputInfo.appendRows(
+            "Benign",
+            formatCSV([["Benign"]]),
+            formatPayload(payloads, payloadLens, payloadFormat),
+        )
+    outputInfo.closeFiles()
+    pldFile = outputInfo.getFile("Benign")[1]
+    if payloadFormat == "csv":
+        payload = np.array(pd.read_csv(pldFile, header=None), dtype=np.uint8)
+    else:
+        payload = np.load(pldFile)
+    return payload.size // 128
+
+
+def timeIt(name: str, func, *args) -> None:
+    """运行函数并打印每秒处理的数据包个数"""
+    start = time.perf_counter()
+    packetNum = func(*args)
+    cost = time.perf_counter() - start
+    print(
+        "%-24s %10d pkts %8.3f s %12.0f pkts/s"
+        % (name, packetNum, cost, packetNum / cost)
+    )
+
+
+def benchReader(args) -> None:
+    """对比旧版逐字段解析与 PacketReader 的解析速度"""
+    with tempfile.TemporaryDirectory() as tmpDir:
+        filename = os.path.join(tmpDir, "synthetic.pcap")
+        writeSyntheticPcap(filename, args.packets)
+        timeIt("legacy struct.unpack", legacyParse, filename)
+        timeIt("PacketReader", readerParse, filename)
+
+
+def benchIndex(args) -> None:
+    """对比逐包解析与两阶段向量化解析的速度"""
+    with tempfile.TemporaryDirectory() as tmpDir:
+        filename = os.path.join(tmpDir, "synthetic.pcap")
+        writeSyntheticPcap(filename, args.packets)
+        timeIt("PacketReader", readerParse, filename)
+        timeIt("PacketIndex columns", indexParse, filename)
+        timeIt("PacketIndex nextPacket", indexReaderParse, filename)
+
+
+def benchTimer(args) -> None:
+    """在大量并发半开连接上对比时间轮与逐个扫描会话流的超时处理速度"""
+    packets = synFloodPackets(args.packets)
+    timeIt("FlowTable naive sweep", flowTableParse, packets, False)
+    timeIt("FlowTable timer wheel", flowTableParse, packets, True)
+
+
+def benchCache(args) -> None:
+    """对比解析原始文件, 生成缓存与从缓存读取的速度"""
+    with tempfile.TemporaryDirectory() as tmpDir:
+        filename = os.path.join(tmpDir, "synthetic.pcap")
+        cachePath = os.path.join(tmpDir, "cache")
+        writeSyntheticPcap(filename, args.packets)
+        timeIt("PacketReader", readerParse, filename)
+        timeIt("PacketCache build", cacheParse, filename, cachePath)
+        timeIt("PacketCache cached", cacheParse, filename, cachePath)
+        timeIt("ColumnarFlow nextPacket", cacheFlowParse, filename, cachePath, False)
+        timeIt("ColumnarFlow nextColumns", cacheFlowParse, filename, cachePath, True)
+
+
+def benchFlow(args) -> None:
+    """在长会话流上对比逐包更新统计量与列式批量计算的速度"""
+    packets = longFlowPackets(args.packets)
+    timeIt("BasicFlow", flowParse, packets, BasicFlow)
+    timeIt("ColumnarFlow", flowParse, packets, ColumnarFlow)
+
+
+def benchBatch(args) -> None:
+    """在大量短会话流上对比逐个计算与按 CSR 偏移批量计算特征的速度"""
+    packets = longFlowPackets(args.packets)
+    timeIt("ColumnarFlow per flow", shortFlowsParse, packets, 8, False)
+    timeIt("ColumnarFlow batch", shortFlowsParse, packets, 8, True)
+
+
+def benchPayload(args) -> None:
+    """对比CSV文本与 .npy 张量分片写入并读回负载的速度"""
+    rng = random.Random(0)
+    flowPayloads = []
+    for _ in range(args.packets // 16):
+        payloadLens = [rng.choice((0, 64, 128)) for _ in range(16)]
+        # 与会话流的负载矩阵相同, 每个数据包一行128个字节(补零)
+        buffer = bytearray().join(
+            rng.randbytes(length).ljust(128, b"\0") for length in payloadLens
+        )
+        flowPayloads.append((PayloadMatrix(buffer, 16, 128), payloadLens))
+    with tempfile.TemporaryDirectory() as tmpDir:
+        for payloadFormat in ("csv", "npy"):
+            dataPath = os.path.join(tmpDir, payloadFormat) + "/"
+            os.makedirs(dataPath + "statistics")
+            os.makedirs(dataPath + "payload")
+            timeIt(
+                "payload " + payloadFormat,
+                payloadWriteRead,
+                dataPath,
+                flowPayloads,
+                payloadFormat,
+            )
+
+
+benchmarks = {
+    "reader": benchReader,
+    "index": benchIndex,
+    "timer": benchTimer,
+    "cache": benchCache,
+    "flow": benchFlow,
+    "batch": benchBatch,
+    "payload": benchPayload,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark")
+    parser.add_argument("case", choices=sorted(benchmarks), help="benchmark case")
+    parser.add_argument(
+        "--packets", type=int, default=200000, help="number of synthetic packets"
+    )
+    args = parser.parse_args()
+    benchmarks[args.case](args)
@@ -25,12 +25,147 @@ parser.add_argument(
     help="sample information",
     # 分别表示 statistics, payload 是否要采样
 )
+parser.add_argument(
+    "--resume",
+    action="store_true",
+    help="keep existing output and only process new or changed pcap files",
+    # 根据 extractDataPath 下的清单跳过已处理且没有变化的文件, 崩溃后从最后一个完成的文件继续
+)
+parser.add_argument(
+    "--hashInputs",
+    action="store_true",
+    help="record a content hash of each pcap file in the manifest",
+    # 按内容判断文件是否变化, 而不只是比较大小和修改时间
+)
+parser.add_argument(
+    "--reader",
+    default="mmap",
+    choices=["mmap", "index"],
+    help="pcap reader mode",
+    # mmap: 逐个解析数据包, index: 先建立记录索引再用NumPy批量提取字段
+)
+parser.add_argument(
+    "--cachePath",
+    default=None,
+    help="dir for parsed packet caches, disabled by default",
+    # 第一次读取pcap文件时缓存解析结果, 之后直接从缓存提取, 不再解析原始文件
+)
+parser.add_argument(
+    "--cachePayloadLen",
+    type=int,
+    default=0,
+    help="payload bytes per packet kept in new caches, default is packetLenMax",
+    # 参数扫描中 packetLenMax 的最大值, 缓存的负载短于 packetLenMax 时重新生成缓存
+)
+parser.add_argument(
+    "--workers",
+    type=int,
+    default=1,
+    help="number of worker processes",
+    # 大于1时多进程并行处理pcap文件, 输出与串行处理完全相同
+)
+parser.add_argument(
+    "--splitSize",
+    type=int,
+    default=0,
+    help="with --flowTable and --workers, split pcap files larger than this many MB across workers",
+    # 大于0时, 超过该大小(MB)的未压缩经典pcap文件由全部子进程在文件内并行处理, 0表示不切分
+)
+parser.add_argument(
+    "--flowTable",
+    action="store_true",
+    help="split each pcap file into flows by 5-tuple",
+    # 每个pcap文件可以包含多个会话流, 不必预先按会话拆分
+)
+parser.add_argument(
+    "--maxFlows",
+    type=int,
+    default=0,
+    help="max flows kept in memory by the flow table, 0 means unlimited",
+    # 超过后按淘汰策略将一批会话流写入磁盘, 之后再读回合并
+)
+parser.add_argument(
+    "--evictPolicy",
+    default="lru",
+    choices=["lru", "packets"],
+    help="which flows to spill when over maxFlows",
+    # lru: 最久没有数据包到达的会话流, packets: 数据包个数最少的会话流
+)
+parser.add_argument(
+    "--spillPath",
+    default=None,
+    help="dir for spilled flows, default is the system temp dir",
+    # 被淘汰的会话流写入该文件夹下的临时文件, 处理完一个pcap文件后自动删除
+)
+parser.add_argument(
+    "--flowBackend",
+    default="object",
+    choices=["object", "columnar"],
+    help="per-flow feature engine",
+    # object: 每个数据包更新统计量(BasicFlow), columnar: 保存数据包的各列, 结束时用NumPy批量计算(ColumnarFlow)
+)
+parser.add_argument(
+    "--payloadFormat",
+    default="csv",
+    choices=["csv", "npy"],
+    help="payload output format",
+    # csv: 每个会话流 packetNumMax 行十进制字节, npy: 可追加, 可内存映射读取的 uint8 张量分片和负载长度附加文件, 见 PayloadShard
+)
+parser.add_argument(
+    "--activityTimeouts",
+    default=None,
+    help="activity timeouts (us) to sweep, e.g. 1000000,5000000,30000000",
+    # 参数扫描, 与 subFlowTimeouts, payloadShapes 的所有组合在一次读取中同时计算, 流表的空闲超时仍为 activityTimeout
+)
+parser.add_argument(
+    "--subFlowTimeouts",
+    default=None,
+    help="subflow timeouts (us) to sweep, e.g. 1000000,2000000",
+    # 未指定时使用 subFlowTimeout
+)
+parser.add_argument(
+    "--payloadShapes",
+    default=None,
+    help="payload shapes (packets x bytes) to sweep, e.g. 16x128,32x256",
+    # 未指定时使用 packetNumMax x packetLenMax, 有多组参数时每组参数输出到 extractDataPath 下的子文件夹
+)
+parser.add_argument(
+    "--protocols",
+    default="6",
+    help="transport protocols to keep, e.g. 6,17",
+    # 保留的传输层协议号, 以逗号分隔
+)
+parser.add_argument(
+    "--ports",
+    default=None,
+    help="port ranges to keep, e.g. 80,443,8000-8080",
+    # 源端口或目的端口在任一范围内的数据包才会保留
+)
+parser.add_argument(
+    "--allowIP",
+    default=None,
+    help="CIDR blocks to keep, e.g. 10.0.0.0/8,2001:db8::/32",
+    # 源IP或目的IP在任一地址段内的数据包才会保留
+)
+parser.add_argument(
+    "--denyIP",
+    default=None,
+    help="CIDR blocks to drop, e.g. 192.168.1.100/32",
+    # 源IP或目的IP在任一地址段内的数据包将被丢弃, 优先于allowIP
+)
 
 activityTimeout = 5000000
+flowTimeout = 120000000
 subFlowTimeout = 1000000
 packetNumMax = 16
 packetLenMax = 128
+# 并行处理时, 连续的小文件合并为一个任务, 直到总大小超过该值(字节)
+taskChunkSize = 1 << 24
+# 已结束的会话流攒够该个数后批量计算特征并写入输出文件
+flowBatchSize = 10000
 
 PathError = "Error Code = 00, There is no Such File or Folder."
 AttackInfoLack = "Error Code = 01, The Attack Information File is Missing."
 PcapHeaderError = "Error Code = 02, This is not a Pcap File."
+LinkLayerError = "Error Code = 03, The Link Layer Type is not Supported."
+FilterError = "Error Code = 04, The Packet Filter is Invalid."
@@ -1,14 +1,23 @@
 import os
-import csv
+import heapq
 import shutil
+import tempfile
+import multiprocessing
 from datetime import datetime
 
 import config
-from PacketReader import PacketReader
-from BasicFlow import BasicFlow
+from PacketReader import openPacketReader, pcapMagics
+from PacketIndex import PacketIndex
+from PacketCache import PacketCache
+from PacketFilter import getPacketFilter
+from BasicFlow import BasicFlow, getFlowConfigs
+from ColumnarFlow import ColumnarFlow, batchFlowRows
+from FlowTable import FlowTable
+from SplitCapture import splitFlows
+from Manifest import Manifest
 import FlowFeature
 from SampleData import sampleData
-from utils import OutputInfo
+from utils import OutputInfo, formatCSV, formatPayload
 
 
 def getLabel(dirName):
@@ -23,49 +32,496 @@ def getLabel(dirName):
     return dirName
 
 
-def process(pcapFile):
+def openReader(
+    pcapFile,
+    readerMode,
+    packetFilter=None,
+    cacheArgs=None,
+    packetLenMax=config.packetLenMax,
+):
+    # 从解析结果缓存读取, 缓存无效时先生成缓存
+    if cacheArgs is not None:
+        return PacketCache(
+            pcapFile, packetLenMax=packetLenMax, packetFilter=packetFilter, **cacheArgs
+        )
+    # 批量索引模式只支持未压缩的经典pcap格式
+    if readerMode == "index":
+        with open(pcapFile, "rb") as f:
+            if f.read(4) in pcapMagics:
+                return PacketIndex(
+                    pcapFile, packetLenMax=packetLenMax, packetFilter=packetFilter
+                )
+    # 根据文件格式和压缩格式选择读取器
+    return openPacketReader(
+        pcapFile, packetLenMax=packetLenMax, packetFilter=packetFilter
+    )
+
+
+# 会话流的实现, 见 --flowBackend
+flowBackends = {"object": BasicFlow, "columnar": ColumnarFlow}
+
+
+def getFlowArgs(args=None):
+    # 会话流参数, 参数扫描时其余各组参数由同一个会话流的 variants 统计
+    if args is None:
+        return {
+            "activityTimeout": config.activityTimeout,
+            "subFlowTimeout": config.subFlowTimeout,
+            "packetNumMax": config.packetNumMax,
+            "packetLenMax": config.packetLenMax,
+            "variants": [],
+        }
+    flowConfigs = [params for _, params in getFlowConfigs(args)]
+    return dict(flowConfigs[0], variants=flowConfigs[1:])
+
+
+def getReaderLenMax(flowArgs):
+    # 读取器保留的负载长度, 为各组参数中 packetLenMax 的最大值
+    return max(
+        [flowArgs["packetLenMax"]]
+        + [params["packetLenMax"] for params in flowArgs["variants"]]
+    )
+
+
+def process(
+    pcapFile,
+    readerMode="mmap",
+    packetFilter=None,
+    cacheArgs=None,
+    flowArgs=None,
+    flowClass=BasicFlow,
+):
+    # 会话流参数
+    flowArgs = flowArgs or getFlowArgs()
     # 初始化PCAP数据包读取类
-    packetReader = PacketReader(pcapFile)
+    packetReader = openReader(
+        pcapFile, readerMode, packetFilter, cacheArgs, getReaderLenMax(flowArgs)
+    )
     # 读取第一个数据包
     packet = packetReader.nextPacket()
+    # 没有数据包通过过滤
+    if packet is None:
+        packetReader.close()
+        return None
     # 初始化会话流
-    flow = BasicFlow(
-        packet=packet,
-        activityTimeout=config.activityTimeout,
-        subFlowTimeout=config.subFlowTimeout,
-        packetNumMax=config.packetNumMax,
-        packetLenMax=config.packetLenMax,
+    flow = flowClass(packet=packet, **flowArgs)
+    # 负载槽位已满后, 读取器不再复制数据包负载
+    packetReader.payloadDemand = flow.needPayload
+    if isinstance(packetReader, PacketCache) and isinstance(flow, ColumnarFlow):
+        # 列式会话流直接追加缓存的各列, 不逐个构造 BasicPacketInfo
+        flow.addPacket(packet=packet)
+        columns, payloads = packetReader.nextColumns(flow.payloadSlots())
+        while columns is not None:
+            flow.addColumns(columns, payloads)
+            columns, payloads = packetReader.nextColumns(flow.payloadSlots())
+    else:
+        # 循环读取数据包,直到结束
+        while packet is not None:
+            # 将其添加到会话流中
+            flow.addPacket(packet=packet)
+            # 读取下一个数据包
+            packet = packetReader.nextPacket()
+    # 结束流
+    flow.endSession()
+    # 关闭读取器, 释放文件映射
+    packetReader.close()
+    return flow
+
+
+def processFlows(
+    pcapFile,
+    emit,
+    readerMode="mmap",
+    packetFilter=None,
+    flowTableArgs=None,
+    cacheArgs=None,
+    flowArgs=None,
+):
+    # 会话流参数
+    flowArgs = flowArgs or getFlowArgs()
+    # 初始化PCAP数据包读取类
+    packetReader = openReader(
+        pcapFile, readerMode, packetFilter, cacheArgs, getReaderLenMax(flowArgs)
     )
+    # 初始化流表, 会话流结束后立即交给输出函数
+    flowTable = FlowTable(emit=emit, **(flowTableArgs or {}), **flowArgs)
+    # 只为负载槽位未满的会话流复制数据包负载
+    packetReader.payloadDemand = flowTable.needPayload
     # 循环读取数据包,直到结束
+    packet = packetReader.nextPacket()
     while packet is not None:
-        # 将其添加到会话流中
-        flow.addPacket(packet=packet)
+        # 将其添加到所属会话流中
+        flowTable.addPacket(packet)
         # 读取下一个数据包
         packet = packetReader.nextPacket()
-    # 结束流
-    flow.endSession()
-    return flow
+    # 结束所有剩余的会话流
+    flowTable.close()
+    # 关闭读取器, 释放文件映射
+    packetReader.close()
+    # 报告受内存限制影响的会话流个数
+    if flowTable.counters["spilled"] > 0:
+        print(pcapFile, flowTable.counters)
+
+
+def writeFlows(flows, label, outputInfos):
+    # 批量计算一批会话流的特征, 按顺序逐个写入
+    for rows in batchFlowRows(flows, label):
+        if rows is None:
+            continue
+        # 每组参数写入各自的输出文件
+        for (features, payloads, payloadLens), outputInfo in zip(rows, outputInfos):
+            outputInfo.appendRows(
+                label,
+                formatCSV([features]),
+                formatPayload(payloads, payloadLens, outputInfo.payloadFormat),
+            )
+    # 一批写完后关闭输出文件
+    for outputInfo in outputInfos:
+        outputInfo.closeFiles()
+
+
+def getCacheArgs(args):
+    # 解析结果缓存的位置和缓存的负载长度, 未指定缓存文件夹时不使用缓存
+    if args.cachePath is None:
+        return None
+    return {"cachePath": args.cachePath, "payloadLen": args.cachePayloadLen}
+
+
+def getFlowTableArgs(args):
+    # 流表的内存限制和会话流的实现
+    return {
+        "maxFlows": args.maxFlows,
+        "evictPolicy": args.evictPolicy,
+        "spillDir": args.spillPath,
+        "flowClass": flowBackends[args.flowBackend],
+    }
+
+
+# 子进程的全局状态, 由 initWorker 在每个子进程中初始化一次
+workerState = {}
+
+
+def initWorker(args):
+    workerState["args"] = args
+    # 编译后的过滤器无法序列化, 在子进程中重新编译
+    workerState["packetFilter"] = getPacketFilter(args)
+    workerState["flowTableArgs"] = getFlowTableArgs(args)
+    workerState["cacheArgs"] = getCacheArgs(args)
+    workerState["flowArgs"] = getFlowArgs(args)
+
+
+def extractTask(task):
+    # 任务编号, 标签, 文件列表, 临时结果文件路径(不含扩展名)
+    taskIdx, label, pcapFiles, partPath = task
+    args = workerState["args"]
+    packetFilter = workerState["packetFilter"]
+    flowArgs = workerState["flowArgs"]
+    # 每个会话流在每组参数下的负载数据字节数, 主进程据此切分临时结果文件
+    payloadSizes = []
+
+    # 每组参数各有一对临时结果文件
+    configNum = 1 + len(flowArgs["variants"])
+    partFiles = []
+    for i in range(configNum):
+        partFiles.append(open("%s.%d.stc" % (partPath, i), "wb"))
+        partFiles.append(open("%s.%d.pld" % (partPath, i), "wb"))
+
+    # 已结束但尚未写入的会话流
+    flowBatch = []
+
+    def flush():
+        for rows in batchFlowRows(flowBatch, label):
+            if rows is None:
+                continue
+            sizes = []
+            for i, (features, payloads, payloadLens) in enumerate(rows):
+                pldData = formatPayload(payloads, payloadLens, args.payloadFormat)
+                partFiles[2 * i].write(formatCSV([features]))
+                partFiles[2 * i + 1].write(pldData)
+                sizes.append(len(pldData))
+            payloadSizes.append(tuple(sizes))
+        flowBatch.clear()
+
+    def emit(flow):
+        flowBatch.append(flow)
+        if len(flowBatch) >= config.flowBatchSize:
+            flush()
+
+    for pcapFile in pcapFiles:
+        if args.flowTable:
+            processFlows(
+                pcapFile,
+                emit,
+                args.reader,
+                packetFilter,
+                workerState["flowTableArgs"],
+                workerState["cacheArgs"],
+                flowArgs,
+            )
+            continue
+        flow = process(
+            pcapFile,
+            args.reader,
+            packetFilter,
+            workerState["cacheArgs"],
+            flowArgs,
+            flowBackends[args.flowBackend],
+        )
+        if flow is not None:
+            emit(flow)
+
+    flush()
+    for partFile in partFiles:
+        partFile.close()
+    return taskIdx, payloadSizes
+
+
+def canSplit(args, pcapFile, size):
+    # 文件内并行只支持流表模式下未压缩的经典pcap文件, 使用缓存时不再读取原始文件
+    if not args.flowTable or args.splitSize <= 0 or size < args.splitSize << 20:
+        return False
+    if args.cachePath is not None:
+        return False
+    # 参数扫描时不切分文件
+    if len(getFlowConfigs(args)) > 1:
+        return False
+    with open(pcapFile, "rb") as f:
+        return f.read(4) in pcapMagics
+
+
+def listTasks(args, partDir, doneFiles):
+    # 按串行处理的顺序列出所有标签文件夹, 每个文件夹对应的任务编号
+    dirTasks = []
+    # 所有任务, 以及每个任务的文件总大小
+    tasks, taskSizes = [], []
+    # 需要在文件内并行处理的任务
+    splitIdxs = set()
+    for dir in os.listdir(args.pcapPath):
+        label = getLabel(dir)
+        if label == None:
+            continue
+        dirpath = os.path.join(args.pcapPath, dir)
+        taskIdxs = []
+        # 连续的小文件合并为一个任务, 直到总大小超过 taskChunkSize
+        chunk, chunkSize = [], 0
+        for f in os.listdir(dirpath):
+            pcapFile = os.path.join(dirpath, f)
+            # 已处理且没有变化的文件
+            if pcapFile in doneFiles:
+                continue
+            size = os.path.getsize(pcapFile)
+            # 大文件单独作为一个任务, 由全部子进程共同处理
+            if canSplit(args, pcapFile, size):
+                if chunk:
+                    taskIdxs.append(len(tasks))
+                    tasks.append((len(tasks), label, chunk, None))
+                    taskSizes.append(chunkSize)
+                    chunk, chunkSize = [], 0
+                splitIdxs.add(len(tasks))
+                taskIdxs.append(len(tasks))
+                tasks.append((len(tasks), label, [pcapFile], None))
+                taskSizes.append(size)
+                continue
+            chunk.append(pcapFile)
+            chunkSize += size
+            if chunkSize >= config.taskChunkSize:
+                taskIdxs.append(len(tasks))
+                tasks.append((len(tasks), label, chunk, None))
+                taskSizes.append(chunkSize)
+                chunk, chunkSize = [], 0
+        if chunk:
+            taskIdxs.append(len(tasks))
+            tasks.append((len(tasks), label, chunk, None))
+            taskSizes.append(chunkSize)
+        dirTasks.append((dir, label, taskIdxs))
+    # 设置每个任务的临时结果文件路径
+    tasks = [
+        (taskIdx, label, files, os.path.join(partDir, str(taskIdx)))
+        for taskIdx, label, files, _ in tasks
+    ]
+    return dirTasks, tasks, taskSizes, splitIdxs
+
+
+def copyTask(task, payloadSizes, outputInfos):
+    # 按会话流将临时结果追加到输出文件, 与串行处理的分片方式一致
+    _, label, _, partPath = task
+    for i, outputInfo in enumerate(outputInfos):
+        stcPath = "%s.%d.stc" % (partPath, i)
+        pldPath = "%s.%d.pld" % (partPath, i)
+        with open(stcPath, "rb") as stcPart, open(pldPath, "rb") as pldPart:
+            for sizes in payloadSizes:
+                stcData = stcPart.readline()
+                outputInfo.appendRows(label, stcData, pldPart.read(sizes[i]))
+        # 每组参数写完后关闭输出文件
+        outputInfo.closeFiles()
+        os.remove(stcPath)
+        os.remove(pldPath)
+
+
+def copySplit(task, outputs, outputInfo):
+    # 按会话流在串行处理中的输出位置归并各流所有者的临时结果
+    _, label, _, partPath = task
+    stcParts = [open("%s.o%d.stc" % (partPath, o), "rb") for o in range(len(outputs))]
+    pldParts = [open("%s.o%d.pld" % (partPath, o), "rb") for o in range(len(outputs))]
+    for _, owner, stcOffset, stcLen, pldOffset, pldLen in heapq.merge(*outputs):
+        stcParts[owner].seek(stcOffset)
+        pldParts[owner].seek(pldOffset)
+        outputInfo.appendRows(
+            label, stcParts[owner].read(stcLen), pldParts[owner].read(pldLen)
+        )
+    for owner in range(len(outputs)):
+        stcParts[owner].close()
+        pldParts[owner].close()
+        os.remove("%s.o%d.stc" % (partPath, owner))
+        os.remove("%s.o%d.pld" % (partPath, owner))
+
+
+def extractDataParallel(args, outputInfos, manifest, doneFiles):
+    # 临时结果文件夹, 处理完成后删除
+    partDir = tempfile.mkdtemp(prefix=".parts", dir=args.extractDataPath)
+    dirTasks, tasks, taskSizes, splitIdxs = listTasks(args, partDir, doneFiles)
+    # 按文件大小从大到小调度, 避免大文件落在最后形成长尾
+    order = sorted(range(len(tasks)), key=lambda taskIdx: -taskSizes[taskIdx])
+
+    with multiprocessing.Pool(
+        args.workers, initializer=initWorker, initargs=(args,)
+    ) as pool:
+        # 大文件先由全部子进程在文件内并行处理
+        splitOutputs = {}
+        for taskIdx in order:
+            if taskIdx in splitIdxs:
+                _, label, pcapFiles, partPath = tasks[taskIdx]
+                # 只有一组会话流参数, 与流表的内存限制一起传递给流所有者的流表
+                flowTableArgs = dict(getFlowTableArgs(args), **getFlowArgs(args))
+                splitOutputs[taskIdx] = splitFlows(
+                    pool, pcapFiles[0], partPath, label, args, flowTableArgs
+                )
+        results = pool.imap_unordered(
+            extractTask, [tasks[i] for i in order if i not in splitIdxs]
+        )
+        # 已完成但尚未写入输出文件的任务
+        finished = {}
+        # 按串行处理的顺序写入输出文件, 保证输出与串行处理完全相同
+        for dir, label, taskIdxs in dirTasks:
+            print("process", dir)
+
+            for outputInfo in outputInfos:
+                outputInfo.check(label)
+
+            for taskIdx in taskIdxs:
+                if taskIdx in splitOutputs:
+                    copySplit(tasks[taskIdx], splitOutputs.pop(taskIdx), outputInfos[0])
+                    outputInfos[0].closeFiles()
+                else:
+                    while taskIdx not in finished:
+                        doneIdx, payloadSizes = next(results)
+                        finished[doneIdx] = payloadSizes
+                    copyTask(tasks[taskIdx], finished.pop(taskIdx), outputInfos)
+                # 输出写入磁盘后再记录到清单
+                manifest.record(label, tasks[taskIdx][2], outputInfos)
+
+            # 打印时间
+            print(datetime.now())
+
+    shutil.rmtree(partDir)
+
+
+def getManifestParams(args):
+    # 影响输出内容的参数, 任一参数变化时需要重新提取全部文件
+    return {
+        "flowTimeout": config.flowTimeout,
+        "flowConfigs": [[name, params] for name, params in getFlowConfigs(args)],
+        "flowTable": args.flowTable,
+        "flowBackend": args.flowBackend,
+        "reader": args.reader,
+        "payloadFormat": args.payloadFormat,
+        "protocols": args.protocols,
+        "ports": args.ports,
+        "allowIP": args.allowIP,
+        "denyIP": args.denyIP,
+        "featureName": FlowFeature.getFeatureName(),
+    }
+
+
+def listLabelFiles(args):
+    # 每个标签下的全部pcap文件(多个文件夹可以对应同一个标签)
+    labelFiles = {}
+    for dir in os.listdir(args.pcapPath):
+        label = getLabel(dir)
+        if label == None:
+            continue
+        dirpath = os.path.join(args.pcapPath, dir)
+        labelFiles.setdefault(label, []).extend(
+            os.path.join(dirpath, f) for f in os.listdir(dirpath)
+        )
+    return labelFiles
 
 
 def extractData(args):
-    # 如果文件夹存在则删除
-    if os.path.exists(args.extractDataPath) == True:
-        print("Deleting Old Datas...")
-        shutil.rmtree(args.extractDataPath)
-    # 创建数据提取文件夹
-    os.mkdir(args.extractDataPath)
-
-    # 创建统计特征文件夹(包括统计特征和包长分布)
-    stcDataPath = args.extractDataPath + "statistics/"
-    os.mkdir(stcDataPath)
-    # 创建负载信息文件夹
-    pldDataPath = args.extractDataPath + "payload/"
-    os.mkdir(pldDataPath)
+    # 已处理文件清单
+    manifest = Manifest(
+        args.extractDataPath, args.pcapPath, getManifestParams(args), args.hashInputs
+    )
+
+    # 续跑时保留已有的输出, 清单不存在或参数变化时重新提取
+    if args.resume and manifest.load():
+        print("Resuming from Manifest...")
+        # 删除上次中断时遗留的并行处理临时结果
+        for name in os.listdir(args.extractDataPath):
+            if name.startswith(".parts"):
+                shutil.rmtree(os.path.join(args.extractDataPath, name))
+    else:
+        # 如果文件夹存在则删除
+        if os.path.exists(args.extractDataPath) == True:
+            print("Deleting Old Datas...")
+            shutil.rmtree(args.extractDataPath)
+        # 创建数据提取文件夹
+        os.mkdir(args.extractDataPath)
+
+        # 参数扫描时每组参数输出到各自的子文件夹
+        for name, _ in getFlowConfigs(args):
+            if name:
+                os.mkdir(args.extractDataPath + name)
+            # 创建统计特征文件夹(包括统计特征和包长分布)
+            stcDataPath = args.extractDataPath + name + "statistics/"
+            os.mkdir(stcDataPath)
+            # 创建负载信息文件夹
+            pldDataPath = args.extractDataPath + name + "payload/"
+            os.mkdir(pldDataPath)
+
+        manifest.create()
 
     print(datetime.now())
 
     featureName = FlowFeature.getFeatureName()
-    outputInfo = OutputInfo(args.extractDataPath, featureName)
+    # 每组参数的输出文件信息
+    outputInfos = [
+        OutputInfo(
+            args.extractDataPath + name,
+            featureName,
+            args.payloadFormat,
+            params["packetNumMax"],
+            params["packetLenMax"],
+        )
+        for name, params in getFlowConfigs(args)
+    ]
+
+    # 跳过已处理的文件, 并将输出回滚到清单记录的状态
+    doneFiles = manifest.plan(listLabelFiles(args), outputInfos)
+
+    # 根据命令行参数编译数据包过滤器
+    packetFilter = getPacketFilter(args)
+
+    # 多进程并行处理
+    if args.workers > 1:
+        extractDataParallel(args, outputInfos, manifest, doneFiles)
+        return
+    # 流表的内存限制
+    flowTableArgs = getFlowTableArgs(args)
+    # 解析结果缓存
+    cacheArgs = getCacheArgs(args)
+    # 会话流参数
+    flowArgs = getFlowArgs(args)
 
     # 获取文件夹下的所有文件夹名称
     dirs = os.listdir(args.pcapPath)
@@ -76,7 +532,20 @@ def extractData(args):
 
         print("process", dir)
 
-        outputInfo.check(label)
+        for outputInfo in outputInfos:
+            outputInfo.check(label)
+
+        # 已结束但尚未写入的会话流, 以及其输出尚未全部写入的文件
+        flowBatch, batchFiles = [], []
+
+        def flush():
+            writeFlows(flowBatch, label, outputInfos)
+            flowBatch.clear()
+
+        def emit(flow):
+            flowBatch.append(flow)
+            if len(flowBatch) >= config.flowBatchSize:
+                flush()
 
         # 获取文件夹名称
         dirpath = os.path.join(args.pcapPath, dir)
@@ -86,35 +555,45 @@ def extractData(args):
         for f in files:
             # 获取文件路径
             pcapFile = os.path.join(dirpath, f)
-            # 处理PCAP文件
-            flow = process(pcapFile)
-
-            # 生成统计特征和包长分布
-            features = flow.generateFlowFeatures()
-
-            # 如果特征为空(只有当第一个数据包的时间戳等于最后一个数据包的时间戳的时候才会出现该情况)
-            if features is None:
-                # print(f)  # 打印文件名, 调试用
-                continue  # 略过该文件
-
-            # 添加标签
-            features.append(label)
-
-            statisticsFile, payloadFile = outputInfo.getFile(label)
-            # 写入到文件
-            with open(statisticsFile, "a", newline="") as csvFile:
-                # 创建writer对象
-                writer = csv.writer(csvFile)
-                writer.writerow(features)
-
-            # 生成负载数据
-            payloads = flow.getPayloads()
-            # 写入到文件
-            with open(payloadFile, "a", newline="") as csvFile:
-                # 创建writer对象
-                writer = csv.writer(csvFile)
-                for pld in payloads:
-                    writer.writerow(pld)
+            # 已处理且没有变化的文件
+            if pcapFile in doneFiles:
+                continue
+            # 文件中包含多个会话流, 按五元组拆分后逐个输出
+            if args.flowTable:
+                processFlows(
+                    pcapFile,
+                    emit,
+                    args.reader,
+                    packetFilter,
+                    flowTableArgs,
+                    cacheArgs,
+                    flowArgs,
+                )
+            else:
+                # 处理PCAP文件
+                flow = process(
+                    pcapFile,
+                    args.reader,
+                    packetFilter,
+                    cacheArgs,
+                    flowArgs,
+                    flowBackends[args.flowBackend],
+                )
+                # 文件中有可用的数据包时输出会话流
+                if flow is not None:
+                    emit(flow)
+
+            # 每个文件只有一个会话流时攒够一批再写入, 输出全部写入后将这些文件记录到清单
+            batchFiles.append(pcapFile)
+            if args.flowTable:
+                flush()
+            if not flowBatch:
+                manifest.record(label, batchFiles, outputInfos)
+                batchFiles = []
+
+        if batchFiles:
+            flush()
+            manifest.record(label, batchFiles, outputInfos)
 
         # 打印时间
         print(datetime.now())
@@ -1,6 +1,39 @@
+import io
+import os
 import csv
+import math
+from socket import inet_ntop, AF_INET, AF_INET6
+
 import numpy as np
 
+from PayloadShard import payloadDtype, lensPath, createShard, updateHeader
+
+# 每个字节值(0-255)的十进制文本, 用于将负载矩阵格式化为CSV
+byteTexts = [str(i).encode() for i in range(256)]
+
+
+def formatIP(ip: int, ipVersion: int = 4) -> str:
+    """
+    将整数形式的IP地址格式化为字符串, 只在输出时调用
+
+    Parameters
+    ----------
+    ip : int
+        32位(IPv4)或128位(IPv6)整数形式的IP地址
+
+    ipVersion : int
+        IP版本(4或6)
+
+    Returns
+    -------
+    ipStr : str
+        点分十进制(IPv4)或冒号十六进制(IPv6)形式的IP地址
+
+    """
+    if ipVersion == 4:
+        return inet_ntop(AF_INET, ip.to_bytes(4, "big"))
+    return inet_ntop(AF_INET6, ip.to_bytes(16, "big"))
+
 
 class IdGenerator:
     """为每个数据包生成唯一的ID"""
@@ -17,15 +50,38 @@ class IdGenerator:
 
 
 class SummaryStatistics:
-    """统计值类"""
+    """
+    统计值类, 在线计算个数, 总和, 最大值, 最小值, 均值和方差, 不保存每个值
+    总和按加入顺序累加, 与 sum 完全相同; 均值为 总和/个数, 整数值时与 np.mean 完全相同;
+    方差使用 Welford 算法, 与 np.var / np.std 的相对误差不超过 1e-9(绝对误差不超过 1e-9)
+    """
 
-    def __init__(self):
-        self.value = []  # 保存值
+    def __init__(self, skipFirst=False):
         self.N = 0  # 保存个数
+        self.sum = 0  # 总和
+        self.max = None  # 最大值
+        self.min = None  # 最小值
+        self.mean = 0.0  # Welford 均值
+        self.M2 = 0.0  # 与均值之差的平方和
+        # 是否跳过第一个值(如第一个数据包与初始时间戳的间隔时间)
+        self.skipFirst = skipFirst
+        # 已跳过的值的个数
+        self.skipped = 0
 
     def addValue(self, newValue):
-        self.value.append(newValue)
+        if self.skipFirst:
+            self.skipFirst = False
+            self.skipped += 1
+            return
         self.N += 1
+        self.sum += newValue
+        if self.N == 1 or newValue > self.max:
+            self.max = newValue
+        if self.N == 1 or newValue < self.min:
+            self.min = newValue
+        delta = newValue - self.mean
+        self.mean += delta / self.N
+        self.M2 += delta * (newValue - self.mean)
 
     def getN(self):
         return self.N
@@ -33,38 +89,33 @@ class SummaryStatistics:
     def getSum(self):
         if self.N == 0:
             return 0
-        return sum(self.value)
+        return self.sum
 
     def getMax(self):
         if self.N == 0:
             return 0
-        return max(self.value)
+        return self.max
 
     def getMin(self):
         if self.N == 0:
             return 0
-        return min(self.value)
+        return self.min
 
     def getMean(self):
         if self.N == 0:
             return 0
-        return np.mean(self.value)
+        return self.sum / self.N
 
     def getStd(self):
         if self.N == 0:
             return 0
-        return np.std(self.value)
+        return math.sqrt(self.getVar())
 
     def getVar(self):
         if self.N == 0:
             return 0
-        return np.var(self.value)
-
-    def delete(self, idx):
-        """删除指定位置的值"""
-        if len(self.value) > idx:
-            del self.value[idx]
-            self.N -= 1
+        # 舍入误差可能使 M2 略小于0
+        return max(self.M2, 0.0) / self.N
 
 
 class PacketLengthDistribution:
@@ -110,17 +161,161 @@ class PacketLengthDistribution:
         return self.cnt
 
 
+class PayloadMatrix:
+    """
+    会话流的负载矩阵, packetNumMax 行 packetLenMax 列的字节保存在一个连续的缓冲区中
+    按行访问(下标, 迭代, len)时每行为整数列表, 与原来的负载数据行列表兼容;
+    np.asarray 直接得到缓冲区上形状为 [packetNumMax, packetLenMax] 的 uint8 视图, 不复制
+    """
+
+    def __init__(self, buffer, packetNumMax: int, packetLenMax: int) -> None:
+        self.buffer = buffer
+        self.packetNumMax = packetNumMax
+        self.packetLenMax = packetLenMax
+
+    def __len__(self) -> int:
+        return self.packetNumMax
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self.packetNumMax))]
+        if i < 0:
+            i += self.packetNumMax
+        if not 0 <= i < self.packetNumMax:
+            raise IndexError("payload row out of range")
+        return list(self.buffer[i * self.packetLenMax : (i + 1) * self.packetLenMax])
+
+    def __iter__(self):
+        for i in range(self.packetNumMax):
+            yield self[i]
+
+    def __eq__(self, other) -> bool:
+        return list(self) == list(other)
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        matrix = np.frombuffer(self.buffer, dtype=np.uint8).reshape(
+            self.packetNumMax, self.packetLenMax
+        )
+        return matrix if dtype is None else matrix.astype(dtype, copy=False)
+
+    def tobytes(self) -> bytes:
+        """返回负载矩阵的全部字节"""
+        return bytes(self.buffer)
+
+
+def flowRows(flow, label):
+    """
+    生成会话流的输出行
+
+    Parameters
+    ----------
+    flow : BasicFlow
+        已结束的会话流
+
+    label : str
+        标签
+
+    Returns
+    -------
+    rows : list
+        每组参数的 (统计特征行, 负载数据行列表, 每个数据包实际保存的负载字节数), 第一组为会话流本身的参数,
+        其余依次为 flow.variants 的参数, 特征为空时返回None
+
+    """
+    # 生成统计特征和包长分布
+    features = flow.generateFlowFeatures()
+
+    # 如果特征为空(只有当第一个数据包的时间戳等于最后一个数据包的时间戳的时候才会出现该情况)
+    if features is None:
+        return None  # 略过该会话流
+
+    # 统计特征行(添加标签), 负载数据行, 负载长度
+    rows = [(features + [label], flow.getPayloads(), flow.getPayloadLens())]
+    for variant in flow.variants:
+        features = flow.generateVariantFeatures(variant)
+        rows.append(
+            (features + [label], variant.getPayloads(), variant.getPayloadLens())
+        )
+    return rows
+
+
+def formatCSV(rows: list) -> bytes:
+    """将多行数据格式化为CSV文件的内容, 与 csv.writer 直接写入文件相同"""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue().encode()
+
+
+def formatPayloadCSV(payloads) -> bytes:
+    """将负载矩阵格式化为CSV文件的内容(每个数据包一行), 按字节查表生成, 结果与 formatCSV 相同"""
+    matrix = np.asarray(payloads, dtype=np.uint8)
+    packetLenMax = matrix.shape[1]
+    if packetLenMax == 0:
+        return b"\r\n" * len(matrix)
+    texts = [byteTexts[b] for b in matrix.tobytes()]
+    return b"".join(
+        [
+            b",".join(texts[i : i + packetLenMax]) + b"\r\n"
+            for i in range(0, len(texts), packetLenMax)
+        ]
+    )
+
+
+def formatPayload(payloads: list, payloadLens: list, payloadFormat: str) -> bytes:
+    """
+    将一个会话流的负载格式化为输出文件的内容
+
+    Parameters
+    ----------
+    payloads : PayloadMatrix
+        补零后的负载矩阵, packetNumMax 行, 每行 packetLenMax 个字节(也可以是整数列表的列表)
+
+    payloadLens : list
+        每个数据包实际保存的负载字节数
+
+    payloadFormat : str
+        输出格式, csv 或 npy
+
+    Returns
+    -------
+    pldData : bytes
+        csv: 负载数据行的CSV内容
+        npy: 负载记录(packetNumMax * packetLenMax 字节)之后接附加文件的记录, 见 PayloadShard
+
+    """
+    if payloadFormat == "csv":
+        return formatPayloadCSV(payloads)
+    lens = np.zeros(1, dtype=payloadDtype(len(payloads)))
+    lens["packetNum"] = len(payloadLens)
+    lens["payloadLens"][0, : len(payloadLens)] = payloadLens
+    return np.asarray(payloads, dtype=np.uint8).tobytes() + lens.tobytes()
+
+
 class OutputInfo:
-    def __init__(self, extractDataPath, featureName):
+    def __init__(
+        self,
+        extractDataPath,
+        featureName,
+        payloadFormat="csv",
+        packetNumMax=16,
+        packetLenMax=128,
+    ):
         self.info = {}
         self.stcDataPath = extractDataPath + "statistics/"
         self.pldDataPath = extractDataPath + "payload/"
         self.featureName = featureName
+        # 负载输出格式和每个会话流的负载形状
+        self.payloadFormat = payloadFormat
+        self.payloadShape = (packetNumMax, packetLenMax)
+        self.pldExt = "." + payloadFormat
+        # 并行处理时追加写入的输出文件名和文件对象
+        self.appendFiles = (None, None)
+        self.appendHandles = None
 
     def check(self, label):
         if label not in self.info:
             statisticsFile = self.stcDataPath + label + "0.csv"
-            payloadFile = self.pldDataPath + label + "0.csv"
+            payloadFile = self.pldDataPath + label + "0" + self.pldExt
             # 创建并清空文件
             with open(statisticsFile, "w", newline="") as csvFile:
                 # 创建writer对象
@@ -137,7 +332,7 @@ class OutputInfo:
             self.info[label][1] = 1
             idx = self.info[label][0]
             statisticsFile = self.stcDataPath + label + str(idx) + ".csv"
-            payloadFile = self.pldDataPath + label + str(idx) + ".csv"
+            payloadFile = self.pldDataPath + label + str(idx) + self.pldExt
             # 创建并清空文件
             with open(statisticsFile, "w", newline="") as csvFile:
                 # 创建writer对象
@@ -149,3 +344,45 @@ class OutputInfo:
             self.info[label][3] = payloadFile
 
         return self.info[label][2], self.info[label][3]
+
+    def appendRows(self, label, stcData, pldData):
+        """将一个会话流已格式化的统计特征行和负载数据(见 formatPayload)追加到输出文件"""
+        files = self.getFile(label)
+        # 分片文件发生变化时重新打开
+        if files != self.appendFiles:
+            self.closeFiles()
+            self.appendFiles = files
+            if self.payloadFormat == "npy":
+                # 负载分片和附加文件
+                pldFiles = (files[1], lensPath(files[1]))
+                if not os.path.exists(files[1]):
+                    createShard(files[1], np.uint8, self.payloadShape)
+                    createShard(pldFiles[1], payloadDtype(self.payloadShape[0]), ())
+            else:
+                pldFiles = (files[1],)
+            self.appendHandles = [open(files[0], "ab")] + [
+                open(pldFile, "ab") for pldFile in pldFiles
+            ]
+        self.appendHandles[0].write(stcData)
+        if self.payloadFormat == "npy":
+            payloadBytes = self.payloadShape[0] * self.payloadShape[1]
+            self.appendHandles[1].write(pldData[:payloadBytes])
+            self.appendHandles[2].write(pldData[payloadBytes:])
+        else:
+            self.appendHandles[1].write(pldData)
+
+    def closeFiles(self):
+        """
+        关闭 appendRows 打开的输出文件, 负载分片的文件头更新为实际的记录条数
+        关闭前将数据写入磁盘, 保证清单记录的输出在系统崩溃或断电后仍然完整
+        """
+        if self.appendHandles is not None:
+            for handle in self.appendHandles:
+                handle.flush()
+                os.fsync(handle.fileno())
+                handle.close()
+            if self.payloadFormat == "npy":
+                updateHeader(self.appendFiles[1])
+                updateHeader(lensPath(self.appendFiles[1]))
+        self.appendFiles = (None, None)
+        self.appendHandles = None